@@ -10,6 +10,7 @@ from pkgdash.models.database.sourcelink import PackageSource
 from datetime import datetime
 from typing import AsyncGenerator, Tuple, Literal, Optional
 from zoneinfo import ZoneInfo
+from pkgdash.cache import flush_invalidations, invalidate_soon
 from pkgdash.models.connector.mongo import create_engine
 from packageurl import PackageURL
 import argparse
@@ -143,6 +144,7 @@ async def save_sourcelink(purl: str, url: str) -> None:
         else:
             await source.save()
             logger.info(f"Document {purl} saved to PackageSource database")
+        await invalidate_soon(PackageSource)
     except Exception as e:
         logger.error(f"Saving document {purl} error: {e}")
 
@@ -164,6 +166,7 @@ async def save_to_db(doc: Repository | RepositoryStats | PackageStats, primary_k
             await doc.save()
             logger.info(
                 f"Document {url_value} saved to {type(doc).__name__} database")
+        await invalidate_soon(type(doc))
     except Exception as e:
         logger.error(f"Saving document {url_value} error: {e}")
 
@@ -226,5 +229,6 @@ if __name__ == "__main__":
             }
             await save_to_db(r_stats, r_stats_key)
             await save_to_db(pkg_stats, pkg_stats_key)
+        await flush_invalidations()
 
     asyncio.run(main())
@@ -6,8 +6,10 @@ from github import Github, Auth
 from github.GithubException import RateLimitExceededException, GithubException
 from dataclasses import dataclass
 from tqdm import tqdm
-from datetime import datetime
+from datetime import datetime, timezone
+from pymongo import UpdateOne
 
+from pkgdash.cache import invalidate
 from pkgdash.models.connector.mongo import create_engine
 from pkgdash.models.database.package import Package
 from pkgdash.models.database.repository import Repository
@@ -242,6 +244,48 @@ async def find_similar_repos(repo_url: str, limit: int = 10) -> List[SimilarRepo
     finder = GitHubSimilarFinder()
     return await finder.find_similar(repo_url, limit)
 
+async def packages_by_repo_url(repo_urls: List[str]) -> Dict[str, Package]:
+    """One package per repo url (the first stored one), fetched with a single query"""
+    packages: Dict[str, Package] = {}
+    if not repo_urls:
+        return packages
+    async for pkg in Package.find_many({"repo_url": {"$in": list(set(repo_urls))}}).sort("_id"):
+        packages.setdefault(pkg.repo_url, pkg)
+    return packages
+
+
+async def update_recommended_purls(batch_size: int = 1000) -> None:
+    """
+    Materializes Repository.recommended_purls from similar_repos, so /api/repo/rec is a single read
+    """
+    collection = Repository.get_motor_collection()
+    similar: Dict[str, List[str]] = {
+        doc["url"]: doc.get("similar_repos") or []
+        async for doc in collection.find({}, {"_id": 0, "url": 1, "similar_repos": 1})
+    }
+    purls: Dict[str, str] = {}
+    wanted = list({u for urls in similar.values() for u in urls})
+    for i in range(0, len(wanted), batch_size):
+        cursor = Package.get_motor_collection().find(
+            {"repo_url": {"$in": wanted[i : i + batch_size]}}, {"_id": 0, "repo_url": 1, "purl": 1}
+        ).sort("_id")
+        async for doc in cursor:
+            purls.setdefault(doc["repo_url"], doc["purl"])
+
+    now = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne(
+            {"url": url},
+            {"$set": {"recommended_purls": [purls[u] for u in urls if u in purls], "record_updated_at": now}},
+        )
+        for url, urls in similar.items()
+    ]
+    for i in range(0, len(ops), batch_size):
+        await collection.bulk_write(ops[i : i + batch_size], ordered=False)
+    await invalidate(Repository)
+    print(f"Updated recommended packages of {len(ops)} repositories")
+
+
 async def recommend_similar_packages(purl: str):
     """根据包的 repo_url 推荐相似包"""
     package = await Package.find_one({"purl": purl})
@@ -250,11 +294,11 @@ async def recommend_similar_packages(purl: str):
         return []
     
     similar_repos = await find_similar_repos(package.repo_url, limit=5)
+    packages = await packages_by_repo_url([repo.url for repo in similar_repos])
     
     recommendations = []
     for repo in similar_repos:
-        print(f"Looking for package with repo URL: {repo.url}")
-        pkg = await Package.find_one({"repo_url": repo.url})
+        pkg = packages.get(repo.url)
         if pkg:
             recommendations.append({
                 "purl": pkg.purl,
@@ -291,6 +335,7 @@ async def update_all_repos_similar(skip_existing: bool = True):
     
     if not repos:
         print("No repositories to process!")
+        await update_recommended_purls()
         return
     
     success_count = 0
@@ -342,6 +387,7 @@ async def update_all_repos_similar(skip_existing: bool = True):
             await repo.save()
             error_count += 1
     
+    await update_recommended_purls()
     elapsed = datetime.now() - start_time
     print(f"\n{'='*50}")
     print(f"✅ Completed!")
@@ -10,6 +10,7 @@ from pkgdash.models.database.sourcelink import PackageSource
 from datetime import datetime
 from typing import AsyncGenerator, Tuple
 from zoneinfo import ZoneInfo
+from pkgdash.cache import flush_invalidations, invalidate_soon
 from pkgdash.models.connector.mongo import create_engine
 from packageurl import PackageURL
 import argparse
@@ -45,6 +46,7 @@ async def save_sourcelink(purl: str, url: str) -> None:
         else:
             await source.save()
             logger.info(f"Document {purl} saved to PackageSource database")
+        await invalidate_soon(PackageSource)
     except Exception as e:
         logger.error(f"Saving document {purl} error: {e}")
 
@@ -61,5 +63,6 @@ if __name__ == "__main__":
                 continue
             if url:
                 await save_sourcelink(purl, url)
+        await flush_invalidations()
 
     asyncio.run(main())
@@ -12,6 +12,7 @@ import requests
 from packageurl import PackageURL
 from pymongo.errors import DuplicateKeyError
 
+from pkgdash.cache import invalidate_soon
 from pkgdash.models.connector.mongo import create_engine
 from pkgdash.analyze.utils import (
     _uncompress_if_gzip,
@@ -23,6 +24,7 @@ from pkgdash.analyze.utils import (
 )
 from pkgdash.models.database.package import Package
 from pkgdash.models.database.deplink import PackageDependency
+from pkgdash.models.facets import count_new_packages
 from pkgdash.models.spdx_license import SPDXLicense
 
 
@@ -294,12 +296,14 @@ class DatabaseManager:
         """插入或更新包"""
         try:
             await package.save()
+            await count_new_packages([package])
             logging.info(f"Package {package.purl} saved to database")
         except DuplicateKeyError:
             await Package.find_one({"purl": package.purl}).update(
                 {"$set": package.dict(exclude={"record_created_at"})}
             )
             logging.info(f"Package {package.purl} updated in database")
+        await invalidate_soon(Package)
 
     async def _upsert_dependency(self, dependency: PackageDependency) -> None:
         """插入或更新依赖关系"""
@@ -311,6 +315,7 @@ class DatabaseManager:
                 {"purl": dependency.purl, "dep_purl": dependency.dep_purl}
             ).update({"$set": dependency.dict(exclude={"record_created_at"})})
             logging.info(f"Dependency {dependency.dep_purl} for {dependency.purl} updated")
+        await invalidate_soon(PackageDependency)
 
 
 class PackageProcessor:
@@ -7,6 +7,7 @@ import requests
 from packageurl import PackageURL
 from typing import Optional
 
+from pkgdash.cache import flush_invalidations, invalidate_soon
 from pkgdash.models.connector.mongo import create_engine
 from pymongo.errors import DuplicateKeyError
 from pkgdash.analyze.utils import (
@@ -19,6 +20,7 @@ from pkgdash.analyze.utils import (
 )
 from pkgdash.models.database.package import Package
 from pkgdash.models.database.deplink import PackageDependency
+from pkgdash.models.facets import count_new_packages
 from pkgdash.models.spdx_license import SPDXLicense
 
 packages_dir = "/home/lzh/maven"
@@ -79,6 +81,7 @@ async def save_package_to_db(package_url: PackageURL, package_json: dict) -> Pac
 
     try:
         await package.save()
+        await count_new_packages([package])
         print(f"Package {package_url} saved to database")
     except DuplicateKeyError:
         await Package.find_one({"purl": package_url.to_string()}).update(
@@ -86,6 +89,7 @@ async def save_package_to_db(package_url: PackageURL, package_json: dict) -> Pac
         )
         print(f"Package {package_url} updated in database")
     finally:
+        await invalidate_soon(Package)
         return package
 
 
@@ -123,6 +127,7 @@ async def save_dependencies_to_db(package_json: dict, deps: list[dict]):
                 {"$set": pd.dict(exclude={"record_created_at"})}
             )
             print(f"Package {dep_purl} for {purl_str} updated in database")
+    await invalidate_soon(PackageDependency)
 
 
 cnt = 0
@@ -186,6 +191,7 @@ async def analyze(packages_dir: str, save_to_db: bool = True) -> None:
         if p.endswith(".tar.gz") or p.endswith(".tar.bz2")
     ]
     await asyncio.gather(*tasks)
+    await flush_invalidations()
 
 
 if __name__ == "__main__":
@@ -12,6 +12,7 @@ import requests
 from packageurl import PackageURL
 from pymongo.errors import DuplicateKeyError
 
+from pkgdash.cache import flush_invalidations, invalidate_soon
 from pkgdash.models.connector.mongo import create_engine
 from pkgdash.analyze.utils import (
     _uncompress_if_gzip,
@@ -24,6 +25,7 @@ from pkgdash.analyze.utils import (
 )
 from pkgdash.models.database.package import Package
 from pkgdash.models.database.deplink import PackageDependency
+from pkgdash.models.facets import count_new_packages
 from pkgdash.models.spdx_license import SPDXLicense
 from pkgdash.analyze.github.fetch_github import fetch_repo, save_sourcelink
 from pkgdash.analyze.vuln.osv import find_osv_vulns
@@ -279,12 +281,14 @@ class DatabaseManager:
     async def _upsert_package(self, package: Package) -> None:
         try:
             await package.save()
+            await count_new_packages([package])
             logging.info(f"Package {package.purl} saved to database")
         except DuplicateKeyError:
             await Package.find_one({"purl": package.purl}).update(
                 {"$set": package.dict(exclude={"record_created_at"})}
             )
             logging.info(f"Package {package.purl} updated in database")
+        await invalidate_soon(Package)
 
     async def _upsert_dependency(self, dependency: PackageDependency) -> None:
         try:
@@ -297,6 +301,7 @@ class DatabaseManager:
             ).update({"$set": dependency.dict(exclude={"record_created_at"})})
             logging.info(
                 f"Dependency {dependency.dep_purl} for {dependency.purl} updated")
+        await invalidate_soon(PackageDependency)
 
 
 class PackageProcessor:
@@ -441,6 +446,7 @@ class NPMPackageAnalyzer:
 
         tasks = [process_with_semaphore(pf) for pf in package_files]
         await asyncio.gather(*tasks, return_exceptions=True)
+        await flush_invalidations()
 
         logging.info(f"Completed processing {self.processed_count} packages")
 
@@ -19,6 +19,8 @@ from packageurl import PackageURL
 from pymongo.errors import DuplicateKeyError
 from pkgdash.models.database.package import Package
 from pkgdash.models.database.deplink import PackageDependency
+from pkgdash.models.facets import count_new_packages
+from pkgdash.cache import flush_invalidations, invalidate_soon
 from pkgdash.models.connector.mongo import create_engine
 from pkgdash.models.spdx_license import SPDXLicense
 from pkgdash.analyze.github.source import save_sourcelink
@@ -95,6 +97,7 @@ async def save_package_to_db(
 
     try:
         await package.save()
+        await count_new_packages([package])
         print(f"Package {package_url} saved to database")
     except DuplicateKeyError:
         await Package.find_one({"purl": package_url.to_string()}).update(
@@ -102,6 +105,7 @@ async def save_package_to_db(
         )
         print(f"Package {package_url} updated in database")
     finally:
+        await invalidate_soon(Package)
         return package
 
 
@@ -183,6 +187,8 @@ async def save_dependencies_to_db(
             except Exception as dep_error:
                 continue
 
+        await invalidate_soon(PackageDependency)
+
     except Exception as e:
         print(
             f"ERROR: Fatal error in save_dependencies_to_db for {package.purl}: {e}")
@@ -275,6 +281,7 @@ async def analyze(packages_dir: str, save_to_db: bool = True) -> None:
         if p.endswith(".tar.gz") or p.endswith(".tar.bz2")
     ]
     await asyncio.gather(*tasks)
+    await flush_invalidations()
 
 
 if __name__ == "__main__":
@@ -148,6 +148,8 @@ if __name__ == '__main__':
     from pkgdash.models.connector.mongo import create_engine
     from pkgdash.models.database.osrepo import OSPackageRepository
     from pkgdash.models.database.deplink import PackageDependency
+    from pkgdash.cache import invalidate
+    from pkgdash.graph.materialize import refresh_transitive_deps
 
     async def main():
         await create_engine()
@@ -188,6 +190,10 @@ if __name__ == '__main__':
 
                             await rec.save(bulk_writer=writer)
 
+                await invalidate(PackageDependency)
+
+        await refresh_transitive_deps()
+
     import asyncio
 
     asyncio.run(main())
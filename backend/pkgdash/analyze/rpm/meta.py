@@ -9,7 +9,9 @@ from beanie import BulkWriter
 from beanie.odm.operators.update.general import Set
 
 from pkgdash import settings, logger
+from pkgdash.cache import invalidate
 from pkgdash.models.database.package import Package
+from pkgdash.models.facets import count_new_packages
 
 
 def _uncompress_if_gzip(path: os.PathLike) -> str:
@@ -93,6 +95,7 @@ async def import_rpm_sqlite(path: os.PathLike, distro='openeuler', release='22.0
     res = cur.fetchall()
     logger.info(f"Importing {len(res)} packages from {sqlite_path}")
 
+    new_packages = []
     async with BulkWriter() as writer:
         for rpkg in res:
             rpkg = dict(**rpkg, distro=distro, distro_release=release)
@@ -121,9 +124,13 @@ async def import_rpm_sqlite(path: os.PathLike, distro='openeuler', release='22.0
 
             pkg.distro = rpkg['distro']
             pkg.distro_release = rpkg['distro_release']
+            if pkg.id is None:
+                new_packages.append(pkg)
             await pkg.save(bulk_writer=writer)
 
     con.close()
+    await invalidate(Package)
+    await count_new_packages(new_packages)
 
 
 if __name__ == "__main__":
@@ -9,6 +9,7 @@ from beanie import BulkWriter
 from beanie.odm.operators.update.general import Set
 
 from pkgdash import settings, logger
+from pkgdash.cache import invalidate
 from pkgdash.models.database.package import Package
 
 GITHUB_PATTERN = re.compile(r'^(https?://)?(www\.)?github\.com/([a-zA-Z0-9_.-]+)/([a-zA-Z0-9_.-]+)/?$')
@@ -41,4 +42,5 @@ if __name__ == "__main__":
                         type='rpm',
                     )
                     await record.save(bulk_writer=bulk_writer)
+        await invalidate(PackageSource)
     asyncio.run(main())
\ No newline at end of file
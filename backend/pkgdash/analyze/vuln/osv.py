@@ -12,6 +12,7 @@ from pkgdash.models.database.package import PackageVulns
 from datetime import datetime
 from typing import AsyncGenerator, Tuple, Literal, List
 from zoneinfo import ZoneInfo
+from pkgdash.cache import flush_invalidations, invalidate_soon
 from pkgdash.models.connector.mongo import create_engine
 from packageurl import PackageURL
 import requests
@@ -138,6 +139,7 @@ async def save_to_db(doc: PackageVulns, primary_key: dict) -> None:
         else:
             await doc.save()
             logger.info(f"Document {url_value} saved to {type(doc).__name__} database")
+        await invalidate_soon(type(doc))
     except Exception as e:
         logger.error(f"Saving document {url_value} error: {e}")
 
@@ -201,5 +203,6 @@ if __name__ == "__main__":
             logger.warning("Error: %s, purl=%s, skip", e, purl)
         except Exception:
             logger.exception("Error processing purl=%s, skip", purl)
+        await flush_invalidations()
 
     asyncio.run(main())
@@ -0,0 +1,3 @@
+"""
+Tooling to measure the backend at production scale without production data
+"""
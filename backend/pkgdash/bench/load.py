@@ -0,0 +1,326 @@
+"""
+API load benchmark
+
+Starts pkgdash.serve.app:app with uvicorn (or targets a running server with --url),
+samples packages and repositories from the configured MongoDB, and replays a weighted
+mix of the calls the frontend makes (frontend/src/api/package.ts and repository.ts, in
+the proportions of its pages) with a fixed number of concurrent clients.
+
+Throughput and p50 / p95 / p99 latencies per route go to a JSON file; --compare prints
+the change of each route against an earlier result, e.g. from the previous commit:
+
+    PKGDASH_MONGODB__DB=pkgdash_bench python -m pkgdash.bench.load -c 1 8 32 -o after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+from pkgdash import logger, settings
+from pkgdash.models import Package, Repository
+from pkgdash.models.connector.mongo import create_engine
+
+
+@dataclass
+class Targets:
+    """Documents the requests are made about"""
+
+    purls: List[str]
+    repo_urls: List[str]
+    """Prefixes of package names, as typed in the search box"""
+    queries: List[str]
+    distros: List[str]
+
+
+@dataclass
+class Call:
+    """A frontend call; `params` builds the query string (or the JSON body for POST)"""
+
+    name: str
+    weight: float
+    method: str
+    path: str
+    params: Callable[[random.Random, Targets], Dict[str, Any]]
+
+
+def _purl(rng, t):
+    return {"purl": rng.choice(t.purls)}
+
+
+def _url(rng, t):
+    return {"url": rng.choice(t.repo_urls)}
+
+
+def _search(rng, t):
+    params = {"q": rng.choice(t.queries), "page": 1, "size": 20}
+    if t.distros and rng.random() < 0.3:
+        params["distros"] = rng.choice(t.distros)
+    return params
+
+
+# weights follow the pages: the index page searches, the package page loads info, deps,
+# tdeps, rdeps, alerts and recommendations at once, the repository page info and stats
+FRONTEND_MIX = [
+    Call("pkg_search", 20, "GET", "/api/pkg/search", _search),
+    Call("pkg_distros", 4, "GET", "/api/pkg/distros", lambda rng, t: {}),
+    Call("pkg_list", 2, "GET", "/api/pkg/list", lambda rng, t: {"page": rng.randint(1, 50), "size": 20}),
+    Call("pkg_info", 12, "GET", "/api/pkg/info", _purl),
+    Call("pkg_deps", 10, "GET", "/api/pkg/deps", _purl),
+    Call("pkg_tdeps", 6, "GET", "/api/pkg/tdeps", _purl),
+    Call("pkg_rdeps", 8, "GET", "/api/pkg/rdeps", _purl),
+    Call("pkg_alerts", 8, "GET", "/api/pkg/alerts", _purl),
+    Call("pkg_sources", 4, "GET", "/api/pkg/sources", _purl),
+    Call("pkg_stats", 2, "GET", "/api/pkg/stats", _purl),
+    Call("pkg_batch", 2, "POST", "/api/pkg/batch", lambda rng, t: {"purls": rng.sample(t.purls, min(20, len(t.purls)))}),
+    Call("repo_rec", 6, "GET", "/api/repo/rec", _url),
+    Call("repo_info", 8, "GET", "/api/repo/info", _url),
+    Call("repo_stats", 6, "GET", "/api/repo/stats", _url),
+    Call("repo_packages", 4, "GET", "/api/repo/packages", _url),
+    Call("repo_search", 2, "GET", "/api/repo/search", lambda rng, t: {"q": rng.choice(t.queries), "size": 20}),
+]
+
+
+async def sample_targets(n: int) -> Targets:
+    """n random packages (with their repositories) and repositories of the configured database"""
+    await create_engine()
+    pipeline = [{"$sample": {"size": n}}, {"$project": {"_id": 0, "purl": 1, "name": 1, "distro": 1}}]
+    packages = await Package.get_motor_collection().aggregate(pipeline).to_list(None)
+    pipeline = [{"$sample": {"size": n}}, {"$project": {"_id": 0, "url": 1}}]
+    repos = await Repository.get_motor_collection().aggregate(pipeline).to_list(None)
+    if not packages or not repos:
+        raise SystemExit(f"Database {settings.mongodb.db} has no packages or repositories, see pkgdash.bench.synthetic")
+    names = [p["name"] for p in packages if p.get("name")]
+    return Targets(
+        purls=[p["purl"] for p in packages],
+        repo_urls=[r["url"] for r in repos],
+        queries=[name[: max(3, len(name) // 2)] for name in names],
+        distros=sorted({p["distro"] for p in packages if p.get("distro")}),
+    )
+
+
+def _flatten(params: Dict[str, Any]) -> List[Tuple[str, str]]:
+    return [(k, str(v)) for k, v in params.items()]
+
+
+async def run_level(
+    base_url: str,
+    targets: Targets,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    seed: int,
+    mix: List[Call] = FRONTEND_MIX,
+) -> Dict[str, Any]:
+    """Runs `concurrency` closed-loop clients for warmup + duration seconds"""
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    sizes: Dict[str, int] = defaultdict(int)
+    weights = [c.weight for c in mix]
+    started = time.perf_counter()
+    measure_from, stop_at = started + warmup, started + warmup + duration
+
+    async def client(i: int, session: aiohttp.ClientSession):
+        rng = random.Random(seed * 1000 + i)
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            call = rng.choices(mix, weights)[0]
+            params = call.params(rng, targets)
+            t0 = time.perf_counter()
+            try:
+                if call.method == "POST":
+                    request = session.post(base_url + call.path, json=params)
+                else:
+                    request = session.get(base_url + call.path, params=_flatten(params))
+                async with request as res:
+                    body = await res.read()
+                    ok = res.status < 500
+            except aiohttp.ClientError:
+                body, ok = b"", False
+            t1 = time.perf_counter()
+            if t0 < measure_from:
+                continue
+            samples[call.name].append(t1 - t0)
+            sizes[call.name] += len(body)
+            if not ok:
+                errors[call.name] += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as session:
+        await asyncio.gather(*(client(i, session) for i in range(concurrency)))
+
+    routes = {}
+    for call in mix:
+        latencies = np.array(samples.get(call.name, []))
+        if not len(latencies):
+            continue
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        routes[call.name] = {
+            "path": call.path,
+            "requests": len(latencies),
+            "errors": errors[call.name],
+            "throughput_rps": len(latencies) / duration,
+            "mean_ms": float(latencies.mean() * 1000),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(latencies.max() * 1000),
+            "mean_bytes": sizes[call.name] / len(latencies),
+        }
+    all_latencies = np.concatenate([np.array(v) for v in samples.values()]) if samples else np.zeros(1)
+    p50, p95, p99 = np.percentile(all_latencies, [50, 95, 99]) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": int(sum(len(v) for v in samples.values())),
+        "errors": int(sum(errors.values())),
+        "throughput_rps": sum(len(v) for v in samples.values()) / duration,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "routes": routes,
+    }
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    """uvicorn serving pkgdash.serve.app:app; settings come from the environment like for the real server"""
+    cmd = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "pkgdash.serve.app:app",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+        "--workers",
+        str(workers),
+        "--log-level",
+        "warning",
+    ]
+    return subprocess.Popen(cmd, env=os.environ.copy())
+
+
+async def wait_until_healthy(base_url: str, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(base_url + "/api/health") as res:
+                    if res.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"{base_url} didn't become healthy within {timeout}s")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: Dict[str, Any], result: Dict[str, Any]) -> None:
+    """Logs the p50 / p95 / throughput change of every route and concurrency level"""
+    before = {(level["concurrency"], name): r for level in baseline["levels"] for name, r in level["routes"].items()}
+    for level in result["levels"]:
+        for name, r in level["routes"].items():
+            b = before.get((level["concurrency"], name))
+            if b is None:
+                continue
+            logger.info(
+                "c={:<3} {:<14} p50 {:8.1f} -> {:8.1f} ms ({:+.0%})  p95 {:8.1f} -> {:8.1f} ms ({:+.0%})  rps {:+.0%}",
+                level["concurrency"],
+                name,
+                b["p50_ms"],
+                r["p50_ms"],
+                r["p50_ms"] / b["p50_ms"] - 1,
+                b["p95_ms"],
+                r["p95_ms"],
+                r["p95_ms"] / b["p95_ms"] - 1,
+                r["throughput_rps"] / b["throughput_rps"] - 1,
+            )
+
+
+async def run(args) -> Dict[str, Any]:
+    targets = await sample_targets(args.targets)
+    server = None
+    base_url = args.url
+    if base_url is None:
+        base_url = f"http://127.0.0.1:{args.port}"
+        server = start_server(args.port, args.workers)
+    try:
+        await wait_until_healthy(base_url)
+        levels = []
+        for concurrency in args.concurrency:
+            level = await run_level(base_url, targets, concurrency, args.duration, args.warmup, args.seed)
+            logger.info(
+                "c={}: {:.1f} req/s, p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms, {} errors",
+                concurrency,
+                level["throughput_rps"],
+                level["p50_ms"],
+                level["p95_ms"],
+                level["p99_ms"],
+                level["errors"],
+            )
+            levels.append(level)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    return {
+        "commit": _git_commit(),
+        "started_at": datetime.utcnow().isoformat(),
+        "url": base_url,
+        "database": settings.mongodb.db,
+        "workers": None if args.url else args.workers,
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+        "seed": args.seed,
+        "targets": {"packages": len(targets.purls), "repositories": len(targets.repo_urls)},
+        "mix": {c.name: c.weight for c in FRONTEND_MIX},
+        "levels": levels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser("API load benchmark")
+    parser.add_argument("-c", "--concurrency", nargs="+", default=[1, 8, 32], type=int, help="Concurrent clients")
+    parser.add_argument("-d", "--duration", default=30.0, type=float, help="Measured seconds per concurrency level")
+    parser.add_argument("-w", "--warmup", default=5.0, type=float, help="Unmeasured seconds before each level")
+    parser.add_argument("-o", "--output", default="bench-load.json", help="Result file (JSON)")
+    parser.add_argument("--url", default=None, help="Benchmark a running server instead of starting one")
+    parser.add_argument("-p", "--port", default=19438, type=int, help="Port of the started server")
+    parser.add_argument("--workers", default=1, type=int, help="uvicorn workers of the started server")
+    parser.add_argument("--targets", default=1000, type=int, help="Packages / repositories sampled as targets")
+    parser.add_argument("-s", "--seed", default=42, type=int, help="Seed of the request sequence")
+    parser.add_argument("--compare", default=None, help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    logger.info("Results written to {}", args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
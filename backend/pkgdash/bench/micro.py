@@ -0,0 +1,259 @@
+"""
+Micro-benchmarks of the pure Python hot paths of ingest and serving
+
+Every benchmark times one pass over a list of representative inputs with timeit and
+reports the time per call. A benchmark whose module can't be imported (e.g. solv isn't
+installed) is reported as skipped. Results can be written to JSON and compared:
+
+    python -m pkgdash.bench.micro -o after.json --compare before.json
+    python -m pkgdash.bench.micro -k purl
+"""
+
+import argparse
+import json
+import statistics
+import timeit
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from pkgdash import logger
+
+# name -> setup; the setup imports the code under test and returns (fn, inputs)
+BENCHMARKS: Dict[str, Callable[[], Any]] = {}
+
+
+def benchmark(name: str):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def _names(n: int) -> List[str]:
+    return [f"{stem}{i}" for i in range(n // 4) for stem in ("libfoo", "python3-requests", "left-pad", "jackson-core")]
+
+
+def _purls() -> List[str]:
+    purls = []
+    for i, name in enumerate(_names(200)):
+        purls += [
+            f"pkg:rpm/openeuler/{name}@2.{i}.1-3.oe2203sp1?arch=x86_64&epoch=0&distro=openeuler-2203sp1",
+            f"pkg:npm/%40scope{i % 7}/{name}@1.{i}.0",
+            f"pkg:pypi/{name}@0.{i}.2",
+            f"pkg:maven/org.example{i % 5}/{name}@3.{i}?type=jar",
+        ]
+    return purls
+
+
+def _repo_urls() -> List[Optional[str]]:
+    urls = []
+    for i, name in enumerate(_names(100)):
+        urls += [
+            f"https://github.com/org{i}/{name}",
+            f"git+https://github.com/org{i}/{name}.git",
+            f"https://www.github.com/org{i}/{name}/",
+            f"http://gitlab.com/group{i}/{name}",
+            f"git://gitee.com/org{i}/{name}.git",
+            f"https://{name}.readthedocs.io/en/latest/",
+            f"https://github.com/org{i}/{name}/tree/main/packages/core",
+            None,
+        ]
+    return urls
+
+
+@benchmark("purl_from_string")
+def _purl_from_string():
+    from packageurl import PackageURL
+
+    return PackageURL.from_string, _purls()
+
+
+@benchmark("purl_to_string")
+def _purl_to_string():
+    from packageurl import PackageURL
+
+    return PackageURL.to_string, [PackageURL.from_string(p) for p in _purls()]
+
+
+@benchmark("purl_canonicalize")
+def _purl_canonicalize():
+    # what the routes do with user supplied purls
+    from pkgdash.models.purl import PurlLookup
+
+    return PurlLookup, _purls()
+
+
+@benchmark("purl_keys")
+def _purl_keys():
+    from pkgdash.models.purl import purl_keys
+
+    # uncached, as for a stream of distinct purls during ingest
+    return purl_keys.__wrapped__, _purls()
+
+
+@benchmark("sanitize_vcs_url")
+def _sanitize():
+    from pkgdash.analyze.utils import _sanitize_vcs_url
+
+    return _sanitize_vcs_url, _repo_urls()
+
+
+@benchmark("vcs_pattern_match")
+def _vcs_pattern():
+    from pkgdash.analyze.utils import VCS_PATTERN
+
+    return VCS_PATTERN.match, [u for u in _repo_urls() if u is not None]
+
+
+@benchmark("generate_purl_from_rpm")
+def _rpm_purl():
+    from pkgdash.analyze.rpm.meta import _generate_purl_from_rpm
+
+    rows = [
+        dict(
+            name=name,
+            version=f"2.{i}.1",
+            release=f"{i % 4}.oe2203sp1",
+            arch=("x86_64", "noarch", "aarch64")[i % 3],
+            epoch=str(i % 2),
+            distro="openeuler",
+            distro_release="2203sp1",
+        )
+        for i, name in enumerate(_names(800))
+    ]
+    return _generate_purl_from_rpm, rows
+
+
+@benchmark("solvable_to_purl")
+def _solvable():
+    from pkgdash.analyze.rpm.dep import _solvable_to_purl
+
+    # the attributes of solv.XSolvable the function reads
+    solvables = [
+        SimpleNamespace(name=name, evr=f"{i % 2}:2.{i}.1-3.oe2203sp1", arch=("x86_64", "noarch")[i % 2])
+        for i, name in enumerate(_names(800))
+    ]
+    return (lambda s: _solvable_to_purl(s, "openeuler", "2203sp1")), solvables
+
+
+@benchmark("extract_cve_ids_from_vuln")
+def _cve_ids():
+    from pkgdash.analyze.vuln.osv import extract_cve_ids_from_vuln
+
+    vulns = [
+        {
+            "id": f"GHSA-{i:04x}-abcd-efgh" if i % 2 else f"CVE-2023-{10000 + i}",
+            "summary": "Improper input validation in request parsing",
+            "details": f"A crafted header allows request smuggling. Fixed in 2.{i}. See CVE-2023-{10000 + i} "
+            "for details. " * 3,
+            "aliases": [f"CVE-2023-{10000 + i}", f"PYSEC-2023-{i}"],
+            "references": [
+                {"type": "ADVISORY", "url": f"https://nvd.nist.gov/vuln/detail/CVE-2023-{10000 + i}"},
+                {"type": "WEB", "url": f"https://github.com/org/repo/commit/{i:040x}"},
+                {"type": "PACKAGE", "url": "https://pypi.org/project/requests"},
+            ]
+            * 3,
+        }
+        for i in range(200)
+    ]
+    return extract_cve_ids_from_vuln, vulns
+
+
+def _descriptions() -> List[Optional[str]]:
+    descriptions = []
+    for i, name in enumerate(_names(100)):
+        descriptions += [
+            f"{name} is a library for parsing things. It is fast and small.",
+            f"# {name}\n\nA **markdown** readme with badges [![build](https://ci/{i})](https://ci)\n" * 5,
+            f"{name} " + "without any sentence ending at all " * 20,
+            f"{name} 是一个用于解析数据的库。它很快。",
+            "  ",
+        ]
+    return descriptions
+
+
+@benchmark("npm_extract_summary")
+def _npm_summary():
+    from pkgdash.analyze.npm.meta import PackageParser
+
+    return PackageParser.extract_summary, _descriptions()
+
+
+@benchmark("maven_extract_summary")
+def _maven_summary():
+    from pkgdash.analyze.maven.analyzer import PackageParser
+
+    return PackageParser.extract_summary, _descriptions()
+
+
+def run_benchmark(fn: Callable, inputs: List[Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    def one_pass():
+        for x in inputs:
+            fn(x)
+
+    timer = timeit.Timer(one_pass)
+    # passes per measurement so that each lasts at least min_time
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    per_call = [t / number / len(inputs) * 1e9 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "inputs": len(inputs),
+        "min_ns": min(per_call),
+        "median_ns": statistics.median(per_call),
+        "mean_ns": statistics.mean(per_call),
+        "stdev_ns": statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        "ops_per_s": 1e9 / min(per_call),
+    }
+
+
+def run(names: List[str], repeat: int = 5, min_time: float = 0.2) -> Dict[str, Any]:
+    results = {}
+    for name in names:
+        try:
+            fn, inputs = BENCHMARKS[name]()
+        except ImportError as e:
+            logger.warning("{:<28} skipped: {}", name, e)
+            results[name] = {"skipped": str(e)}
+            continue
+        r = results[name] = run_benchmark(fn, inputs, repeat, min_time)
+        logger.info(
+            "{:<28} {:>10.0f} ns/call (median {:.0f}, stdev {:.0f}) {:>12.0f} ops/s",
+            name,
+            r["min_ns"],
+            r["median_ns"],
+            r["stdev_ns"],
+            r["ops_per_s"],
+        )
+    return results
+
+
+def compare(baseline: Dict[str, Any], results: Dict[str, Any]) -> None:
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b or "skipped" in b or "skipped" in r:
+            continue
+        logger.info("{:<28} {:>10.0f} -> {:>10.0f} ns/call ({:+.0%})", name, b["min_ns"], r["min_ns"], r["min_ns"] / b["min_ns"] - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser("Micro-benchmarks")
+    parser.add_argument("-k", "--filter", default=None, help="Only run benchmarks whose name contains this")
+    parser.add_argument("-r", "--repeat", default=5, type=int, help="Measurements per benchmark")
+    parser.add_argument("--min-time", default=0.2, type=float, help="Minimum seconds per measurement")
+    parser.add_argument("-o", "--output", default=None, help="Result file (JSON)")
+    parser.add_argument("--compare", default=None, help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    names = [n for n in BENCHMARKS if args.filter is None or args.filter in n]
+    results = run(names, args.repeat, args.min_time)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""
+Synthetic dataset generator for scale testing
+
+Fills the configured MongoDB (mongodb.url / mongodb.db, e.g. PKGDASH_MONGODB__DB=pkgdash_bench)
+with documents shaped like the analyzers' output:
+
+- Package: RPM packages for every distro of [os_repo], npm (partly scoped) and PyPI
+  packages, with purls in the formats the importers write
+- PackageDependency: edges within an ecosystem (and within a distro for RPM) whose
+  in-degree follows a power law, so a few packages are required by most others
+- Repository, RepositoryStats, PackageStats, PackageSource: one GitHub repository per
+  upstream project, shared by its RPM, npm and PyPI packages (python3-foo / foo)
+- PackageVulns: CVE lists where a few CVEs affect many packages
+
+The dataset only depends on the arguments: the same --seed gives the same documents.
+
+    python -m pkgdash.bench.synthetic --packages 1M --drop
+"""
+
+import argparse
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from pkgdash import logger, settings
+from pkgdash.analyze.rpm.meta import _generate_purl_from_rpm, _generate_source_purl_from_rpm
+from pkgdash.cache import invalidate
+from pkgdash.models import Package, PackageSource, PackageStats, PackageVulns
+from pkgdash.models.connector.mongo import _ORM_MODELS, create_engine
+from pkgdash.models.facets import recount_facets
+
+# 2-letter syllables, so that names made of them are unique
+SYLLABLES = [c + v for c in "bdfgklmnprstvz" for v in "aeiou"]
+RPM_PREFIXES = ["", "lib", "python3-", "perl-", "golang-", "", "", "rust-"]
+RPM_SUFFIXES = ["", "", "-devel", "-libs", "", "-doc", "", "-tools"]
+LICENSES = ["MIT", "Apache-2.0", "GPL-2.0-or-later", "BSD-3-Clause", "LGPL-2.1-or-later", "GPL-3.0-only", "ISC", "MPL-2.0"]
+LANGUAGES = {"rpm": "C", "npm": "JavaScript", "pypi": "Python"}
+
+# share of generated packages per ecosystem
+ECOSYSTEM_SHARES = {"rpm": 0.5, "npm": 0.3, "pypi": 0.2}
+# npm / PyPI versions per project (RPM projects have one package per distro instead)
+VERSIONS = 3
+# share of upstream projects with a GitHub repository
+REPO_SHARE = 0.75
+# dates are relative to a fixed day so the dataset is reproducible
+EPOCH = datetime(2024, 1, 1)
+
+
+def word(n: int) -> str:
+    """A unique pronounceable name for n, at least two syllables long"""
+    n += len(SYLLABLES)
+    out = []
+    while n:
+        n, r = divmod(n, len(SYLLABLES))
+        out.append(SYLLABLES[r])
+    return "".join(reversed(out))
+
+
+def has_repo(project: int) -> bool:
+    return (project * 2654435761) % 1000 < REPO_SHARE * 1000
+
+
+def repo_url(project: int) -> str:
+    return f"https://github.com/{word((project * 7919) % 5000)}/{word(project)}"
+
+
+def parse_count(s: str) -> int:
+    """1000, 10k, 1.5M"""
+    factor = {"k": 10**3, "m": 10**6}.get(s[-1].lower(), 1)
+    return int(float(s[:-1] if factor > 1 else s) * factor)
+
+
+@dataclass(frozen=True)
+class Ecosystem:
+    """The packages of one purl type: project p, variant v is package offset + p * per_project + v"""
+
+    type: str
+    offset: int
+    n_projects: int
+    """distros for RPM, versions otherwise"""
+    per_project: int
+
+    @property
+    def n_packages(self) -> int:
+        return self.n_projects * self.per_project
+
+
+@dataclass
+class SyntheticPackage:
+    index: int
+    ecosystem: str
+    project: int
+    variant: int
+    purl: str
+    purl_key: str
+    purl_base: str
+    name: str
+    version: str
+    repo_url: Optional[str]
+
+
+class SyntheticDataset:
+    def __init__(
+        self,
+        n_packages: int,
+        seed: int = 42,
+        avg_deps: float = 5.0,
+        alpha: float = 1.1,
+        months: int = 12,
+        vuln_share: float = 0.05,
+        batch_size: int = 10000,
+    ):
+        self.seed = seed
+        self.avg_deps = avg_deps
+        self.alpha = alpha
+        self.months = months
+        self.vuln_share = vuln_share
+        self.batch_size = batch_size
+        self.distros: List[Tuple[str, str]] = [tuple(k.split("-", 1)) for k in settings.os_repo]
+
+        self.ecosystems: List[Ecosystem] = []
+        offset = 0
+        for type, share in ECOSYSTEM_SHARES.items():
+            per_project = len(self.distros) if type == "rpm" else VERSIONS
+            n_projects = max(1, round(n_packages * share / per_project))
+            self.ecosystems.append(Ecosystem(type, offset, n_projects, per_project))
+            offset += n_projects * per_project
+        self.n_packages = offset
+        self.n_projects = max(e.n_projects for e in self.ecosystems)
+        # dependency targets are drawn from a power law, most of them repeat
+        self.package = lru_cache(maxsize=1 << 16)(self.package)
+
+    def _rng(self, *stream: int) -> np.random.Generator:
+        return np.random.default_rng([self.seed, *stream])
+
+    def package(self, eco: Ecosystem, project: int, variant: int) -> SyntheticPackage:
+        base_version = f"{project % 9}.{(project // 9) % 30}"
+        name = word(project)
+        if eco.type == "rpm":
+            distro, release = self.distros[variant]
+            name = f"{RPM_PREFIXES[project % 8]}{name}{RPM_SUFFIXES[(project // 8) % 8]}"
+            version = f"{base_version}.{project % 4}"
+            rpm_release = f"{1 + project % 3}.{distro[:2]}{release}"
+            d = dict(
+                name=name,
+                version=version,
+                release=rpm_release,
+                arch="noarch" if project % 5 == 0 else "x86_64",
+                epoch="0",
+                distro=distro,
+                distro_release=release,
+            )
+            purl = _generate_purl_from_rpm(d)
+            base = f"pkg:rpm/{distro}/{name}"
+            key = f"{base}@{version}-{rpm_release}"
+        else:
+            version = f"{base_version}.{variant}"
+            if eco.type == "npm" and project % 4 == 0:
+                base = f"pkg:npm/%40{word(project % 997)}/{name}"
+            else:
+                base = f"pkg:{eco.type}/{name}"
+            purl = key = f"{base}@{version}"
+        return SyntheticPackage(
+            index=eco.offset + project * eco.per_project + variant,
+            ecosystem=eco.type,
+            project=project,
+            variant=variant,
+            purl=purl,
+            purl_key=key,
+            purl_base=base,
+            name=name,
+            version=version,
+            repo_url=repo_url(project) if has_repo(project) else None,
+        )
+
+    def packages(self, eco: Ecosystem, start: int, stop: int) -> Iterator[SyntheticPackage]:
+        """Packages with local index in [start, stop)"""
+        for i in range(start, stop):
+            yield self.package(eco, *divmod(i, eco.per_project))
+
+    def package_doc(self, pkg: SyntheticPackage) -> Dict[str, Any]:
+        summary = f"{pkg.name} {' '.join(word(pkg.project * 31 + k) for k in range(4))}"
+        doc = dict(
+            purl=pkg.purl,
+            purl_key=pkg.purl_key,
+            purl_base=pkg.purl_base,
+            name=pkg.name,
+            version=pkg.version,
+            summary=summary,
+            description=" ".join([summary] * 8),
+            license=LICENSES[pkg.project % len(LICENSES)],
+            homepage_url=pkg.repo_url or f"https://{word(pkg.project)}.org",
+            repo_url=pkg.repo_url,
+            source_purl=None,
+            distro=pkg.ecosystem,
+            distro_release=None,
+            arch=None,
+            source_pid=None,
+            record_created_at=EPOCH - timedelta(days=pkg.project % 365),
+            record_updated_at=EPOCH,
+        )
+        if pkg.ecosystem == "rpm":
+            distro, release = self.distros[pkg.variant]
+            d = dict(
+                version=pkg.version,
+                epoch="0",
+                distro=distro,
+                distro_release=release,
+            )
+            source_rpm = f"{word(pkg.project)}-{pkg.purl_key.rsplit('@', 1)[1]}.src.rpm"
+            doc.update(
+                distro=distro,
+                distro_release=release,
+                arch=pkg.purl.split("arch=", 1)[1].split("&", 1)[0],
+                source_pid=source_rpm,
+                source_purl=_generate_source_purl_from_rpm(d, source_rpm),
+            )
+        return doc
+
+    def dependency_batches(self, eco: Ecosystem) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Out-degrees are geometric around avg_deps; targets are drawn from a Zipf law over a
+        random ranking of the projects. RPM packages depend on packages of their own distro.
+        """
+        rng = self._rng(1, self.ecosystems.index(eco))
+        rank_to_project = rng.permutation(eco.n_projects)
+        cdf = np.cumsum(np.arange(1, eco.n_projects + 1, dtype=np.float64) ** -self.alpha)
+        cdf /= cdf[-1]
+        p = 1 / (self.avg_deps + 1)
+        for start in range(0, eco.n_packages, self.batch_size):
+            stop = min(start + self.batch_size, eco.n_packages)
+            degrees = rng.geometric(p, stop - start) - 1
+            src = np.repeat(np.arange(start, stop), degrees)
+            ranks = np.minimum(np.searchsorted(cdf, rng.random(len(src))), eco.n_projects - 1)
+            if eco.type == "rpm":
+                variants = src % eco.per_project
+            else:
+                variants = rng.integers(eco.per_project, size=len(src))
+            dst = rank_to_project[ranks] * eco.per_project + variants
+            keep = src // eco.per_project != dst // eco.per_project
+            pairs = np.unique(src[keep].astype(np.int64) * eco.n_packages + dst[keep])
+            docs = []
+            for pair in pairs.tolist():
+                s, t = divmod(pair, eco.n_packages)
+                a = self.package(eco, *divmod(s, eco.per_project))
+                b = self.package(eco, *divmod(t, eco.per_project))
+                major_minor = b.version.rsplit(".", 1)[0]
+                docs.append(
+                    dict(
+                        purl=a.purl,
+                        purl_key=a.purl_key,
+                        purl_base=a.purl_base,
+                        pkgid=a.index if eco.type == "rpm" else None,
+                        dep_purl=b.purl,
+                        dep_purl_key=b.purl_key,
+                        dep_purl_base=b.purl_base,
+                        dep_pkgid=b.index if eco.type == "rpm" else None,
+                        type=eco.type,
+                        constraint={"rpm": f">= {major_minor}", "npm": f"^{major_minor}.0"}.get(
+                            eco.type, f">={major_minor}"
+                        ),
+                        dep_at=EPOCH,
+                    )
+                )
+            yield docs
+
+    def _months(self) -> List[datetime]:
+        months, d = [], EPOCH
+        for _ in range(self.months):
+            d = (d - timedelta(days=1)).replace(day=1)
+            months.append(d)
+        return months
+
+    def _activity(self, rng: np.random.Generator, scale: float) -> Dict[str, int]:
+        lam = np.array([20, 30, 8, 6, 10, 1]) * scale
+        counts = rng.poisson(lam).tolist()
+        return dict(zip(["n_commits", "n_comments", "n_issues", "n_prs", "n_stars", "n_tags"], counts))
+
+    def repository_batches(self) -> Iterator[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """(Repository docs, RepositoryStats docs)"""
+        rng = self._rng(2)
+        months = self._months()
+        for start in range(0, self.n_projects, self.batch_size):
+            repos, stats = [], []
+            for project in range(start, min(start + self.batch_size, self.n_projects)):
+                if not has_repo(project):
+                    continue
+                url = repo_url(project)
+                n_stars = int(rng.pareto(1.2) * 20)
+                similar = rng.integers(self.n_projects, size=int(rng.integers(6))).tolist()
+                created = EPOCH - timedelta(days=int(rng.integers(30, 5000)))
+                repos.append(
+                    dict(
+                        url=url,
+                        name=word(project),
+                        n_stars=n_stars,
+                        created_at=created,
+                        updated_at=EPOCH - timedelta(days=int(rng.integers(0, 30))),
+                        pushed_at=EPOCH - timedelta(days=int(rng.integers(0, 60))),
+                        archived_at=EPOCH if project % 50 == 0 else None,
+                        is_template=False,
+                        is_fork=project % 33 == 0,
+                        primary_language=LANGUAGES[self.ecosystems[project % len(self.ecosystems)].type],
+                        topics=[word(project * 13 + k) for k in range(project % 4)],
+                        description=f"{word(project)} {word(project * 31)}",
+                        similar_repos=[repo_url(p) for p in similar if p != project and has_repo(p)],
+                        recommended_purls=None,
+                        license=LICENSES[project % len(LICENSES)],
+                        record_created_at=created,
+                        record_updated_at=EPOCH,
+                    )
+                )
+                scale = 1 + np.log1p(n_stars)
+                for month in months:
+                    stats.append(
+                        dict(
+                            url=url,
+                            stats_from=month,
+                            stats_interval="Month",
+                            **self._activity(rng, scale),
+                            hits=None,
+                            hits_rank_pct=None,
+                            hits_zscore=None,
+                            record_created_at=EPOCH,
+                            record_updated_at=EPOCH,
+                        )
+                    )
+            yield repos, stats
+
+    def package_batches(self, eco: Ecosystem) -> Iterator[Dict[str, List[Dict[str, Any]]]]:
+        """{collection: docs} of Package and the per-package collections"""
+        rng = self._rng(3, self.ecosystems.index(eco))
+        months = self._months()
+        n_cves = max(100, self.n_packages // 50)
+        cve_cdf = np.cumsum(np.arange(1, n_cves + 1, dtype=np.float64) ** -self.alpha)
+        cve_cdf /= cve_cdf[-1]
+        for start in range(0, eco.n_packages, self.batch_size):
+            docs = {model.__name__: [] for model in (Package, PackageSource, PackageStats, PackageVulns)}
+            for pkg in self.packages(eco, start, min(start + self.batch_size, eco.n_packages)):
+                docs["Package"].append(self.package_doc(pkg))
+                if pkg.repo_url is None:
+                    continue
+                keys = dict(purl=pkg.purl, purl_key=pkg.purl_key, purl_base=pkg.purl_base)
+                docs["PackageSource"].append(
+                    dict(**keys, repo_url=pkg.repo_url, type=eco.type, sourced_at=EPOCH, confidence=1.0)
+                )
+                for month in months:
+                    docs["PackageStats"].append(
+                        dict(
+                            **keys,
+                            stats_from=month,
+                            stats_interval="Month",
+                            **self._activity(rng, 1.0),
+                            pagerank=None,
+                            record_created_at=EPOCH,
+                            record_updated_at=EPOCH,
+                        )
+                    )
+                if rng.random() < self.vuln_share:
+                    ids = np.searchsorted(cve_cdf, rng.random(int(rng.integers(1, 5))))
+                    docs["PackageVulns"].append(
+                        dict(
+                            **keys,
+                            repo_url=pkg.repo_url,
+                            name=pkg.name,
+                            version=pkg.version,
+                            commit_sha=None,
+                            vulns=sorted({f"CVE-{2015 + i % 9}-{10000 + i}" for i in ids.tolist()}),
+                            n_contributors=int(rng.integers(1, 500)),
+                            is_archived=pkg.project % 50 == 0,
+                            license_compatibility=None,
+                            record_created_at=EPOCH,
+                            record_updated_at=EPOCH,
+                        )
+                    )
+            yield docs
+
+
+async def generate(dataset: SyntheticDataset, drop: bool = False) -> None:
+    """Writes the dataset into the configured database"""
+    await create_engine()
+    collections = {model.__name__: model.get_motor_collection() for model in _ORM_MODELS}
+    if drop:
+        for collection in collections.values():
+            await collection.drop()
+        # recreate the indexes
+        await create_engine()
+    elif await collections["Package"].estimated_document_count():
+        raise SystemExit(f"Database {settings.mongodb.db} is not empty, pass --drop to replace its contents")
+
+    logger.info(
+        "Generating {} packages ({}) into {}",
+        dataset.n_packages,
+        ", ".join(f"{e.type}: {e.n_packages}" for e in dataset.ecosystems),
+        settings.mongodb.db,
+    )
+
+    async def insert(name: str, docs: List[Dict[str, Any]]) -> None:
+        if docs:
+            await collections[name].insert_many(docs, ordered=False)
+
+    for eco in dataset.ecosystems:
+        n_batches = -(-eco.n_packages // dataset.batch_size)
+        for docs in tqdm(dataset.package_batches(eco), total=n_batches, desc=f"{eco.type} packages"):
+            for name, batch in docs.items():
+                await insert(name, batch)
+        n_edges = 0
+        for batch in tqdm(dataset.dependency_batches(eco), total=n_batches, desc=f"{eco.type} dependencies"):
+            await insert("PackageDependency", batch)
+            n_edges += len(batch)
+        logger.info("{} {} dependencies", n_edges, eco.type)
+
+    n_batches = -(-dataset.n_projects // dataset.batch_size)
+    for repos, stats in tqdm(dataset.repository_batches(), total=n_batches, desc="repositories"):
+        await insert("Repository", repos)
+        await insert("RepositoryStats", stats)
+
+    # derived collections, as maintained by the analyzers
+    from pkgdash.analyze.github.similar import update_recommended_purls
+
+    await update_recommended_purls()
+    await recount_facets()
+    await invalidate(*_ORM_MODELS)
+    for name, collection in collections.items():
+        logger.info("{}: {} documents", name, await collection.estimated_document_count())
+
+
+def main():
+    parser = argparse.ArgumentParser("Synthetic dataset generator")
+    parser.add_argument("-n", "--packages", default="10k", type=parse_count, help="Number of packages (e.g. 1k, 10M)")
+    parser.add_argument("-s", "--seed", default=42, type=int, help="Random seed")
+    parser.add_argument("--avg-deps", default=5.0, type=float, help="Average number of dependencies per package")
+    parser.add_argument("--alpha", default=1.1, type=float, help="Exponent of the power law of in-degrees")
+    parser.add_argument("--months", default=12, type=int, help="Months of PackageStats / RepositoryStats")
+    parser.add_argument("--vuln-share", default=0.05, type=float, help="Share of packages with vulnerabilities")
+    parser.add_argument("--batch-size", default=10000, type=int, help="Documents per insert")
+    parser.add_argument("--drop", action="store_true", default=False, help="Drop existing collections first")
+    args = parser.parse_args()
+
+    dataset = SyntheticDataset(
+        args.packages,
+        seed=args.seed,
+        avg_deps=args.avg_deps,
+        alpha=args.alpha,
+        months=args.months,
+        vuln_share=args.vuln_share,
+        batch_size=args.batch_size,
+    )
+    asyncio.run(generate(dataset, drop=args.drop))
+
+
+if __name__ == "__main__":
+    main()
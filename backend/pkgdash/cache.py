@@ -0,0 +1,204 @@
+"""
+Response cache backends
+
+Cached entries are grouped into namespaces, one per collection (e.g. "Package",
+"PackageDependency"). Invalidating a namespace bumps its generation number, which
+is part of every key, so stale entries become unreachable and age out.
+
+- memory: size-bounded LRU with TTL, per process. Invalidations from other
+  processes (e.g. analyzers) don't reach it, only the TTL bounds staleness.
+- redis: shared by all API workers; generations live in Redis as well, so
+  analyzers invalidate every worker at once.
+
+Analyzers write documents one by one: they call invalidate_soon(), which only
+reaches a shared cache, at most once per cache.invalidate_interval seconds, and
+flush_invalidations() once their run is done.
+"""
+
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from pkgdash import logger, settings
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class CacheCounters:
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+
+class Cache:
+    """Base class of the cache backends, which also implements the disabled cache"""
+
+    enabled = False
+    # whether other processes (analyzers) can invalidate it
+    shared = False
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self.counters: Dict[str, CacheCounters] = {}
+
+    def count(self, namespace: str) -> CacheCounters:
+        return self.counters.setdefault(namespace, CacheCounters())
+
+    async def get(self, namespaces: Tuple[str, ...], key: str) -> Optional[CacheEntry]:
+        return None
+
+    async def set(self, namespaces: Tuple[str, ...], key: str, entry: CacheEntry) -> None:
+        pass
+
+    async def invalidate(self, namespaces: Iterable[str]) -> None:
+        for ns in namespaces:
+            self.count(ns).invalidations += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {ns: c.to_dict() for ns, c in self.counters.items()}
+
+
+class MemoryCache(Cache):
+    """In-process LRU with TTL"""
+
+    enabled = True
+
+    def __init__(self, ttl: float = 300, max_entries: int = 10000):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self.generations: Dict[str, int] = {}
+        self.entries: "OrderedDict[str, Tuple[float, CacheEntry]]" = OrderedDict()
+
+    def _key(self, namespaces: Tuple[str, ...], key: str) -> str:
+        gens = ",".join(f"{ns}:{self.generations.get(ns, 0)}" for ns in namespaces)
+        return f"{gens}|{key}"
+
+    async def get(self, namespaces, key):
+        k = self._key(namespaces, key)
+        found = self.entries.get(k)
+        if found is None or found[0] < time.monotonic():
+            if found is not None:
+                del self.entries[k]
+            return None
+        self.entries.move_to_end(k)
+        return found[1]
+
+    async def set(self, namespaces, key, entry):
+        k = self._key(namespaces, key)
+        self.entries[k] = (time.monotonic() + self.ttl, entry)
+        self.entries.move_to_end(k)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def invalidate(self, namespaces):
+        namespaces = list(namespaces)
+        for ns in namespaces:
+            self.generations[ns] = self.generations.get(ns, 0) + 1
+        await super().invalidate(namespaces)
+
+
+class RedisCache(Cache):
+    """Redis backed cache shared between processes"""
+
+    enabled = True
+    shared = True
+
+    def __init__(self, url: str, ttl: float = 300, prefix: str = "pkgdash"):
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("cache.backend = 'redis' requires the redis package") from e
+        super().__init__(ttl)
+        self.redis = aioredis.from_url(url)
+        self.prefix = prefix
+
+    async def _key(self, namespaces: Tuple[str, ...], key: str) -> str:
+        gens = await self.redis.mget([f"{self.prefix}:gen:{ns}" for ns in namespaces])
+        gens = ",".join(f"{ns}:{int(g or 0)}" for ns, g in zip(namespaces, gens))
+        return f"{self.prefix}:cache:{gens}|{key}"
+
+    async def get(self, namespaces, key):
+        raw = await self.redis.get(await self._key(namespaces, key))
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return CacheEntry(body=data["body"].encode(), headers=data["headers"])
+
+    async def set(self, namespaces, key, entry):
+        raw = json.dumps({"body": entry.body.decode(), "headers": entry.headers})
+        await self.redis.set(await self._key(namespaces, key), raw, ex=int(self.ttl))
+
+    async def invalidate(self, namespaces):
+        namespaces = list(namespaces)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for ns in namespaces:
+                pipe.incr(f"{self.prefix}:gen:{ns}")
+            await pipe.execute()
+        await super().invalidate(namespaces)
+
+
+@lru_cache(maxsize=1)
+def get_cache() -> Cache:
+    """The cache configured under [cache] in settings.toml"""
+    backend = settings.get("cache.backend", "none")
+    ttl = settings.get("cache.ttl", 300)
+    if backend == "memory":
+        return MemoryCache(ttl=ttl, max_entries=settings.get("cache.max_entries", 10000))
+    if backend == "redis":
+        return RedisCache(settings.get("cache.redis_url", "redis://localhost:6379/0"), ttl=ttl)
+    if backend != "none":
+        logger.warning("Unknown cache backend {}, caching is disabled", backend)
+    return Cache(ttl=ttl)
+
+
+async def invalidate(*models) -> None:
+    """
+    Drops cached responses built from the given models (classes or collection names).
+    Analyzers call this after writing documents; failures are logged, not raised.
+    """
+    namespaces = [m if isinstance(m, str) else m.__name__ for m in models]
+    try:
+        await get_cache().invalidate(namespaces)
+    except Exception as e:
+        logger.warning("Failed to invalidate cache {}: {}", namespaces, e)
+
+
+INVALIDATE_INTERVAL: float = settings.get("cache.invalidate_interval", 5)
+
+_pending: Set[str] = set()
+_last_flush = 0.0
+
+
+async def invalidate_soon(*models) -> None:
+    """
+    Batched invalidate() for analyzers: the namespaces are collected and dropped at most
+    once per INVALIDATE_INTERVAL, and at flush_invalidations(). A no-op unless the cache
+    is shared, since a per-process cache of the analyzer serves no responses.
+    """
+    global _last_flush
+    if not get_cache().shared:
+        return
+    _pending.update(m if isinstance(m, str) else m.__name__ for m in models)
+    if time.monotonic() - _last_flush >= INVALIDATE_INTERVAL:
+        await flush_invalidations()
+
+
+async def flush_invalidations() -> None:
+    """Invalidates the namespaces collected by invalidate_soon() (analyzers call it at the end of a run)"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    if _pending:
+        namespaces = sorted(_pending)
+        _pending.clear()
+        await invalidate(*namespaces)
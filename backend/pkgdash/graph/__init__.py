@@ -0,0 +1,25 @@
+from .closure import Closure, closure_nodes, dependency_closure, iter_closure_edges
+from .impact import Impact, cached_impact, package_impact, vulnerable_purls
+from .index import DependencyGraphIndex
+from .materialize import ClosureStore, refresh_transitive_deps
+from .paths import DependencyPaths, dependency_paths
+from .scc import GraphStats, graph_stats, refresh_graph_stats
+
+__all__ = [
+    "Closure",
+    "closure_nodes",
+    "dependency_closure",
+    "iter_closure_edges",
+    "DependencyGraphIndex",
+    "ClosureStore",
+    "refresh_transitive_deps",
+    "DependencyPaths",
+    "dependency_paths",
+    "Impact",
+    "cached_impact",
+    "package_impact",
+    "vulnerable_purls",
+    "GraphStats",
+    "graph_stats",
+    "refresh_graph_stats",
+]
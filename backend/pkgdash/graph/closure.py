@@ -0,0 +1,188 @@
+"""
+Transitive closures over PackageDependency
+
+The traversal is a level-synchronous BFS: every frontier is fetched with one
+``$in`` query (split into concurrent chunks for very wide frontiers), so the
+number of Mongo round trips grows with the depth of the graph, not with the
+number of packages in the closure.
+
+When a ready DependencyGraphIndex is passed, the nodes are computed in memory
+and only the edge documents are fetched, one batched query per BFS level.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterable, List, Optional
+
+from pymongo.errors import ExecutionTimeout
+
+from pkgdash import settings
+from pkgdash.models import PackageDependency
+
+if TYPE_CHECKING:
+    from .index import DependencyGraphIndex
+
+DEFAULT_MAX_DEPTH: int = settings.get("graph.max_depth", 32)
+DEFAULT_MAX_NODES: int = settings.get("graph.max_nodes", 50000)
+
+# purls per $in query, keeps each query well below the 16MB BSON limit
+FRONTIER_CHUNK_SIZE = 5000
+
+
+@dataclass
+class Closure:
+    """The result of a transitive closure"""
+
+    """Root purls the traversal started from"""
+    roots: List[str]
+    """Traversed edges, in BFS order"""
+    edges: List[PackageDependency] = field(default_factory=list)
+    """Reached purls (roots included) and their BFS depth"""
+    nodes: Dict[str, int] = field(default_factory=dict)
+    """Deepest BFS level that was reached"""
+    depth: int = 0
+    """Whether max_depth or max_nodes cut the traversal short (edges leave its last level)"""
+    truncated: bool = False
+
+
+def _deadline(max_time_ms: Optional[int]) -> Optional[float]:
+    return time.monotonic() + max_time_ms / 1000 if max_time_ms else None
+
+
+def _time_left(deadline: Optional[float]) -> Dict[str, int]:
+    """max_time_ms of the next query, raises ExecutionTimeout past the deadline"""
+    if deadline is None:
+        return {}
+    max_time_ms = int((deadline - time.monotonic()) * 1000)
+    if max_time_ms <= 0:
+        raise ExecutionTimeout("Closure exceeded its time budget", 50)
+    return {"max_time_ms": max_time_ms}
+
+
+def _chunks(frontier: List[str]) -> List[List[str]]:
+    return [frontier[i : i + FRONTIER_CHUNK_SIZE] for i in range(0, len(frontier), FRONTIER_CHUNK_SIZE)]
+
+
+async def _expand(
+    frontier: List[str], source: str, deadline: Optional[float] = None, projection: Optional[Dict[str, int]] = None
+) -> List[dict]:
+    """Raw edge documents leaving the frontier, raises ExecutionTimeout past the deadline"""
+    collection = PackageDependency.get_motor_collection()
+    kwargs = _time_left(deadline)
+    results = await asyncio.gather(
+        *(collection.find({source: {"$in": chunk}}, projection, **kwargs).to_list(None) for chunk in _chunks(frontier))
+    )
+    return [edge for edges in results for edge in edges]
+
+
+async def _has_edges(frontier: List[str], source: str, deadline: Optional[float] = None) -> bool:
+    """Whether any edge leaves the frontier (whether stopping there at max_depth truncates the closure)"""
+    collection = PackageDependency.get_motor_collection()
+    for chunk in _chunks(frontier):
+        if await collection.find_one({source: {"$in": chunk}}, {"_id": 1}, **_time_left(deadline)) is not None:
+            return True
+    return False
+
+
+async def iter_closure_edges(
+    closure: Closure,
+    reverse: bool = False,
+    max_depth: Optional[int] = DEFAULT_MAX_DEPTH,
+    max_nodes: Optional[int] = DEFAULT_MAX_NODES,
+    index: Optional["DependencyGraphIndex"] = None,
+    max_time_ms: Optional[int] = None,
+    projection: Optional[Dict[str, int]] = None,
+) -> AsyncIterator[dict]:
+    """
+    Yields the raw edge documents of a closure level by level, in BFS order.
+    Only the reached purls and the current level are held in memory; nodes, depth
+    and truncated of `closure` are complete once the iterator is exhausted.
+    See dependency_closure for the parameters; projection selects the fields of the
+    yielded documents (purl and dep_purl must be included).
+    """
+    source, target = ("dep_purl", "purl") if reverse else ("purl", "dep_purl")
+    deadline = _deadline(max_time_ms)
+
+    if index is not None and index.ready:
+        computed = index.closure(closure.roots, reverse=reverse, max_depth=max_depth, max_nodes=max_nodes)
+        closure.nodes, closure.depth, closure.truncated = computed.nodes, computed.depth, computed.truncated
+        levels: Dict[int, List[str]] = {}
+        for purl, depth in closure.nodes.items():
+            levels.setdefault(depth, []).append(purl)
+        for depth in sorted(levels):
+            # like the BFS below, the purls of the last level aren't expanded
+            if max_depth is not None and depth >= max_depth:
+                break
+            for edge in await _expand(levels[depth], source, deadline, projection):
+                if edge[target] in closure.nodes:
+                    yield edge
+        return
+
+    closure.nodes = {purl: 0 for purl in closure.roots}
+    frontier, level = closure.roots, 0
+    while frontier:
+        if max_depth is not None and level >= max_depth:
+            closure.truncated = closure.truncated or await _has_edges(frontier, source, deadline)
+            break
+        next_frontier = []
+        for edge in await _expand(frontier, source, deadline, projection):
+            purl = edge[target]
+            if purl not in closure.nodes:
+                if max_nodes is not None and len(closure.nodes) >= max_nodes:
+                    closure.truncated = True
+                    continue
+                closure.nodes[purl] = level + 1
+                next_frontier.append(purl)
+            yield edge
+        level += 1
+        if next_frontier:
+            closure.depth = level
+        frontier = next_frontier
+
+
+async def dependency_closure(
+    roots: Iterable[str],
+    reverse: bool = False,
+    max_depth: Optional[int] = DEFAULT_MAX_DEPTH,
+    max_nodes: Optional[int] = DEFAULT_MAX_NODES,
+    index: Optional["DependencyGraphIndex"] = None,
+    max_time_ms: Optional[int] = None,
+) -> Closure:
+    """
+    Computes the transitive dependencies (or dependents if reverse) of a set of purls
+    :param roots: exact purls as stored in PackageDependency
+    :param reverse: follow dep_purl -> purl instead of purl -> dep_purl
+    :param max_depth: number of levels to expand at most (None for no limit)
+    :param max_nodes: number of reached purls at most (None for no limit)
+    :param index: compute the reached purls with this in-memory index if it is ready
+    :param max_time_ms: time budget of the whole traversal, passed to Mongo as maxTimeMS
+    :returns: Closure
+    """
+    closure = Closure(roots=list(dict.fromkeys(roots)))
+    closure.edges = [
+        PackageDependency.parse_obj(edge)
+        async for edge in iter_closure_edges(closure, reverse, max_depth, max_nodes, index, max_time_ms)
+    ]
+    return closure
+
+
+async def closure_nodes(
+    roots: Iterable[str],
+    reverse: bool = False,
+    max_depth: Optional[int] = DEFAULT_MAX_DEPTH,
+    max_nodes: Optional[int] = DEFAULT_MAX_NODES,
+    index: Optional["DependencyGraphIndex"] = None,
+    max_time_ms: Optional[int] = None,
+) -> Closure:
+    """
+    Same as dependency_closure without the edges (only nodes, depth and truncated are filled in).
+    Edges are fetched with purl and dep_purl only, and not at all with a ready index.
+    """
+    if index is not None and index.ready:
+        return index.closure(roots, reverse=reverse, max_depth=max_depth, max_nodes=max_nodes)
+    closure = Closure(roots=list(dict.fromkeys(roots)))
+    projection = {"_id": 0, "purl": 1, "dep_purl": 1}
+    async for _ in iter_closure_edges(closure, reverse, max_depth, max_nodes, None, max_time_ms, projection):
+        pass
+    return closure
@@ -0,0 +1,134 @@
+"""
+Blast radius of vulnerable packages
+
+The impact of a set of purls is their reverse transitive closure: every package
+depending on them directly or indirectly. It is computed with one batched
+frontier query per BFS level (or with the reverse adjacency of a ready
+DependencyGraphIndex), and summarized per distro and purl type from the purls
+themselves, so that the closure of e.g. glibc takes no per-package queries.
+
+The pages of an impact are served from the same computation: recent impacts are
+kept per (roots, max_nodes) by cached_impact(), until the graph index changes or
+graph.impact_cache_ttl expires.
+"""
+
+import asyncio
+import re
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from pkgdash import settings
+from pkgdash.models import PackageVulns
+
+from .closure import closure_nodes
+
+if TYPE_CHECKING:
+    from .index import DependencyGraphIndex
+
+# a glibc CVE reaches nearly every RPM package of a distro release
+IMPACT_MAX_NODES: int = settings.get("graph.impact_max_nodes", 1000000)
+# impacts kept for their next pages, 0 to disable
+IMPACT_CACHE_ENTRIES: int = settings.get("graph.impact_cache_entries", 32)
+IMPACT_CACHE_TTL: float = settings.get("graph.impact_cache_ttl", 300)
+
+_DISTRO = re.compile(r"[?&]distro=([^&#]+)")
+
+
+@dataclass
+class Impact:
+    """The packages depending (transitively) on a set of purls"""
+
+    roots: List[str]
+    """Dependents (roots excluded) and their distance to the nearest root, nearest first"""
+    dependents: Dict[str, int] = field(default_factory=dict)
+    depth: int = 0
+    """Whether max_nodes cut the closure short"""
+    truncated: bool = False
+    """Number of dependents per distro qualifier of their purl (e.g. openeuler-2203sp1)"""
+    by_distro: Dict[str, int] = field(default_factory=dict)
+    """Number of dependents per purl type (e.g. rpm, npm)"""
+    by_type: Dict[str, int] = field(default_factory=dict)
+
+
+def _purl_distro(purl: str) -> Optional[str]:
+    m = _DISTRO.search(purl)
+    return m.group(1) if m else None
+
+
+def _purl_type(purl: str) -> str:
+    _, _, rest = purl.partition(":")
+    return rest.split("/", 1)[0]
+
+
+async def package_impact(
+    roots: Iterable[str],
+    max_nodes: Optional[int] = IMPACT_MAX_NODES,
+    index: Optional["DependencyGraphIndex"] = None,
+    max_time_ms: Optional[int] = None,
+) -> Impact:
+    """
+    The union of the reverse transitive closures of roots (exact purls as stored in
+    PackageDependency.dep_purl); not limited in depth
+    """
+    closure = await closure_nodes(
+        roots, reverse=True, max_depth=None, max_nodes=max_nodes, index=index, max_time_ms=max_time_ms
+    )
+    impact = Impact(roots=closure.roots, depth=closure.depth, truncated=closure.truncated)
+    dependents = ((purl, depth) for purl, depth in closure.nodes.items() if depth > 0)
+    impact.dependents = dict(sorted(dependents, key=lambda item: (item[1], item[0])))
+    distros = Counter(_purl_distro(purl) for purl in impact.dependents)
+    distros.pop(None, None)
+    impact.by_distro = dict(distros.most_common())
+    impact.by_type = dict(Counter(_purl_type(purl) for purl in impact.dependents).most_common())
+    return impact
+
+
+async def vulnerable_purls(vuln_id: str) -> List[str]:
+    """Purls whose PackageVulns list the vulnerability (e.g. a CVE id)"""
+    return await PackageVulns.distinct("purl", {"vulns": vuln_id})
+
+
+_ImpactKey = Tuple[Tuple[str, ...], Optional[int], Optional[Tuple]]
+
+# (expiry, computation) by key, least recently used first
+_recent: "OrderedDict[_ImpactKey, Tuple[float, asyncio.Task]]" = OrderedDict()
+
+
+def _index_version(index: Optional["DependencyGraphIndex"]) -> Optional[Tuple]:
+    return (index.n_docs, index.watermark) if index is not None and index.ready else None
+
+
+async def cached_impact(
+    roots: Iterable[str],
+    max_nodes: Optional[int] = IMPACT_MAX_NODES,
+    index: Optional["DependencyGraphIndex"] = None,
+    max_time_ms: Optional[int] = None,
+) -> Impact:
+    """
+    package_impact(), shared by the calls with the same roots and max_nodes (concurrent
+    ones included) for IMPACT_CACHE_TTL, or until the index loads new edges
+    """
+    roots = sorted(set(roots))
+    if IMPACT_CACHE_ENTRIES <= 0:
+        return await package_impact(roots, max_nodes, index, max_time_ms)
+
+    key = (tuple(roots), max_nodes, _index_version(index))
+    now = time.monotonic()
+    found = _recent.get(key)
+    if found is None or found[0] < now:
+        task = asyncio.ensure_future(package_impact(roots, max_nodes, index, max_time_ms))
+        task.add_done_callback(lambda t: _forget_failed(key, t))
+        found = _recent[key] = (now + IMPACT_CACHE_TTL, task)
+    _recent.move_to_end(key)
+    while len(_recent) > IMPACT_CACHE_ENTRIES:
+        _recent.popitem(last=False)
+    return await asyncio.shield(found[1])
+
+
+def _forget_failed(key: _ImpactKey, task: asyncio.Task) -> None:
+    if task.cancelled() or task.exception() is not None:
+        found = _recent.get(key)
+        if found is not None and found[1] is task:
+            del _recent[key]
@@ -0,0 +1,208 @@
+"""
+In-memory dependency graph index
+
+Every purl in PackageDependency is interned to an int32 id, and the forward and
+reverse adjacency are held as CSR arrays (offsets + targets). A closure is then
+a handful of vectorized frontier expansions instead of Mongo round trips, and
+~10M edges fit in roughly 100MB instead of tens of GB of documents.
+
+The index is refreshed incrementally: only edges with an ``_id`` after the last
+seen one are fetched. If the collection then doesn't hold exactly the loaded and
+fetched edges (edges were deleted, e.g. by a re-import, or inserted with an older
+``_id``), everything is reloaded instead, so deleted edges never linger.
+"""
+
+import asyncio
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from pkgdash import logger
+from pkgdash.models import PackageDependency
+
+from .closure import Closure
+
+
+class CSRAdjacency:
+    """Compressed sparse row adjacency: neighbors of i are targets[offsets[i]:offsets[i + 1]]"""
+
+    def __init__(self, offsets: np.ndarray, targets: np.ndarray):
+        self.offsets = offsets
+        self.targets = targets
+
+    @property
+    def n(self) -> int:
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_edges(cls, src: np.ndarray, dst: np.ndarray, n: int) -> "CSRAdjacency":
+        order = np.argsort(src, kind="stable")
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+        return cls(offsets, dst[order].astype(np.int32, copy=False))
+
+    def neighbors(self, frontier: np.ndarray) -> np.ndarray:
+        """Concatenated neighbors of all nodes in frontier"""
+        starts = self.offsets[frontier]
+        counts = self.offsets[frontier + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int32)
+        # position of each output slot inside its own run, shifted to the run's start
+        run_starts = np.cumsum(counts) - counts
+        idx = np.repeat(starts - run_starts, counts) + np.arange(total, dtype=np.int64)
+        return self.targets[idx]
+
+
+class DependencyGraphIndex:
+    """
+    Forward / reverse CSR index over all PackageDependency edges
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.purls: List[str] = []
+        self.forward: Optional[CSRAdjacency] = None
+        self.reverse: Optional[CSRAdjacency] = None
+        """Newest loaded PackageDependency _id, and number of loaded documents"""
+        self.watermark: Optional[ObjectId] = None
+        self.n_docs = 0
+        self._src = np.empty(0, dtype=np.int32)
+        self._dst = np.empty(0, dtype=np.int32)
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.forward is not None
+
+    @property
+    def n_edges(self) -> int:
+        return len(self._src)
+
+    @staticmethod
+    def _intern(ids: Dict[str, int], purls: List[str], purl: str) -> int:
+        i = ids.get(purl)
+        if i is None:
+            i = ids[purl] = len(purls)
+            purls.append(purl)
+        return i
+
+    @staticmethod
+    def _build(src: np.ndarray, dst: np.ndarray, n: int):
+        # drop duplicated edges (re-imported or fetched twice around the watermark)
+        _, first = np.unique(src.astype(np.int64) * n + dst, return_index=True)
+        src, dst = src[first], dst[first]
+        return src, dst, CSRAdjacency.from_edges(src, dst, n), CSRAdjacency.from_edges(dst, src, n)
+
+    async def _fetch(self, ids: Dict[str, int], purls: List[str], after: Optional[ObjectId]):
+        """(src, dst, newest _id, number of documents) of the edges with an _id after `after`"""
+        query = {} if after is None else {"_id": {"$gt": after}}
+        projection = {"_id": 1, "purl": 1, "dep_purl": 1}
+        src, dst = array("i"), array("i")
+        watermark, n = after, 0
+        cursor = PackageDependency.get_motor_collection().find(query, projection, batch_size=10000)
+        async for doc in cursor:
+            src.append(self._intern(ids, purls, doc["purl"]))
+            dst.append(self._intern(ids, purls, doc["dep_purl"]))
+            if watermark is None or doc["_id"] > watermark:
+                watermark = doc["_id"]
+            n += 1
+        return np.frombuffer(src, dtype=np.int32), np.frombuffer(dst, dtype=np.int32), watermark, n
+
+    async def refresh(self) -> int:
+        """
+        Loads the edges inserted since the last refresh (all edges on the first call), or
+        reloads everything if edges were deleted or inserted out of _id order since
+        :returns: the number of fetched edges
+        """
+        async with self._lock:
+            count = await PackageDependency.get_motor_collection().estimated_document_count()
+            if self.ready and count >= self.n_docs:
+                src, dst, watermark, n = await self._fetch(self.ids, self.purls, self.watermark)
+                if self.n_docs + n == count:
+                    if n:
+                        await self._swap(
+                            self.ids,
+                            self.purls,
+                            np.concatenate([self._src, src]),
+                            np.concatenate([self._dst, dst]),
+                            watermark,
+                            self.n_docs + n,
+                        )
+                    return n
+            if self.ready:
+                logger.info(
+                    "Dependency edges changed ({} loaded, {} stored), reloading the graph index", self.n_docs, count
+                )
+            return await self._reload()
+
+    async def rebuild(self) -> int:
+        """Reloads all edges"""
+        async with self._lock:
+            return await self._reload()
+
+    async def _reload(self) -> int:
+        # the previous arrays keep serving until the new ones are built
+        ids, purls = {}, []
+        src, dst, watermark, n = await self._fetch(ids, purls, None)
+        await self._swap(ids, purls, src, dst, watermark, n)
+        return n
+
+    async def _swap(self, ids, purls, src, dst, watermark, n_docs) -> None:
+        built = await asyncio.to_thread(self._build, src, dst, len(purls))
+        self.ids, self.purls = ids, purls
+        self._src, self._dst, self.forward, self.reverse = built
+        self.watermark, self.n_docs = watermark, n_docs
+        logger.info("Graph index refreshed: {} purls, {} edges in total", len(self.purls), self.n_edges)
+
+    def edges(self, purls: Iterable[str], reverse: bool = False) -> List[Tuple[str, str]]:
+        """(purl, neighbor) pairs of the edges leaving (or entering, if reverse) the purls"""
+        adj = self.reverse if reverse else self.forward
+        ids = np.array([self.ids[p] for p in purls if self.ids.get(p, adj.n) < adj.n], dtype=np.int32)
+        if not ids.size:
+            return []
+        sources = np.repeat(ids, adj.offsets[ids + 1] - adj.offsets[ids])
+        return [(self.purls[s], self.purls[t]) for s, t in zip(sources.tolist(), adj.neighbors(ids).tolist())]
+
+    def closure(
+        self,
+        roots: Iterable[str],
+        reverse: bool = False,
+        max_depth: Optional[int] = None,
+        max_nodes: Optional[int] = None,
+    ) -> Closure:
+        """
+        Transitive dependencies (or dependents if reverse) of a set of purls.
+        Only nodes are filled in; see pkgdash.graph.closure.iter_closure_edges.
+        """
+        adj = self.reverse if reverse else self.forward
+        closure = Closure(roots=list(dict.fromkeys(roots)))
+        level = np.full(adj.n, -1, dtype=np.int32)
+        frontier = np.array(
+            sorted({self.ids[p] for p in closure.roots if self.ids.get(p, adj.n) < adj.n}), dtype=np.int32
+        )
+        level[frontier] = 0
+        n_reached, depth = len(closure.roots), 0
+
+        while frontier.size:
+            if max_depth is not None and depth >= max_depth:
+                # only truncated if edges leave the last level
+                closure.truncated = closure.truncated or bool((adj.offsets[frontier + 1] - adj.offsets[frontier]).any())
+                break
+            nbrs = adj.neighbors(frontier)
+            frontier = np.unique(nbrs[level[nbrs] < 0])
+            if max_nodes is not None and n_reached + frontier.size > max_nodes:
+                frontier = frontier[: max(0, max_nodes - n_reached)]
+                closure.truncated = True
+            depth += 1
+            if frontier.size:
+                level[frontier] = depth
+                n_reached += frontier.size
+                closure.depth = depth
+
+        closure.nodes = {purl: 0 for purl in closure.roots}
+        for i in np.flatnonzero(level > 0):
+            closure.nodes[self.purls[i]] = int(level[i])
+        return closure
@@ -0,0 +1,281 @@
+"""
+Materialized transitive dependencies of popular packages
+
+Closures of hub packages are requested constantly but only change when dependency
+data is re-imported. The TransitiveDeps collection stores the closure (edge ids in
+BFS order, plus size and depth stats) of the top packages by in-degree and by
+tdeps requests:
+
+- :func:`refresh_transitive_deps` rebuilds them when PackageDependency changed (its
+  count or newest _id moved), and otherwise only adds newly requested roots. It runs
+  as a single job, batch importers also call it after importing:
+
+      python -m pkgdash.graph.materialize [--interval 300] [--force]
+
+- :class:`ClosureStore` serves them to the API from an in-process LRU, which is
+  pre-loaded with the hottest closures at startup. Each API worker adds up its
+  tdeps requests in the ClosureRequests collection, for the job to pick from.
+"""
+
+import asyncio
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from pkgdash import logger, settings
+from pkgdash.models import ClosureRequests, PackageDependency, TransitiveDeps
+
+from .closure import DEFAULT_MAX_DEPTH, DEFAULT_MAX_NODES, FRONTIER_CHUNK_SIZE, Closure, iter_closure_edges
+
+TOP_N: int = settings.get("closures.top_n", 1000)
+# closures with more edges aren't materialized (edge ids must fit a 16MB document)
+MAX_EDGES: int = settings.get("closures.max_edges", 100000)
+
+
+async def edges_signature() -> str:
+    """Changes whenever PackageDependency edges are inserted or deleted"""
+    collection = PackageDependency.get_motor_collection()
+    newest = await collection.find({}, {"_id": 1}).sort("_id", -1).limit(1).to_list(1)
+    count = await collection.estimated_document_count()
+    return f"{count}:{newest[0]['_id'] if newest else ''}"
+
+
+async def top_in_degree(n: int) -> Dict[str, int]:
+    """The n purls with the most direct dependents and their number of dependents"""
+    pipeline = [
+        {"$group": {"_id": "$dep_purl", "n": {"$sum": 1}}},
+        {"$sort": {"n": -1}},
+        {"$limit": n},
+    ]
+    cursor = PackageDependency.get_motor_collection().aggregate(pipeline, allowDiskUse=True)
+    # dependents of a purl aren't necessarily roots of a (forward) closure
+    degrees = {doc["_id"]: doc["n"] async for doc in cursor}
+    roots = await PackageDependency.distinct("purl", {"purl": {"$in": list(degrees)}})
+    return {purl: degrees[purl] for purl in roots}
+
+
+async def record_requests(requests: Counter) -> None:
+    """Adds tdeps requests per root to ClosureRequests"""
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne({"purl": purl}, {"$inc": {"n_requests": n}, "$set": {"record_updated_at": now}}, upsert=True)
+        for purl, n in requests.items()
+    ]
+    if ops:
+        await ClosureRequests.get_motor_collection().bulk_write(ops, ordered=False)
+
+
+async def top_requested(n: int) -> Counter:
+    """The n most requested roots and their number of requests"""
+    cursor = ClosureRequests.get_motor_collection().find({}, {"_id": 0, "purl": 1, "n_requests": 1})
+    docs = await cursor.sort("n_requests", -1).limit(n).to_list(n)
+    return Counter({doc["purl"]: doc["n_requests"] for doc in docs})
+
+
+async def materialize_closure(
+    root: str, signature: str, in_degree: int = 0, n_requests: int = 0
+) -> TransitiveDeps:
+    """
+    Computes and stores the closure of root. Closures with more than MAX_EDGES edges are
+    only recorded as oversized, so they aren't recomputed until the next rebuild.
+    """
+    closure = Closure(roots=[root])
+    edge_ids = []
+    oversized = False
+    async for edge in iter_closure_edges(closure, max_depth=DEFAULT_MAX_DEPTH, max_nodes=DEFAULT_MAX_NODES):
+        edge_ids.append(edge["_id"])
+        if len(edge_ids) > MAX_EDGES:
+            logger.info("Closure of {} has more than {} edges, not materialized", root, MAX_EDGES)
+            oversized = True
+            break
+    depth_counts = [0] * (closure.depth + 1)
+    for depth in closure.nodes.values():
+        depth_counts[depth] += 1
+    doc = TransitiveDeps(
+        purl=root,
+        edge_ids=[] if oversized else edge_ids,
+        oversized=oversized,
+        n_nodes=len(closure.nodes),
+        n_edges=len(edge_ids),
+        depth=closure.depth,
+        truncated=closure.truncated,
+        depth_counts=depth_counts,
+        max_depth=DEFAULT_MAX_DEPTH,
+        max_nodes=DEFAULT_MAX_NODES,
+        in_degree=in_degree,
+        n_requests=n_requests,
+        edges_signature=signature,
+        record_updated_at=datetime.utcnow(),
+    )
+    await TransitiveDeps.get_motor_collection().replace_one(
+        {"purl": root}, doc.dict(by_alias=True, exclude={"id"}), upsert=True
+    )
+    return doc
+
+
+async def refresh_transitive_deps(
+    requests: Optional[Counter] = None, top_n: int = TOP_N, force: bool = False
+) -> None:
+    """
+    Rebuilds the materialized closures if dependency data changed (or force),
+    otherwise materializes the most requested roots that are missing
+    :param requests: number of tdeps requests per root purl, read from ClosureRequests if not given
+    """
+    if requests is None:
+        requests = await top_requested(top_n)
+    signature = await edges_signature()
+    stored = await TransitiveDeps.find_one({})
+    rebuild = force or stored is None or stored.edges_signature != signature
+
+    if rebuild:
+        degrees = await top_in_degree(top_n)
+    else:
+        degrees = {}
+    wanted = {purl: 0 for purl, _ in requests.most_common(top_n)}
+    wanted.update(degrees)
+    if not rebuild:
+        have = await TransitiveDeps.distinct("purl", {"purl": {"$in": list(wanted)}})
+        for purl in have:
+            wanted.pop(purl)
+    if not wanted and not rebuild:
+        return
+
+    started = datetime.utcnow()
+    n = 0
+    for purl, in_degree in wanted.items():
+        doc = await materialize_closure(purl, signature, in_degree, requests.get(purl, 0))
+        n += not doc.oversized
+    if rebuild:
+        await TransitiveDeps.get_motor_collection().delete_many({"record_updated_at": {"$lt": started}})
+    logger.info("Materialized {} transitive closures ({})", n, "rebuild" if rebuild else "requested")
+
+
+@dataclass
+class MaterializedClosure:
+    doc: TransitiveDeps
+    """Raw PackageDependency documents, in BFS order"""
+    edges: List[dict]
+
+    def serves(self, max_depth: int, max_nodes: int) -> bool:
+        """Whether a live traversal with these limits would give the same result"""
+        doc = self.doc
+        if doc.oversized:
+            return False
+        if (max_depth, max_nodes) == (doc.max_depth, doc.max_nodes):
+            return True
+        # a complete closure is the same for any limits it fits in
+        return not doc.truncated and doc.depth <= max_depth and doc.n_nodes <= max_nodes
+
+
+class ClosureStore:
+    """
+    Materialized closures for the API, with an in-process LRU of their edges.
+    The LRU is dropped when dependency data changes.
+    """
+
+    def __init__(self, cache_max_edges: int = 1000000):
+        self.cache_max_edges = cache_max_edges
+        self.cached: "OrderedDict[str, MaterializedClosure]" = OrderedDict()
+        self.cached_edges = 0
+        self.signature: Optional[str] = None
+        self.requests: Counter = Counter()
+
+    async def _fetch_edges(self, doc: TransitiveDeps) -> Optional[List[dict]]:
+        collection = PackageDependency.get_motor_collection()
+        ids = doc.edge_ids
+        chunks = [ids[i : i + FRONTIER_CHUNK_SIZE] for i in range(0, len(ids), FRONTIER_CHUNK_SIZE)]
+        results = await asyncio.gather(*(collection.find({"_id": {"$in": chunk}}).to_list(None) for chunk in chunks))
+        by_id = {edge["_id"]: edge for edges in results for edge in edges}
+        if len(by_id) != len(ids):
+            # edges were deleted since the closure was computed
+            return None
+        return [by_id[i] for i in ids]
+
+    def _remember(self, purl: str, closure: MaterializedClosure) -> None:
+        self.cached[purl] = closure
+        self.cached_edges += len(closure.edges)
+        while self.cached_edges > self.cache_max_edges and len(self.cached) > 1:
+            _, dropped = self.cached.popitem(last=False)
+            self.cached_edges -= len(dropped.edges)
+
+    def clear(self) -> None:
+        self.cached.clear()
+        self.cached_edges = 0
+
+    async def load(self, purl: str) -> Optional[MaterializedClosure]:
+        """The materialized closure of purl, or None"""
+        found = self.cached.get(purl)
+        if found is not None:
+            self.cached.move_to_end(purl)
+            return found
+        doc = await TransitiveDeps.find_one({"purl": purl})
+        if doc is None or doc.oversized or (self.signature is not None and doc.edges_signature != self.signature):
+            return None
+        edges = await self._fetch_edges(doc)
+        if edges is None:
+            return None
+        closure = MaterializedClosure(doc, edges)
+        self._remember(purl, closure)
+        return closure
+
+    async def get(self, purl: str, max_depth: int, max_nodes: int) -> Optional[MaterializedClosure]:
+        """The closure of purl if it is materialized for these limits; counts the request"""
+        self.requests[purl] += 1
+        closure = await self.load(purl)
+        if closure is None or not closure.serves(max_depth, max_nodes):
+            return None
+        return closure
+
+    async def warm(self, n: int) -> None:
+        """Loads the n hottest materialized closures into memory"""
+        self.signature = await edges_signature()
+        cursor = (
+            TransitiveDeps.get_motor_collection()
+            .find({"edges_signature": self.signature}, {"_id": 0, "purl": 1})
+            .sort([("n_requests", -1), ("in_degree", -1)])
+            .limit(n)
+        )
+        loaded = 0
+        async for doc in cursor:
+            if await self.load(doc["purl"]) is not None:
+                loaded += 1
+        logger.info("Loaded {} materialized closures ({} edges)", loaded, self.cached_edges)
+
+    async def refresh(self) -> None:
+        """
+        Periodic task of each API worker: follows dependency re-imports and records its
+        requests; the closures themselves are materialized by the single refresh job
+        """
+        signature = await edges_signature()
+        if signature != self.signature:
+            # stop serving closures of the previous edges right away, the rebuild takes a while
+            self.clear()
+            self.signature = signature
+        requests, self.requests = self.requests, Counter()
+        await record_requests(requests)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from pkgdash.models.connector.mongo import create_engine
+
+    parser = argparse.ArgumentParser(description="Materializes the transitive closures of popular packages")
+    parser.add_argument("--interval", type=float, help="keep running, refreshing every INTERVAL seconds")
+    parser.add_argument("--force", action="store_true", help="rebuild all closures first")
+    args = parser.parse_args()
+
+    async def main():
+        await create_engine()
+        await refresh_transitive_deps(force=args.force)
+        while args.interval:
+            await asyncio.sleep(args.interval)
+            try:
+                await refresh_transitive_deps()
+            except Exception as e:
+                logger.error("Refreshing transitive closures failed: {}", e)
+
+    asyncio.run(main())
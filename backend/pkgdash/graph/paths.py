@@ -0,0 +1,178 @@
+"""
+Dependency paths between two sets of purls ("why does X depend on Y")
+
+A bidirectional BFS expands the forward search from the sources (purl -> dep_purl)
+and the reverse search from the targets (dep_purl -> purl), always the smaller
+frontier, one full level at a time. Each search remembers the parents of every node
+on the previous level, so that the paths through a node reached by both searches
+(a meeting node) are a shortest path to it followed by a shortest path from it.
+
+The shortest paths are found exactly. When there are fewer than k of them, the
+search goes on and adds the longer paths through the meeting nodes it finds next;
+these are not an exhaustive k-shortest-simple-paths enumeration (Yen's algorithm
+would need a new search per path).
+
+Only the two searches are held in memory, never the closure of the sources, and
+with a ready DependencyGraphIndex no Mongo query is made at all.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo.errors import ExecutionTimeout
+
+from pkgdash.models import PackageDependency
+
+from .closure import DEFAULT_MAX_DEPTH, DEFAULT_MAX_NODES, FRONTIER_CHUNK_SIZE
+
+if TYPE_CHECKING:
+    from .index import DependencyGraphIndex
+
+
+@dataclass
+class DependencyPaths:
+    """The result of a path search"""
+
+    sources: List[str]
+    targets: List[str]
+    """Paths from a source to a target (purls, source first), shortest first"""
+    paths: List[List[str]] = field(default_factory=list)
+    """Purls reached by the two searches"""
+    n_nodes: int = 0
+    """Whether max_depth or max_nodes stopped the search before k paths were found"""
+    truncated: bool = False
+
+
+class _Search:
+    """One direction of the bidirectional BFS"""
+
+    def __init__(self, roots: List[str], reverse: bool):
+        self.reverse = reverse
+        self.depths: Dict[str, int] = {purl: 0 for purl in roots}
+        self.parents: Dict[str, List[str]] = {}
+        self.frontier = list(self.depths)
+        self.depth = 0
+
+    def walks(self, purl: str, limit: int) -> List[List[str]]:
+        """
+        Up to limit shortest walks from a root to purl (root first). Diamonds make their
+        number exponential in the depth, so each parent only gets the count still missing.
+        """
+        if self.depths[purl] == 0:
+            return [[purl]]
+        found = []
+        for parent in self.parents[purl]:
+            found.extend(walk + [purl] for walk in self.walks(parent, limit - len(found)))
+            if len(found) >= limit:
+                break
+        return found
+
+
+async def _mongo_edges(frontier: List[str], reverse: bool, deadline: Optional[float]) -> List[Tuple[str, str]]:
+    """(frontier purl, neighbor) pairs of the edges leaving (or entering, if reverse) the frontier"""
+    source, target = ("dep_purl", "purl") if reverse else ("purl", "dep_purl")
+    collection = PackageDependency.get_motor_collection()
+    kwargs = {}
+    if deadline is not None:
+        kwargs["max_time_ms"] = int((deadline - time.monotonic()) * 1000)
+        if kwargs["max_time_ms"] <= 0:
+            raise ExecutionTimeout("Path search exceeded its time budget", 50)
+    chunks = [frontier[i : i + FRONTIER_CHUNK_SIZE] for i in range(0, len(frontier), FRONTIER_CHUNK_SIZE)]
+    projection = {"_id": 0, source: 1, target: 1}
+    results = await asyncio.gather(
+        *(collection.find({source: {"$in": chunk}}, projection, **kwargs).to_list(None) for chunk in chunks)
+    )
+    return [(edge[source], edge[target]) for edges in results for edge in edges]
+
+
+def _expand(
+    search: _Search, edges: Iterable[Tuple[str, str]], max_nodes: Optional[int], n_nodes: int
+) -> Tuple[List[str], bool]:
+    """Adds the next level of search from its edges; (newly reached purls, whether max_nodes cut it)"""
+    level = search.depth + 1
+    reached, truncated = [], False
+    for parent, purl in edges:
+        depth = search.depths.get(purl)
+        if depth is None:
+            if max_nodes is not None and n_nodes + len(reached) >= max_nodes:
+                truncated = True
+                continue
+            search.depths[purl] = level
+            search.parents[purl] = [parent]
+            reached.append(purl)
+        elif depth == level:
+            search.parents[purl].append(parent)
+    search.frontier = reached
+    search.depth = level
+    return reached, truncated
+
+
+def _paths(forward: _Search, backward: _Search, meeting: Set[str], k: int) -> List[List[str]]:
+    """Up to k distinct simple paths through the meeting purls, shortest first"""
+    found: Dict[Tuple[str, ...], None] = {}
+    for purl in sorted(meeting, key=lambda p: (forward.depths[p] + backward.depths[p], p)):
+        # k heads and k tails through purl make up to k * k distinct paths; more aren't enumerated
+        tails = backward.walks(purl, k)
+        for head in forward.walks(purl, k):
+            for tail in tails:
+                path = tuple(head + tail[-2::-1])
+                if len(set(path)) == len(path):
+                    found[path] = None
+                    if len(found) >= k:
+                        return [list(p) for p in found]
+    return [list(p) for p in found]
+
+
+async def dependency_paths(
+    sources: Iterable[str],
+    targets: Iterable[str],
+    k: int = 1,
+    max_depth: Optional[int] = DEFAULT_MAX_DEPTH,
+    max_nodes: Optional[int] = DEFAULT_MAX_NODES,
+    index: Optional["DependencyGraphIndex"] = None,
+    max_time_ms: Optional[int] = None,
+) -> DependencyPaths:
+    """
+    Finds up to k dependency paths from any of sources to any of targets
+    :param sources: exact purls as stored in PackageDependency.purl
+    :param targets: exact purls as stored in PackageDependency.dep_purl
+    :param max_depth: length of the paths at most (None for no limit)
+    :param max_nodes: number of purls reached by both searches at most (None for no limit)
+    :param index: expand the searches with this in-memory index if it is ready
+    :param max_time_ms: time budget of the whole search, passed to Mongo as maxTimeMS
+    :returns: DependencyPaths
+    """
+    result = DependencyPaths(sources=list(dict.fromkeys(sources)), targets=list(dict.fromkeys(targets)))
+    forward, backward = _Search(result.sources, reverse=False), _Search(result.targets, reverse=True)
+    meeting = set(forward.depths) & set(backward.depths)
+    deadline = time.monotonic() + max_time_ms / 1000 if max_time_ms else None
+    use_index = index is not None and index.ready
+    cut = False
+
+    while True:
+        if meeting:
+            result.paths = _paths(forward, backward, meeting, k)
+            if len(result.paths) >= k:
+                break
+        searches = [s for s in (forward, backward) if s.frontier]
+        # an exhausted search that didn't meet the other one means there is no path
+        if not searches or (len(searches) < 2 and not meeting):
+            break
+        if max_depth is not None and forward.depth + backward.depth >= max_depth:
+            cut = True
+            break
+        search = min(searches, key=lambda s: len(s.frontier))
+        if use_index:
+            edges = index.edges(search.frontier, reverse=search.reverse)
+        else:
+            edges = await _mongo_edges(search.frontier, search.reverse, deadline)
+        other = backward if search is forward else forward
+        reached, truncated = _expand(search, edges, max_nodes, len(forward.depths) + len(backward.depths))
+        cut |= truncated
+        meeting.update(purl for purl in reached if purl in other.depths)
+
+    result.n_nodes = len(forward.depths.keys() | backward.depths.keys())
+    result.truncated = cut and len(result.paths) < k
+    return result
@@ -0,0 +1,324 @@
+"""
+Strongly connected components of the dependency graph, and per-package closure stats
+
+Dependency cycles are common in distro package sets (glibc <-> glibc-common, the
+perl and python stacks), so the dependency graph is not a DAG. Its strongly
+connected components (SCCs) are found with an iterative Tarjan over the CSR
+adjacency of a DependencyGraphIndex; contracting each SCC to one node gives the
+condensed DAG, over which per-package stats are computed by dynamic programming
+instead of one BFS per package:
+
+- max_depth: the longest dependency chain below the package, an SCC counting as one
+  level (the longest path in the condensed DAG, not the BFS depth of /api/pkg/tdeps)
+- n_tdeps: the exact size of the transitive closure. Closure sets of a DAG overlap, so
+  sizes can't just be summed: the reachable SCCs are kept as bitsets, ORed from the
+  dependencies up in topological order, in as many passes over column slices of
+  graph.scc_memory_mb as needed
+
+The stats are stored in the PackageGraphStats collection, and the cycles (SCCs of
+more than one package) are reported per distro. Run by hand or from cron:
+
+    python -m pkgdash.graph.scc [--report cycles.json]
+"""
+
+import asyncio
+import json
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from pymongo import UpdateOne
+
+from pkgdash import logger, settings
+from pkgdash.models import PackageGraphStats
+
+from .impact import _purl_distro, _purl_type
+from .index import CSRAdjacency, DependencyGraphIndex
+
+# memory of the reachability bitsets of one pass
+SCC_MEMORY_MB: int = settings.get("graph.scc_memory_mb", 256)
+
+_WRITE_BATCH_SIZE = 1000
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+@dataclass
+class Condensation:
+    """The SCCs of a graph, numbered in reverse topological order (dependencies first)"""
+
+    """SCC of each node"""
+    component: np.ndarray
+    """Number of nodes of each SCC"""
+    sizes: np.ndarray
+    """Edges between SCCs: an SCC's dependencies always have smaller numbers"""
+    dag: CSRAdjacency
+
+    @property
+    def n(self) -> int:
+        return len(self.sizes)
+
+
+def strongly_connected_components(adj: CSRAdjacency) -> np.ndarray:
+    """
+    SCC of each node (iterative Tarjan). An SCC is numbered once all the SCCs it reaches
+    are, so the numbering is a reverse topological order of the condensed DAG.
+    """
+    n = adj.n
+    offsets, targets = adj.offsets.tolist(), adj.targets.tolist()
+    index, low, component = [-1] * n, [0] * n, [-1] * n
+    on_stack = [False] * n
+    stack: List[int] = []
+    counter = n_components = 0
+
+    for root in range(n):
+        if index[root] >= 0:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        # (node, position of its next edge)
+        work = [(root, offsets[root])]
+        while work:
+            v, i = work[-1]
+            if i < offsets[v + 1]:
+                work[-1] = (v, i + 1)
+                w = targets[i]
+                if index[w] < 0:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, offsets[w]))
+                elif on_stack[w] and index[w] < low[v]:
+                    low[v] = index[w]
+                continue
+            work.pop()
+            if work and low[v] < low[work[-1][0]]:
+                low[work[-1][0]] = low[v]
+            if low[v] == index[v]:
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    component[w] = n_components
+                    if w == v:
+                        break
+                n_components += 1
+
+    return np.array(component, dtype=np.int32)
+
+
+def condense(adj: CSRAdjacency) -> Condensation:
+    """The condensed DAG of a graph"""
+    component = strongly_connected_components(adj)
+    n = int(component.max()) + 1 if component.size else 0
+    src = np.repeat(component, np.diff(adj.offsets))
+    dst = component[adj.targets]
+    between = src != dst
+    pairs = np.unique(src[between].astype(np.int64) * max(n, 1) + dst[between])
+    dag = CSRAdjacency.from_edges((pairs // max(n, 1)).astype(np.int32), (pairs % max(n, 1)).astype(np.int32), n)
+    return Condensation(component, np.bincount(component, minlength=n), dag)
+
+
+def longest_depths(dag: CSRAdjacency) -> np.ndarray:
+    """Longest path (in edges) from each node of a reverse topologically numbered DAG"""
+    offsets, targets = dag.offsets.tolist(), dag.targets.tolist()
+    depths = [0] * dag.n
+    for c in range(dag.n):
+        start, end = offsets[c], offsets[c + 1]
+        if start < end:
+            depths[c] = 1 + max(depths[t] for t in targets[start:end])
+    return np.array(depths, dtype=np.int32)
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """Number of set bits of each row of a uint64 matrix"""
+    counts = np.empty(len(words), dtype=np.int64)
+    for start in range(0, len(words), 65536):
+        block = words[start : start + 65536]
+        counts[start : start + len(block)] = _POPCOUNT[block.view(np.uint8)].sum(axis=1)
+    return counts
+
+
+def _weighted_bits(words: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Sum of weights[b] over the set bits b of each row of a uint64 matrix (bit b being bit
+    b % 64 of word b // 64), with one lookup table per byte that holds a weighted bit
+    """
+    weights = weights.reshape(-1, 8)
+    used = np.flatnonzero(weights.any(axis=1))
+    totals = np.zeros(len(words), dtype=np.int64)
+    if not used.size:
+        return totals
+    # table[v, j]: weight of the bits set in value v of the j-th used byte
+    bits = (np.arange(256)[:, None] >> np.arange(8)) & 1
+    table = bits @ weights[used].T
+    # position of each used byte in the uint8 view of a row
+    in_word = used % 8 if np.little_endian else 7 - used % 8
+    columns = used // 8 * 8 + in_word
+    block = max(1, 2**22 // len(used))
+    for start in range(0, len(words), block):
+        values = words[start : start + block].view(np.uint8)[:, columns]
+        totals[start : start + len(values)] = table[values, np.arange(len(used))].sum(axis=1)
+    return totals
+
+
+def closure_sizes(condensation: Condensation, depths: np.ndarray, memory_mb: int = SCC_MEMORY_MB) -> np.ndarray:
+    """
+    Number of nodes reachable from each SCC, its own nodes included.
+    Each pass follows the DAG level by level (by longest depth, so that dependencies
+    are done first) with bitsets of a slice of the SCCs: an SCC only reaches SCCs
+    with smaller numbers, so the rows of the SCCs before the slice are left out.
+    """
+    n, dag, sizes = condensation.n, condensation.dag, condensation.sizes
+    counts = np.zeros(n, dtype=np.int64)
+    if not n:
+        return counts
+    words = max(1, min((n + 63) // 64, memory_mb * 2**20 // (8 * n)))
+    by_depth = np.argsort(depths, kind="stable")
+    level_starts = np.searchsorted(depths[by_depth], np.arange(int(depths.max()) + 2))
+
+    for first in range(0, n, 64 * words):
+        last = min(n, first + 64 * words)
+        # row r is the SCC first + r, bit b of the row the SCC first + b
+        reach = np.zeros((n - first, words), dtype=np.uint64)
+        own = np.arange(last - first)
+        reach[own, own // 64] = np.left_shift(np.uint64(1), (own % 64).astype(np.uint64))
+
+        for depth in range(1, len(level_starts) - 1):
+            level = by_depth[level_starts[depth] : level_starts[depth + 1]]
+            level = np.sort(level[level >= first])
+            if not level.size:
+                continue
+            children = dag.neighbors(level)
+            parents = np.repeat(level, np.diff(dag.offsets)[level])
+            keep = children >= first
+            children, parents = children[keep], parents[keep]
+            # bound the gathered rows to the size of the bitsets
+            for lo in range(0, len(children), max(len(reach), 1024)):
+                hi = min(len(children), lo + max(len(reach), 1024))
+                # a parent's children may straddle two batches: OR into it, don't overwrite
+                batch_parents = parents[lo:hi]
+                starts = np.flatnonzero(np.r_[True, batch_parents[1:] != batch_parents[:-1]])
+                merged = np.bitwise_or.reduceat(reach[children[lo:hi] - first], starts, axis=0)
+                reach[batch_parents[starts] - first] |= merged
+
+        counts[first:] += _popcount(reach)
+        # cycles in the slice stand for more than one node
+        extra = np.zeros(64 * words, dtype=np.int64)
+        extra[: last - first] = sizes[first:last] - 1
+        counts[first:] += _weighted_bits(reach, extra)
+    return counts
+
+
+@dataclass
+class GraphStats:
+    """Per-purl stats of a dependency graph (arrays indexed like DependencyGraphIndex.purls)"""
+
+    purls: List[str]
+    n_deps: np.ndarray
+    n_tdeps: np.ndarray
+    max_depth: np.ndarray
+    """SCC of each purl, and the purls of each SCC of more than one purl"""
+    component: np.ndarray
+    cycles: Dict[int, List[str]]
+
+
+def graph_stats(index: DependencyGraphIndex, memory_mb: int = SCC_MEMORY_MB) -> GraphStats:
+    """Computes the stats of every purl of a ready index (CPU-bound, takes seconds to minutes)"""
+    adj = index.forward
+    condensation = condense(adj)
+    depths = longest_depths(condensation.dag)
+    reach = closure_sizes(condensation, depths, memory_mb)
+    component = condensation.component
+    cycles = defaultdict(list)
+    for node in np.flatnonzero(condensation.sizes[component] > 1).tolist():
+        cycles[int(component[node])].append(index.purls[node])
+    return GraphStats(
+        purls=index.purls[: adj.n],
+        n_deps=np.diff(adj.offsets),
+        # an SCC reaches all of its own nodes, but a package isn't its own dependency
+        n_tdeps=reach[component] - 1,
+        max_depth=depths[component],
+        component=component,
+        cycles={c: sorted(purls) for c, purls in cycles.items()},
+    )
+
+
+def cycles_by_distro(cycles: Dict[int, List[str]]) -> Dict[str, List[List[str]]]:
+    """Dependency cycles grouped by the distro qualifier of their purls (or purl type), largest first"""
+    grouped = defaultdict(list)
+    for purls in cycles.values():
+        distros = Counter(_purl_distro(purl) or _purl_type(purl) for purl in purls)
+        grouped[distros.most_common(1)[0][0]].append(purls)
+    return {
+        distro: sorted(found, key=lambda purls: (-len(purls), purls[0]))
+        for distro, found in sorted(grouped.items(), key=lambda item: -len(item[1]))
+    }
+
+
+async def refresh_graph_stats(
+    index: Optional[DependencyGraphIndex] = None, memory_mb: int = SCC_MEMORY_MB
+) -> Dict[str, List[List[str]]]:
+    """
+    Recomputes PackageGraphStats from all PackageDependency edges (loaded into a new index
+    unless a ready one is given) and drops the stats of purls no longer in the graph
+    :returns: the dependency cycles per distro
+    """
+    if index is None or not index.ready:
+        index = DependencyGraphIndex()
+        await index.rebuild()
+    stats = await asyncio.to_thread(graph_stats, index, memory_mb)
+
+    started = datetime.utcnow()
+    collection = PackageGraphStats.get_motor_collection()
+    ops = []
+    for node, purl in enumerate(stats.purls):
+        c = int(stats.component[node])
+        cycle = stats.cycles.get(c)
+        doc = PackageGraphStats(
+            purl=purl,
+            n_deps=int(stats.n_deps[node]),
+            n_tdeps=int(stats.n_tdeps[node]),
+            max_depth=int(stats.max_depth[node]),
+            scc=cycle[0] if cycle else purl,
+            scc_size=len(cycle) if cycle else 1,
+            record_updated_at=started,
+        )
+        ops.append(UpdateOne({"purl": purl}, {"$set": doc.dict(by_alias=True, exclude={"id"})}, upsert=True))
+        if len(ops) >= _WRITE_BATCH_SIZE:
+            await collection.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+    await collection.delete_many({"record_updated_at": {"$lt": started}})
+
+    cycles = cycles_by_distro(stats.cycles)
+    logger.info("Graph stats of {} purls stored, {} dependency cycles", len(stats.purls), len(stats.cycles))
+    for distro, found in cycles.items():
+        logger.info(
+            "{}: {} cycles of {} packages, largest {}", distro, len(found), sum(map(len, found)), len(found[0])
+        )
+    return cycles
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from pkgdash.models.connector.mongo import create_engine
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--report", help="write the dependency cycles per distro to this JSON file")
+    parser.add_argument("--memory-mb", type=int, default=SCC_MEMORY_MB, help="memory of the closure bitsets")
+    args = parser.parse_args()
+
+    async def main():
+        await create_engine()
+        cycles = await refresh_graph_stats(memory_mb=args.memory_mb)
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(cycles, f, indent=2)
+
+    asyncio.run(main())
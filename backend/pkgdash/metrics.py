@@ -0,0 +1,156 @@
+"""
+Prometheus metrics of the API server
+
+Enabled by metrics.enabled in settings.toml (requires the prometheus_client package):
+
+- HTTP requests: latency histograms, in-flight gauges and response size summaries
+  per route template (e.g. /api/pkg/info), so path parameters don't explode cardinality
+- MongoDB commands: latency histograms per collection and command, captured by a
+  PyMongo CommandListener that create_engine registers on the Motor client
+"""
+
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from pymongo import monitoring
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from pkgdash import settings
+
+try:
+    import prometheus_client
+except ImportError:  # pragma: no cover
+    prometheus_client = None
+
+# request latencies are mostly a few ms, closures and regex searches can take seconds
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# route label of requests that match no route
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class Metrics:
+    """The metrics of a process, registered in `registry`"""
+
+    def __init__(self, registry: "prometheus_client.CollectorRegistry"):
+        self.registry = registry
+        labels = ["method", "route"]
+        self.http_duration = prometheus_client.Histogram(
+            "pkgdash_http_request_duration_seconds",
+            "Latency of HTTP requests",
+            labels + ["status"],
+            buckets=HTTP_BUCKETS,
+            registry=registry,
+        )
+        self.http_in_progress = prometheus_client.Gauge(
+            "pkgdash_http_requests_in_progress", "HTTP requests being served", labels, registry=registry
+        )
+        self.http_response_size = prometheus_client.Summary(
+            "pkgdash_http_response_size_bytes", "Size of HTTP response bodies", labels, registry=registry
+        )
+        self.mongo_duration = prometheus_client.Histogram(
+            "pkgdash_mongo_command_duration_seconds",
+            "Latency of MongoDB commands",
+            ["collection", "command"],
+            buckets=MONGO_BUCKETS,
+            registry=registry,
+        )
+        self.mongo_failures = prometheus_client.Counter(
+            "pkgdash_mongo_command_failures_total",
+            "Failed MongoDB commands",
+            ["collection", "command"],
+            registry=registry,
+        )
+
+    def render(self) -> Tuple[bytes, str]:
+        """(body, content type) of the /metrics response"""
+        return prometheus_client.generate_latest(self.registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+@lru_cache(maxsize=1)
+def get_metrics() -> Optional[Metrics]:
+    """The metrics of this process, or None if metrics.enabled is off"""
+    if not settings.get("metrics.enabled", False):
+        return None
+    if prometheus_client is None:
+        raise RuntimeError("metrics.enabled requires the prometheus_client package")
+    return Metrics(prometheus_client.CollectorRegistry())
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Times MongoDB commands by collection and command name.
+    Succeeded / failed events don't carry the collection, so it is kept from the started event.
+    """
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+        self.collections: Dict[Tuple, str] = {}
+
+    @staticmethod
+    def _key(event) -> Tuple:
+        return event.connection_id, event.request_id, event.operation_id
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            # e.g. getMore carries the cursor id, admin commands carry 1
+            collection = event.command.get("collection", "")
+        self.collections[self._key(event)] = collection
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        collection = self.collections.pop(self._key(event), "")
+        self.metrics.mongo_duration.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        collection = self.collections.pop(self._key(event), "")
+        self.metrics.mongo_duration.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        self.metrics.mongo_failures.labels(collection, event.command_name).inc()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the HTTP metrics; sizes are summed over the body
+    chunks, so streamed responses are measured as well
+    """
+
+    def __init__(self, app: ASGIApp, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    @staticmethod
+    def _route(scope: Scope) -> str:
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return UNMATCHED_ROUTE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope["method"], self._route(scope)
+        status, size = 500, 0
+
+        async def _send(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = self.metrics.http_in_progress.labels(method, route)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            in_progress.dec()
+            self.metrics.http_duration.labels(method, route, str(status)).observe(time.perf_counter() - started)
+            self.metrics.http_response_size.labels(method, route).observe(size)
@@ -2,6 +2,9 @@ from .database.package import Package, PackageStats, PackageVulns
 from .database.repository import Repository, RepositoryStats
 from .database.deplink import PackageDependency
 from .database.sourcelink import PackageSource
+from .database.facet import PackageFacetCount
+from .database.transitive import ClosureRequests, TransitiveDeps
+from .database.graphstats import PackageGraphStats
 
 __all__ = [
     "Package",
@@ -10,5 +13,9 @@ __all__ = [
     "RepositoryStats",
     "PackageDependency",
     "PackageSource",
-    "PackageVulns"
+    "PackageVulns",
+    "PackageFacetCount",
+    "TransitiveDeps",
+    "ClosureRequests",
+    "PackageGraphStats",
 ]
\ No newline at end of file
@@ -5,20 +5,33 @@ from beanie import Document, init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from pkgdash import settings
+from pkgdash.metrics import MongoCommandListener, get_metrics
+from pkgdash.slowlog import get_slow_query_log
 from ..database.package import Package, PackageStats, PackageVulns
 from ..database.repository import Repository, RepositoryStats
 from ..database.osrepo import OSPackageRepository
 from ..database.deplink import PackageDependency
 from ..database.sourcelink import PackageSource
+from ..database.facet import PackageFacetCount
+from ..database.transitive import ClosureRequests, TransitiveDeps
+from ..database.graphstats import PackageGraphStats
 
 _ORM_MODELS = [Package, Repository, PackageStats, RepositoryStats, OSPackageRepository, 
-               PackageDependency, PackageSource, PackageVulns]
+               PackageDependency, PackageSource, PackageVulns, PackageFacetCount, TransitiveDeps,
+               ClosureRequests, PackageGraphStats]
 
 async def create_engine() -> AsyncIOMotorClient:
     """
     Creates a new motor engine
     """
-    client = AsyncIOMotorClient(settings.mongodb.url)
+    metrics = get_metrics()
+    slowlog = get_slow_query_log()
+    listeners = [MongoCommandListener(metrics)] if metrics else []
+    if slowlog:
+        listeners.append(slowlog)
+    client = AsyncIOMotorClient(settings.mongodb.url, event_listeners=listeners)
+    if slowlog:
+        slowlog.attach(client, asyncio.get_running_loop())
     _db = client[settings.mongodb.db]
 
     # Beanie initialization. This will create indexes
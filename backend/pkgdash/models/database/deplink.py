@@ -1,10 +1,12 @@
 from typing import Optional, List, Union, Literal
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from beanie import Document, Indexed
 import pymongo
 
+from ..purl import purl_keys_validator
+
 # defines a software package
 class PackageDependency(Document, BaseModel):
     """
@@ -18,6 +20,11 @@ class PackageDependency(Document, BaseModel):
     """
     purl: Indexed(str, "hashed")
     """
+    Normalized lookup keys, see pkgdash.models.purl
+    """
+    purl_key: Optional[str]
+    purl_base: Optional[str]
+    """
     Only for OS packages
     """
     pkgid: Optional[int]
@@ -26,6 +33,8 @@ class PackageDependency(Document, BaseModel):
     PURL of the dependency
     """
     dep_purl: Indexed(str, "hashed")
+    dep_purl_key: Optional[str]
+    dep_purl_base: Optional[str]
     """
     Only for OS Packages
     """
@@ -42,7 +51,10 @@ class PackageDependency(Document, BaseModel):
     """
     The detection time of the dependency
     """
-    dep_at: datetime = datetime.utcnow()
+    dep_at: datetime = Field(default_factory=datetime.utcnow)
+
+    _purl_keys = purl_keys_validator("purl")
+    _dep_purl_keys = purl_keys_validator("dep_purl")
 
     # create unique index on (purl, dep_purl)
     class Settings:
@@ -50,5 +62,9 @@ class PackageDependency(Document, BaseModel):
             pymongo.IndexModel(
                 [("purl", pymongo.ASCENDING), ("dep_purl", pymongo.ASCENDING)],
                 unique=True,
-            )
+            ),
+            pymongo.IndexModel([("purl_key", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("purl_base", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("dep_purl_key", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("dep_purl_base", pymongo.ASCENDING)]),
         ]
\ No newline at end of file
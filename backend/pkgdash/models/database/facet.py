@@ -0,0 +1,28 @@
+from typing import Optional
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+from beanie import Document
+import pymongo
+
+
+class PackageFacetCount(Document, BaseModel):
+    """
+    Number of packages per value of a facet (distro, arch, license, ...)
+    Maintained by pkgdash.models.facets
+    """
+
+    """The counted Package attribute, see pkgdash.models.facets.FACETS"""
+    facet: str
+    """The attribute value (None for packages without it)"""
+    value: Optional[str]
+    """Number of packages"""
+    n_packages: int = 0
+
+    """Metadata"""
+    record_updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        indexes = [
+            pymongo.IndexModel([("facet", pymongo.ASCENDING), ("value", pymongo.ASCENDING)], unique=True),
+        ]
@@ -0,0 +1,41 @@
+from typing import Optional
+from datetime import datetime
+
+import pymongo
+from pydantic import BaseModel, Field
+from beanie import Document, Indexed
+
+from ..purl import purl_keys_validator
+
+
+class PackageGraphStats(Document, BaseModel):
+    """
+    Precomputed dependency graph stats of a package
+    Maintained by pkgdash.graph.scc
+    """
+
+    """Purl, as stored in PackageDependency.purl / dep_purl"""
+    purl: Indexed(str, unique=True)
+    purl_key: Optional[str]
+    purl_base: Optional[str]
+    """Number of direct dependencies"""
+    n_deps: int
+    """Number of distinct packages reachable through dependencies (the package itself excluded)"""
+    n_tdeps: int
+    """Longest dependency chain below the package, a dependency cycle counting as one level"""
+    max_depth: int
+    """Strongly connected component: its smallest purl, and its number of purls (> 1 for a cycle)"""
+    scc: str
+    scc_size: int
+
+    """Metadata"""
+    record_updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    _purl_keys = purl_keys_validator()
+
+    class Settings:
+        indexes = [
+            pymongo.IndexModel([("purl_key", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("purl_base", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("scc", pymongo.ASCENDING)]),
+        ]
@@ -1,7 +1,7 @@
 from typing import Optional, List, Union, Literal
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from beanie import Document, Indexed
 
 class OSPackageRepository(Document, BaseModel):
@@ -21,5 +21,5 @@ class OSPackageRepository(Document, BaseModel):
     files: List[str] = []
 
     """Metadata"""
-    record_created_at: datetime = datetime.utcnow()
-    record_updated_at: datetime = datetime.utcnow()
\ No newline at end of file
+    record_created_at: datetime = Field(default_factory=datetime.utcnow)
+    record_updated_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
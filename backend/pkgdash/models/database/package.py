@@ -1,11 +1,12 @@
 from typing import Optional, List, Union, Literal
 from datetime import datetime, timezone
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from beanie import Document, Indexed
 import pymongo
 
 from ..spdx_license import SPDXLicense
+from ..purl import purl_keys_validator
 from pkgdash.common import DATE_RANGE
 
 
@@ -21,6 +22,9 @@ class Package(Document, BaseModel):
     Spec: https://github.com/package-url/purl-spec
     """
     purl: Indexed(str, unique=True)
+    """Normalized lookup keys, see pkgdash.models.purl"""
+    purl_key: Optional[str]
+    purl_base: Optional[str]
     """The display name of the package"""
     name: str
     """Package Version"""
@@ -46,8 +50,19 @@ class Package(Document, BaseModel):
     source_pid: Optional[str]
 
     """Metadata"""
-    record_created_at: datetime = datetime.utcnow()
-    record_updated_at: datetime = datetime.utcnow()
+    record_created_at: datetime = Field(default_factory=datetime.utcnow)
+    record_updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    _purl_keys = purl_keys_validator()
+
+    class Settings:
+        indexes = [
+            pymongo.IndexModel([("purl_key", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("purl_base", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("repo_url", pymongo.ASCENDING)]),
+            # name prefix searches without the search index
+            pymongo.IndexModel([("name", pymongo.ASCENDING)]),
+        ]
 
 
 class PackageStats(Document, BaseModel):
@@ -58,13 +73,15 @@ class PackageStats(Document, BaseModel):
     Spec: https://github.com/package-url/purl-spec
     """
     purl: Indexed(str, "hashed")
+    purl_key: Optional[str]
+    purl_base: Optional[str]
     """The date range of the statistics"""
     stats_from: datetime
     stats_interval: DATE_RANGE
 
     """Metadata"""
-    record_created_at: datetime = datetime.utcnow()
-    record_updated_at: datetime = datetime.utcnow()
+    record_created_at: datetime = Field(default_factory=datetime.utcnow)
+    record_updated_at: datetime = Field(default_factory=datetime.utcnow)
 
     """The number of commits / comments / issues / prs / stars / tags in the date range"""
     n_commits: int
@@ -77,6 +94,8 @@ class PackageStats(Document, BaseModel):
     """Compound Metrics"""
     pagerank: Optional[float]
 
+    _purl_keys = purl_keys_validator()
+
     # create unique index on (url, stats_from, stats_interval)
     class Settings:
         indexes = [
@@ -87,12 +106,16 @@ class PackageStats(Document, BaseModel):
                     ("stats_interval", pymongo.ASCENDING),
                 ],
                 unique=True,
-            )
+            ),
+            pymongo.IndexModel([("purl_key", pymongo.ASCENDING), ("stats_from", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("purl_base", pymongo.ASCENDING), ("stats_from", pymongo.ASCENDING)]),
         ]
 
 
 class PackageVulns(Document, BaseModel):
     purl: Indexed(str, "hashed")
+    purl_key: Optional[str]
+    purl_base: Optional[str]
     repo_url: Indexed(str, "hashed")
     name: str
     version: str
@@ -103,8 +126,10 @@ class PackageVulns(Document, BaseModel):
     license_compatibility: Optional[int] = None
 
     """Metadata"""
-    record_created_at: datetime = datetime.now(timezone.utc)
-    record_updated_at: datetime = datetime.now(timezone.utc)
+    record_created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    record_updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    _purl_keys = purl_keys_validator()
 
     # create unique index on (purl, dep_purl)
     class Settings:
@@ -112,5 +137,9 @@ class PackageVulns(Document, BaseModel):
             pymongo.IndexModel(
                 [("purl", pymongo.ASCENDING), ("repo_url", pymongo.ASCENDING)],
                 unique=True,
-            )
+            ),
+            pymongo.IndexModel([("purl_key", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("purl_base", pymongo.ASCENDING)]),
+            # packages affected by a vulnerability id (multikey)
+            pymongo.IndexModel([("vulns", pymongo.ASCENDING)]),
         ]
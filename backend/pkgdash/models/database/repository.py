@@ -1,7 +1,7 @@
 from typing import Optional, List, Union, Literal
 from datetime import datetime, timezone
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from beanie import Document, Indexed
 import pymongo
 
@@ -17,7 +17,7 @@ class Repository(Document, BaseModel):
     """The url of the repository"""
     url: Indexed(str, unique=True)
     """The display name of the package"""
-    name: str
+    name: Indexed(str)
 
     """Statistics"""
     n_stars: int
@@ -31,13 +31,15 @@ class Repository(Document, BaseModel):
     topics: List[str] = []
     description: Optional[str]
     similar_repos: List[str] = []
+    """Purls of packages built from similar_repos (None until computed)"""
+    recommended_purls: Optional[List[str]] = None
 
     """License Info from GitHub API, should be SPDX compatible"""
     license: Optional[str]
 
     """Metadata"""
-    record_created_at: datetime = datetime.now(timezone.utc)
-    record_updated_at: datetime = datetime.now(timezone.utc)
+    record_created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    record_updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 # Pydantic model for Repository
@@ -97,8 +99,8 @@ class RepositoryStats(Document, BaseModel):
     n_tags: int
 
     """Metadata"""
-    record_created_at: datetime = datetime.now(timezone.utc)
-    record_updated_at: datetime = datetime.now(timezone.utc)
+    record_created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    record_updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
     """Compound Metrics"""
     hits: Optional[float]
@@ -1,10 +1,12 @@
 from typing import Optional, List, Union, Literal
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from beanie import Document, Indexed
 import pymongo
 
+from ..purl import purl_keys_validator
+
 # defines a software package
 class PackageSource(Document, BaseModel):
     """
@@ -18,6 +20,11 @@ class PackageSource(Document, BaseModel):
     """
     purl: Indexed(str, "hashed")
     """
+    Normalized lookup keys, see pkgdash.models.purl
+    """
+    purl_key: Optional[str]
+    purl_base: Optional[str]
+    """
     PURL of the dependency
     """
     repo_url: Indexed(str, "hashed")
@@ -28,17 +35,21 @@ class PackageSource(Document, BaseModel):
     """
     The detection time of the dependency
     """
-    sourced_at: datetime = datetime.utcnow()
+    sourced_at: datetime = Field(default_factory=datetime.utcnow)
     """
     The detection confidence
     """
     confidence: float = 1.0
 
+    _purl_keys = purl_keys_validator()
+
     # create unique index on (purl, dep_purl)
     class Settings:
         indexes = [
             pymongo.IndexModel(
                 [("purl", pymongo.ASCENDING), ("repo_url", pymongo.ASCENDING)],
                 unique=True,
-            )
+            ),
+            pymongo.IndexModel([("purl_key", pymongo.ASCENDING)]),
+            pymongo.IndexModel([("purl_base", pymongo.ASCENDING)]),
         ]
\ No newline at end of file
@@ -0,0 +1,52 @@
+from typing import List
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+from beanie import Document, Indexed, PydanticObjectId
+
+
+class TransitiveDeps(Document, BaseModel):
+    """
+    Materialized transitive dependencies of a popular package
+    Maintained by pkgdash.graph.materialize
+    """
+
+    """Root purl, as stored in PackageDependency.purl"""
+    purl: Indexed(str, unique=True)
+    """_id of the PackageDependency edges of the closure, in BFS order"""
+    edge_ids: List[PydanticObjectId] = []
+    """True if the closure exceeded closures.max_edges: no edge ids, stats up to the limit"""
+    oversized: bool = False
+    """Closure stats: reached purls (root included), edges, deepest level"""
+    n_nodes: int
+    n_edges: int
+    depth: int
+    truncated: bool
+    """Number of reached purls at each BFS depth"""
+    depth_counts: List[int] = []
+    """Limits the closure was computed with"""
+    max_depth: int
+    max_nodes: int
+
+    """Why the root was selected: number of direct dependents / tdeps requests"""
+    in_degree: int = 0
+    n_requests: int = 0
+    """PackageDependency count and newest _id at computation; changed by re-imports"""
+    edges_signature: str
+
+    """Metadata"""
+    record_updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ClosureRequests(Document, BaseModel):
+    """
+    Number of /api/pkg/tdeps requests per root, added up by the API workers
+    Read by pkgdash.graph.materialize to materialize the most requested closures
+    """
+
+    """Root purl, as stored in PackageDependency.purl"""
+    purl: Indexed(str, unique=True)
+    n_requests: int = 0
+
+    """Metadata"""
+    record_updated_at: datetime = Field(default_factory=datetime.utcnow)
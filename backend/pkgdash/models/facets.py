@@ -0,0 +1,111 @@
+"""
+Materialized package counts per facet (distro, distro_release, arch, type, license)
+
+Counting over the whole Package collection on every request doesn't scale, so
+the counts live in the small PackageFacetCount collection instead:
+
+- importers call :func:`count_new_packages` with the packages they inserted
+- :func:`recount_facets` recomputes everything in one aggregation and corrects
+  the drift left by updates and deletions (run from cron: python -m pkgdash.models.facets)
+"""
+
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from pymongo import UpdateOne
+
+from pkgdash import logger
+from pkgdash.cache import invalidate
+from .database.facet import PackageFacetCount
+from .database.package import Package
+
+FACETS = ("distro", "distro_release", "arch", "type", "license")
+
+# "pkg:rpm/..." -> "rpm"
+_PURL_TYPE = {
+    "$arrayElemAt": [{"$split": [{"$arrayElemAt": [{"$split": ["$purl", "/"]}, 0]}, ":"]}, 1]
+}
+
+
+def _purl_type(purl: str) -> Optional[str]:
+    _, _, rest = purl.partition(":")
+    return rest.split("/", 1)[0] or None
+
+
+def _facet_value(package: Package, facet: str) -> Optional[str]:
+    if facet == "type":
+        return _purl_type(package.purl)
+    return getattr(package, facet)
+
+
+async def _write_counts(counts: Dict[Tuple[str, Optional[str]], int], increment: bool, now: datetime) -> None:
+    ops = [
+        UpdateOne(
+            {"facet": facet, "value": value},
+            {"$inc": {"n_packages": n}, "$set": {"record_updated_at": now}}
+            if increment
+            else {"$set": {"n_packages": n, "record_updated_at": now}},
+            upsert=True,
+        )
+        for (facet, value), n in counts.items()
+    ]
+    if ops:
+        await PackageFacetCount.get_motor_collection().bulk_write(ops, ordered=False)
+
+
+async def count_new_packages(packages: Iterable[Package]) -> None:
+    """
+    Adds newly inserted packages to the counts (updated packages must not be passed)
+    """
+    counts = Counter((facet, _facet_value(p, facet)) for p in packages for facet in FACETS)
+    await _write_counts(counts, True, datetime.utcnow())
+    if counts:
+        await invalidate(PackageFacetCount)
+
+
+async def recount_facets() -> None:
+    """
+    Recomputes all counts with a single pass over Package and drops values that disappeared
+    """
+    started = datetime.utcnow()
+    pipeline = [
+        {
+            "$facet": {
+                facet: [{"$group": {"_id": _PURL_TYPE if facet == "type" else f"${facet}", "count": {"$sum": 1}}}]
+                for facet in FACETS
+            }
+        }
+    ]
+    counts = {}
+    async for doc in Package.get_motor_collection().aggregate(pipeline):
+        for facet in FACETS:
+            for group in doc.get(facet, []):
+                counts[(facet, group["_id"])] = group["count"]
+    await _write_counts(counts, False, started)
+    await PackageFacetCount.get_motor_collection().delete_many({"record_updated_at": {"$lt": started}})
+    await invalidate(PackageFacetCount)
+    logger.info("Recounted {} facet values", len(counts))
+
+
+async def facet_counts(facets: Sequence[str] = FACETS) -> Dict[str, Dict[str, int]]:
+    """
+    {facet: {value: number of packages}}; packages without a value aren't reported
+    """
+    res: Dict[str, Dict[str, int]] = {facet: {} for facet in facets}
+    query = {"facet": {"$in": list(facets)}, "value": {"$ne": None}, "n_packages": {"$gt": 0}}
+    async for doc in PackageFacetCount.get_motor_collection().find(query, {"_id": 0}).sort("value"):
+        res[doc["facet"]][doc["value"]] = doc["n_packages"]
+    return res
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    from pkgdash.models.connector.mongo import create_engine
+
+    async def main():
+        await create_engine()
+        await recount_facets()
+
+    asyncio.run(main())
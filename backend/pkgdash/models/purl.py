@@ -0,0 +1,176 @@
+"""
+Normalized purl lookup keys
+
+Stored purls are not canonical (e.g. the RPM analyzers write qualifiers in
+arch/epoch/distro order), and the purl fields only carry hashed indexes, which
+cannot serve prefix matches. Every model with a purl therefore persists two
+derived fields with ascending indexes:
+
+- ``<field>_key``: ``pkg:type/namespace/name@version`` (no qualifiers / subpath)
+- ``<field>_base``: ``pkg:type/namespace/name`` (no version)
+
+Routes resolve user input with :class:`PurlLookup` into exact or range lookups
+on those fields and only fall back to ``$regex`` when explicitly asked to.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Literal, Optional, Tuple
+
+from packageurl import PackageURL
+from pydantic import validator
+
+MATCH_MODE = Literal["exact", "prefix", "regex"]
+
+# upper bound for range scans on string keys
+_RANGE_END = "\U0010ffff"
+
+
+def parse_purl(purl: str) -> PackageURL:
+    """
+    Parses a user supplied purl, tolerating an url-encoded '@' in the version separator
+    :raises ValueError: if the purl is malformed
+    """
+    return PackageURL.from_string(purl.replace("%40", "@"))
+
+
+def _purl_keys_of(p: PackageURL) -> Tuple[str, str]:
+    key = PackageURL(type=p.type, namespace=p.namespace, name=p.name, version=p.version).to_string()
+    base = PackageURL(type=p.type, namespace=p.namespace, name=p.name).to_string()
+    return key, base
+
+
+@lru_cache(maxsize=65536)
+def purl_keys(purl: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns (purl_key, purl_base) of a stored purl, or (None, None) if it can't be parsed
+    """
+    if not purl:
+        return None, None
+    try:
+        return _purl_keys_of(parse_purl(purl))
+    except ValueError:
+        return None, None
+
+
+def purl_keys_validator(source: str = "purl"):
+    """
+    Pydantic validator filling ``<source>_key`` and ``<source>_base`` from ``<source>``.
+    The keys are always recomputed so they can't drift from the purl they describe.
+    """
+
+    def _fill(cls, v, values, field):
+        key, base = purl_keys(values.get(source))
+        return key if field.name.endswith("_key") else base
+
+    return validator(f"{source}_key", f"{source}_base", always=True, allow_reuse=True)(_fill)
+
+
+class PurlLookup:
+    """
+    A parsed purl from user input, turned into index-backed Mongo filters
+    """
+
+    def __init__(self, purl: str):
+        self.purl = parse_purl(purl)
+        self.canonical = self.purl.to_string()
+        self.key, self.base = _purl_keys_of(self.purl)
+        self.qualifiers: Dict[str, str] = dict(self.purl.qualifiers or {})
+
+    def query(self, field: str = "purl", match: MATCH_MODE = "exact") -> Dict[str, Any]:
+        """
+        Builds the filter for ``field`` (e.g. "purl" or "dep_purl")
+        - exact: equality on <field>_key (or <field>_base if no version is given)
+        - prefix: range scan on <field>_key, e.g. pkg:npm/foo@1. matches every 1.x
+        - regex: legacy anchored $regex on the raw field
+        """
+        if match == "regex":
+            return {field: {"$regex": f"^{re.escape(self.canonical)}"}}
+        if not self.purl.version:
+            return {f"{field}_base": self.base}
+        if match == "prefix":
+            return {f"{field}_key": {"$gte": self.key, "$lt": self.key + _RANGE_END}}
+        return {f"{field}_key": self.key}
+
+    def accepts(self, purl: Optional[str]) -> bool:
+        """
+        Checks the qualifiers given in the lookup (arch, distro, ...) against a stored purl
+        """
+        if not self.qualifiers:
+            return True
+        if not purl:
+            return False
+        try:
+            stored = parse_purl(purl).qualifiers or {}
+        except ValueError:
+            return False
+        return all(stored.get(k) == v for k, v in self.qualifiers.items())
+
+
+def batch_query(lookups: Iterable[PurlLookup], field: str = "purl") -> Dict[str, Any]:
+    """
+    One filter (exact matching) covering several lookups
+    """
+    lookups = list(lookups)
+    keys: List[str] = sorted({l.key for l in lookups if l.purl.version})
+    bases: List[str] = sorted({l.base for l in lookups if not l.purl.version})
+    clauses = []
+    if keys:
+        clauses.append({f"{field}_key": {"$in": keys}})
+    if bases:
+        clauses.append({f"{field}_base": {"$in": bases}})
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$or": clauses}
+
+
+async def backfill_purl_keys(batch_size: int = 1000) -> None:
+    """
+    Writes the lookup keys into documents stored before they existed
+    """
+    from pymongo import UpdateOne
+
+    from pkgdash import logger
+    from .database.package import Package, PackageStats, PackageVulns
+    from .database.deplink import PackageDependency
+    from .database.sourcelink import PackageSource
+
+    targets = [
+        (Package, ["purl"]),
+        (PackageStats, ["purl"]),
+        (PackageVulns, ["purl"]),
+        (PackageDependency, ["purl", "dep_purl"]),
+        (PackageSource, ["purl"]),
+    ]
+    for model, fields in targets:
+        collection = model.get_motor_collection()
+        missing = {"$or": [{f"{f}_key": {"$exists": False}} for f in fields]}
+        ops, n_updated = [], 0
+        async for doc in collection.find(missing, {f: 1 for f in fields}):
+            update = {}
+            # the responses of conditional routes change with the new keys
+            if "record_updated_at" in model.__fields__:
+                update["record_updated_at"] = model.__fields__["record_updated_at"].default_factory()
+            for f in fields:
+                update[f"{f}_key"], update[f"{f}_base"] = purl_keys(doc.get(f))
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+            if len(ops) >= batch_size:
+                await collection.bulk_write(ops, ordered=False)
+                n_updated += len(ops)
+                ops = []
+        if ops:
+            await collection.bulk_write(ops, ordered=False)
+            n_updated += len(ops)
+        logger.info("Backfilled purl keys of {} {} documents", n_updated, model.__name__)
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    from pkgdash.models.connector.mongo import create_engine
+
+    async def main():
+        await create_engine()
+        await backfill_purl_keys()
+
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+Time-series rollups of PackageStats / RepositoryStats
+
+The stats collections hold one document per package or repository and period (daily
+for the GitHub fetcher). Charts over several years only need weekly or monthly points,
+so the stats routes can group the documents into coarser periods in MongoDB
+($dateTrunc, MongoDB >= 5.0) instead of returning every document:
+
+- counters (commits, issues, ...) are summed over the period
+- gauges (stars, compound metrics) take their last value in the period
+
+A period may hold stored documents of different intervals, e.g. a monthly document
+written mid-month and the daily documents of the rest of the month. A document
+covers its own interval up to its record_updated_at; documents are taken coarsest
+first, and finer ones only for the time the taken ones don't cover, so that
+nothing is counted twice and nothing after a coarse snapshot is dropped.
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union, get_args
+
+from pkgdash.common import DATE_RANGE
+
+COUNTERS = ("n_commits", "n_comments", "n_issues", "n_prs", "n_tags")
+GAUGES = ("n_stars", "pagerank", "hits", "hits_rank_pct", "hits_zscore")
+
+# coarse to fine
+_INTERVALS = list(reversed(get_args(DATE_RANGE)))
+
+# stored periods that fit entirely into a period of the key (weeks straddle months)
+_SOURCES: Dict[str, List[str]] = {
+    "Day": ["Day"],
+    "Week": ["Day", "Week"],
+    "Month": ["Day", "Month"],
+    "Year": ["Day", "Month", "Year"],
+}
+
+
+def date_range(start: Union[datetime, date, None], end: Union[datetime, date, None]) -> Dict[str, Any]:
+    """Filter on stats_from for the (inclusive) range, empty if unbounded; an end date includes the whole day"""
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = start if isinstance(start, datetime) else datetime.combine(start, time.min)
+    if end is not None:
+        bounds["$lte"] = end if isinstance(end, datetime) else datetime.combine(end, time.max)
+    return {"stats_from": bounds} if bounds else {}
+
+
+def _fields(model) -> Tuple[List[str], List[str]]:
+    return [f for f in COUNTERS if f in model.__fields__], [f for f in GAUGES if f in model.__fields__]
+
+
+def rollup_pipeline(model, key: str, query: Dict[str, Any], interval: DATE_RANGE) -> List[Dict[str, Any]]:
+    """
+    Aggregation grouping the `model` documents matching query into `interval` periods per `key`,
+    with the stored documents of each period (merged by merge_period)
+    """
+    counters, gauges = _fields(model)
+    trunc = {"$dateTrunc": {"date": "$stats_from", "unit": interval.lower(), "startOfWeek": "monday"}}
+    fields = ["stats_from", "stats_interval", *counters, *gauges, "record_created_at", "record_updated_at"]
+    return [
+        {"$match": {**query, "stats_interval": {"$in": _SOURCES[interval]}}},
+        {"$sort": {"stats_from": 1}},
+        {"$group": {"_id": {key: f"${key}", "period": trunc}, "docs": {"$push": {f: f"${f}" for f in fields}}}},
+        {"$sort": {"_id.period": 1, f"_id.{key}": 1}},
+    ]
+
+
+def _naive(d: datetime) -> datetime:
+    """UTC without tzinfo, as datetimes are read back from MongoDB"""
+    return d.astimezone(timezone.utc).replace(tzinfo=None) if d.tzinfo else d
+
+
+def _interval_end(start: datetime, interval: DATE_RANGE) -> datetime:
+    if interval == "Day":
+        return start + timedelta(days=1)
+    if interval == "Week":
+        return start + timedelta(weeks=1)
+    if interval == "Month":
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return start.replace(year=start.year + 1)
+
+
+def merge_period(docs: List[Dict[str, Any]], counters: List[str], gauges: List[str]) -> Dict[str, Any]:
+    """
+    Counters and gauges of a period from its stored documents (of any source intervals).
+    A document covers [stats_from, min(end of its interval, record_updated_at)); coarser
+    documents are taken first, finer ones if they don't overlap what is already covered.
+    """
+    taken: List[Tuple[datetime, datetime, Dict[str, Any]]] = []
+    for doc in sorted(docs, key=lambda d: (_INTERVALS.index(d["stats_interval"]), _naive(d["stats_from"]))):
+        start = _naive(doc["stats_from"])
+        end = _interval_end(start, doc["stats_interval"])
+        if any(start < t_end and t_start < end for t_start, t_end, _ in taken):
+            continue
+        updated = doc.get("record_updated_at")
+        covered = min(end, _naive(updated)) if updated is not None else end
+        taken.append((start, max(covered, start), doc))
+
+    merged: Dict[str, Any] = {f: sum(doc.get(f) or 0 for _, _, doc in taken) for f in counters}
+    # gauges: the values of the document covering the latest time
+    latest = max(taken, key=lambda t: (t[1], -_INTERVALS.index(t[2]["stats_interval"])))[2]
+    merged.update({f: latest.get(f) for f in gauges})
+    created = [doc["record_created_at"] for _, _, doc in taken if doc.get("record_created_at") is not None]
+    updated = [doc["record_updated_at"] for _, _, doc in taken if doc.get("record_updated_at") is not None]
+    if created:
+        merged["record_created_at"] = min(created, key=_naive)
+    if updated:
+        merged["record_updated_at"] = max(updated, key=_naive)
+    return merged
+
+
+async def rollup_stats(model, key: str, query: Dict[str, Any], interval: DATE_RANGE) -> list:
+    """
+    Stats of the documents matching query per `key` and `interval` period, sorted by period,
+    as (unsaved) documents of the model
+    """
+    counters, gauges = _fields(model)
+    cursor = model.get_motor_collection().aggregate(rollup_pipeline(model, key, query, interval))
+    return [
+        model.parse_obj(
+            {
+                key: group["_id"][key],
+                "stats_from": group["_id"]["period"],
+                "stats_interval": interval,
+                **merge_period(group["docs"], counters, gauges),
+            }
+        )
+        async for group in cursor
+    ]
@@ -0,0 +1,9 @@
+from .index import (
+    SearchEntry,
+    SearchIndex,
+    TrigramIndex,
+    load_package_entries,
+    load_repository_entries,
+)
+
+__all__ = ["SearchEntry", "SearchIndex", "TrigramIndex", "load_package_entries", "load_repository_entries"]
@@ -0,0 +1,249 @@
+"""
+Trigram search over package and repository names
+
+Unique names are split into character trigrams, and a postings list (trigram ->
+name ids) is held as CSR arrays, with a second CSR mapping every name to the
+entries (packages / repositories) that carry it. A query intersects the
+postings of its trigrams, verifies the substring, and ranks the hits by match
+quality (exact > prefix > substring) and then by popularity; names sharing most
+trigrams with the query (fuzzy hits) are only returned when nothing matches.
+Queries too short for trigrams only match name prefixes.
+"""
+
+import asyncio
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote
+
+import numpy as np
+
+from pkgdash import logger
+from pkgdash.graph.index import CSRAdjacency
+from pkgdash.models import Package, Repository
+
+# share of the query trigrams a fuzzy hit must contain
+FUZZY_MIN_OVERLAP = 0.6
+
+TIER_EXACT, TIER_PREFIX, TIER_SUBSTRING, TIER_FUZZY = range(4)
+
+
+def trigrams(text: str) -> List[str]:
+    return sorted({text[i : i + 3] for i in range(len(text) - 2)})
+
+
+@dataclass
+class SearchEntry:
+    """A searchable document"""
+
+    """Unique key of the document (purl / url)"""
+    key: str
+    """The searched text, e.g. the package name"""
+    text: str
+    """Value of the filterable field (e.g. distro)"""
+    group: Optional[str]
+    """Tie-breaker between equally good matches"""
+    popularity: float = 0.0
+
+
+class TrigramIndex:
+    """
+    Immutable trigram index over a set of SearchEntry
+    """
+
+    def __init__(self, entries: Iterable[SearchEntry]):
+        names: Dict[str, int] = {}
+        groups: Dict[Optional[str], int] = {}
+        grams: Dict[str, int] = {}
+        self.keys: List[str] = []
+        entry_name, entry_group, popularity = [], [], []
+        for entry in entries:
+            self.keys.append(entry.key)
+            entry_name.append(names.setdefault(entry.text.lower(), len(names)))
+            entry_group.append(groups.setdefault(entry.group, len(groups)))
+            popularity.append(entry.popularity)
+
+        self.names: List[str] = list(names)
+        order = sorted(range(len(self.names)), key=self.names.__getitem__)
+        self.sorted_names = [self.names[i] for i in order]
+        self.sorted_ids = np.array(order, dtype=np.int32)
+        self.groups = groups
+        self.entry_group = np.array(entry_group, dtype=np.int32)
+        self.popularity = np.array(popularity, dtype=np.float64)
+        entry_name = np.array(entry_name, dtype=np.int32)
+        self.name_entries = CSRAdjacency.from_edges(
+            entry_name, np.arange(len(self.keys), dtype=np.int32), len(self.names)
+        )
+
+        gram_ids, name_ids = [], []
+        for i, name in enumerate(self.names):
+            for gram in trigrams(name):
+                gram_ids.append(grams.setdefault(gram, len(grams)))
+                name_ids.append(i)
+        self.grams = grams
+        self.postings = CSRAdjacency.from_edges(
+            np.array(gram_ids, dtype=np.int32), np.array(name_ids, dtype=np.int32), len(grams)
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _matching_names(self, q: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(name ids, tiers) of names containing q, or starting with q if it is too short for trigrams"""
+        grams = trigrams(q)
+        if not grams:
+            # substrings of one or two characters match nearly everything: prefixes only, by binary search
+            lo = bisect_left(self.sorted_names, q)
+            hi = bisect_left(self.sorted_names, q + "\U0010ffff", lo)
+            hits = self.sorted_ids[lo:hi]
+            tiers = np.full(len(hits), TIER_PREFIX, dtype=np.int32)
+            if len(hits) and self.names[hits[0]] == q:
+                tiers[0] = TIER_EXACT
+            return hits, tiers
+
+        gram_ids = [self.grams.get(g, -1) for g in grams]
+        if min(gram_ids) < 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        postings = [self.postings.neighbors(np.array([g], dtype=np.int32)) for g in gram_ids]
+        # intersect starting from the shortest postings list
+        shortest, *rest = sorted(postings, key=len)
+        candidates = shortest
+        for p in rest:
+            candidates = np.intersect1d(candidates, p, assume_unique=True)
+        # names sharing all trigrams of a 3 character query contain it
+        hits = [int(i) for i in candidates if len(q) == 3 or q in self.names[i]]
+        tiers = [
+            TIER_EXACT if self.names[i] == q else TIER_PREFIX if self.names[i].startswith(q) else TIER_SUBSTRING
+            for i in hits
+        ]
+        return np.array(hits, dtype=np.int32), np.array(tiers, dtype=np.int32)
+
+    def _fuzzy_names(self, q: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(name ids, share of the trigrams of q) of names sharing most trigrams with q"""
+        grams = trigrams(q)
+        gram_ids = [g for g in (self.grams.get(g, -1) for g in grams) if g >= 0]
+        if not gram_ids:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+        postings = np.concatenate([self.postings.neighbors(np.array([g], dtype=np.int32)) for g in gram_ids])
+        counts = np.bincount(postings, minlength=len(self.names))
+        hits = np.flatnonzero(counts >= max(1, FUZZY_MIN_OVERLAP * len(grams))).astype(np.int32)
+        return hits, counts[hits] / len(grams)
+
+    def _entries(
+        self, name_ids: np.ndarray, groups: Optional[List[str]]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(entry ids, index of their name in name_ids, length of their name) of names, in groups"""
+        counts = self.name_entries.offsets[name_ids + 1] - self.name_entries.offsets[name_ids]
+        entries = self.name_entries.neighbors(name_ids)
+        names = np.repeat(np.arange(len(name_ids)), counts)
+        if groups:
+            wanted = np.array([self.groups[g] for g in groups if g in self.groups], dtype=np.int32)
+            keep = np.isin(self.entry_group[entries], wanted)
+            entries, names = entries[keep], names[keep]
+        name_len = np.array([len(self.names[i]) for i in name_ids], dtype=np.int64)[names]
+        return entries, names, name_len
+
+    def search(
+        self, q: str, groups: Optional[List[str]] = None, fuzzy: bool = True, limit: Optional[int] = None
+    ) -> Tuple[np.ndarray, int]:
+        """
+        (ids of the best entries matching q, best first, number of matching entries); see self.keys
+        :param q: the (literal) text to look for, case insensitive
+        :param groups: only keep entries of these groups
+        :param fuzzy: if nothing matches, return the names sharing most trigrams with q
+        :param limit: return this many entries at most (e.g. up to the requested page)
+        """
+        empty = np.empty(0, dtype=np.int32)
+        q = q.strip().lower()
+        if not q:
+            return empty, 0
+        name_ids, tiers = self._matching_names(q)
+        entries, names, name_len = self._entries(name_ids, groups)
+        similarity = np.ones(len(entries))
+        if not len(entries) and fuzzy:
+            name_ids, overlap = self._fuzzy_names(q)
+            tiers = np.full(len(name_ids), TIER_FUZZY, dtype=np.int32)
+            entries, names, name_len = self._entries(name_ids, groups)
+            similarity = overlap[names]
+        if not len(entries):
+            return empty, 0
+        tiers = tiers[names]
+
+        n = len(entries)
+        if limit is not None and limit < n:
+            # only the entries that can make the top `limit` are sorted: those ranking
+            # (by tier and similarity) at least as high as the limit-th one
+            rank = tiers + (1 - similarity)
+            cutoff = np.partition(rank, limit - 1)[limit - 1]
+            keep = rank <= cutoff
+            entries, tiers, similarity, name_len = entries[keep], tiers[keep], similarity[keep], name_len[keep]
+        # np.lexsort sorts by the last key first
+        order = np.lexsort((entries, name_len, -self.popularity[entries], -similarity, tiers))
+        return entries[order[:limit]], n
+
+
+class SearchIndex:
+    """
+    A TrigramIndex that is rebuilt from the database on refresh()
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Awaitable[List[SearchEntry]]]):
+        self.name = name
+        self.loader = loader
+        self.index: Optional[TrigramIndex] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None
+
+    async def refresh(self) -> None:
+        self.index = await asyncio.to_thread(TrigramIndex, await self.loader())
+        logger.info(
+            "Search index {} refreshed: {} entries, {} names",
+            self.name,
+            len(self.index),
+            len(self.index.names),
+        )
+
+
+def _namespaced_name(purl_base: Optional[str], name: str) -> str:
+    """namespace/name for language ecosystems (npm, maven, ...); OS packages use their distro as namespace"""
+    if not purl_base or purl_base.startswith(("pkg:rpm/", "pkg:deb/")):
+        return name
+    path = purl_base.split("/", 1)[-1]
+    if "/" not in path:
+        return name
+    return f"{unquote(path.rsplit('/', 1)[0])}/{name}"
+
+
+async def _repository_stars() -> Dict[str, int]:
+    stars = {}
+    async for doc in Repository.get_motor_collection().find({}, {"_id": 0, "url": 1, "n_stars": 1}):
+        stars[doc["url"]] = doc.get("n_stars") or 0
+    return stars
+
+
+async def load_package_entries() -> List[SearchEntry]:
+    """Packages keyed by purl, grouped by distro, ranked by the stars of their repository"""
+    stars = await _repository_stars()
+    projection = {"_id": 0, "purl": 1, "purl_base": 1, "name": 1, "distro": 1, "repo_url": 1}
+    entries = []
+    async for doc in Package.get_motor_collection().find({}, projection, batch_size=10000):
+        entries.append(
+            SearchEntry(
+                key=doc["purl"],
+                text=_namespaced_name(doc.get("purl_base"), doc.get("name") or ""),
+                group=doc.get("distro"),
+                popularity=stars.get(doc.get("repo_url"), 0),
+            )
+        )
+    return entries
+
+
+async def load_repository_entries() -> List[SearchEntry]:
+    """Repositories keyed by url, ranked by stars"""
+    projection = {"_id": 0, "url": 1, "name": 1, "n_stars": 1}
+    return [
+        SearchEntry(key=doc["url"], text=doc.get("name") or "", group=None, popularity=doc.get("n_stars") or 0)
+        async for doc in Repository.get_motor_collection().find({}, projection)
+    ]
@@ -0,0 +1,148 @@
+"""
+Admission control of expensive routes (transitive closures, dependents, searches)
+
+A single closure of a hub package can hold the Mongo connection pool for seconds,
+so each limited route admits at most `concurrency` requests at a time (per API
+process). Requests over the limit wait in a queue of at most `queue` requests:
+
+- a request arriving at a full queue is answered 429 right away
+- a request still waiting after admission.queue_timeout seconds is answered 503
+
+An admitted request gets a time budget of `max_time_ms` from its arrival; the route
+passes what is left of it to Mongo as maxTimeMS (see :func:`time_budget_ms`), and a
+query exceeding it is answered 503.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from functools import lru_cache, wraps
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pymongo.errors import ExecutionTimeout
+
+from pkgdash import logger, settings
+
+QUEUE_TIMEOUT: float = settings.get("admission.queue_timeout", 2.0)
+
+
+@dataclass
+class AdmissionLimit:
+    """Concurrency limit, queue size and time budget of a route"""
+
+    name: str
+    concurrency: int
+    queue: int
+    max_time_ms: Optional[int] = None
+
+    def __post_init__(self):
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.waiting = 0
+
+    async def acquire(self) -> None:
+        """Takes a slot, or raises 429 if the queue is full and 503 if no slot freed up in time"""
+        if self.slots.locked() and self.waiting >= self.queue:
+            raise HTTPException(
+                status_code=429, detail=f"Too many concurrent {self.name} requests", headers={"Retry-After": "1"}
+            )
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.slots.acquire(), QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503, detail=f"Server busy with {self.name} requests", headers={"Retry-After": "1"}
+            )
+        finally:
+            self.waiting -= 1
+
+    def release(self) -> None:
+        self.slots.release()
+
+
+@lru_cache(maxsize=None)
+def get_limit(name: str) -> Optional[AdmissionLimit]:
+    """The limit of admission.routes.<name>, None if admission control is off or the route isn't limited"""
+    if not settings.get("admission.enabled", False):
+        return None
+    config = settings.get(f"admission.routes.{name}")
+    if not config:
+        return None
+    return AdmissionLimit(name, int(config["concurrency"]), int(config.get("queue", 0)), config.get("max_time_ms"))
+
+
+def time_budget_ms(request: Request, cap: Optional[int] = None) -> Optional[int]:
+    """
+    What is left of the time budget of an admitted request in ms (at least 1), for maxTimeMS,
+    at most `cap`; `cap` if the request has no budget
+    """
+    deadline = getattr(request.state, "deadline", None)
+    if deadline is None:
+        return cap
+    remaining = max(1, int((deadline - time.monotonic()) * 1000))
+    return min(remaining, cap) if cap else remaining
+
+
+def _budget_exceeded(name: str) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"The {name} request took longer than its time budget")
+
+
+def admitted(name: str):
+    """
+    Limits the concurrency of a route by the admission.routes.<name> settings.
+    The route must take a `request: Request` parameter. Put it below @cached so cache hits
+    aren't limited; streamed responses keep their slot until the body is sent.
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            limit = get_limit(name)
+            if limit is None:
+                return await fn(*args, **kwargs)
+
+            request: Request = kwargs["request"]
+            arrived = time.monotonic()
+            await limit.acquire()
+            if limit.max_time_ms:
+                request.state.deadline = arrived + limit.max_time_ms / 1000
+            try:
+                result = await fn(*args, **kwargs)
+            except ExecutionTimeout:
+                limit.release()
+                raise _budget_exceeded(name) from None
+            except BaseException:
+                limit.release()
+                raise
+            if not isinstance(result, StreamingResponse):
+                limit.release()
+                return result
+
+            body, released = result.body_iterator, False
+
+            async def release():
+                nonlocal released
+                if not released:
+                    released = True
+                    limit.release()
+
+            async def guarded():
+                try:
+                    async for chunk in body:
+                        yield chunk
+                except ExecutionTimeout:
+                    # the status is already sent, the client sees a truncated body
+                    logger.warning("Streamed {} response exceeded its time budget", name)
+                finally:
+                    await release()
+
+            result.body_iterator = guarded()
+            # also runs if the client disconnects before the body is started
+            result.background = BackgroundTask(release)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -1,24 +1,73 @@
 from contextlib import asynccontextmanager
+from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_pagination import add_pagination
 
+from pkgdash import settings
+from pkgdash.cache import get_cache
 from pkgdash.config import get_runtime_config
+from pkgdash.graph import ClosureStore, DependencyGraphIndex
+from pkgdash.metrics import MetricsMiddleware, get_metrics
 from pkgdash.models.connector.mongo import create_engine
+from pkgdash.models.facets import recount_facets
+from pkgdash.search import SearchIndex, load_package_entries, load_repository_entries
+from pkgdash.slowlog import get_slow_query_log
 
+from .coalescing import get_single_flight
 from .routes import pkg, repo
+from .sheduled_tasks import run_periodically
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await create_engine()
+    tasks = []
+    if settings.get("graph.index", False):
+        app.state.graph_index = DependencyGraphIndex()
+        tasks.append(
+            run_periodically(
+                "graph index",
+                app.state.graph_index.refresh,
+                settings.get("graph.index_refresh_interval", 300),
+            )
+        )
+    if settings.get("search.index", False):
+        app.state.package_search = SearchIndex("packages", load_package_entries)
+        app.state.repository_search = SearchIndex("repositories", load_repository_entries)
+        for index in app.state.package_search, app.state.repository_search:
+            tasks.append(
+                run_periodically(
+                    f"{index.name} search index",
+                    index.refresh,
+                    settings.get("search.index_refresh_interval", 3600),
+                )
+            )
+    if settings.get("closures.enabled", False):
+        app.state.closures = ClosureStore(settings.get("closures.cache_max_edges", 1000000))
+        await app.state.closures.warm(settings.get("closures.warm", 100))
+        tasks.append(
+            run_periodically(
+                "transitive closures",
+                app.state.closures.refresh,
+                settings.get("closures.refresh_interval", 300),
+            )
+        )
+    if settings.get("facets.recount_interval", 0) > 0:
+        tasks.append(run_periodically("facet counts", recount_facets, settings.facets.recount_interval))
     yield
+    for task in tasks:
+        task.cancel()
 
 
 def create_app() -> FastAPI:
     runtime_config = get_runtime_config()
     app = FastAPI(title="Package Dashboard", version="0.1.0", lifespan=lifespan)
+    app.state.graph_index = None
+    app.state.closures = None
+    app.state.package_search = None
+    app.state.repository_search = None
 
     app.add_middleware(
         CORSMiddleware,
@@ -26,8 +75,13 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Closure-Nodes", "X-Closure-Depth", "X-Closure-Truncated", "ETag"],
     )
 
+    metrics = get_metrics()
+    if metrics is not None:
+        app.add_middleware(MetricsMiddleware, metrics=metrics)
+
     app.include_router(pkg.api, prefix="/api/pkg", tags=["Package"])
     app.include_router(repo.api, prefix="/api/repo", tags=["Repository"])
     add_pagination(app)
@@ -36,6 +90,47 @@ def create_app() -> FastAPI:
     async def healthcheck():
         return {"status": "ok"}
 
+    @app.get("/api/cache/stats", tags=["Health"])
+    async def cache_stats():
+        """
+        Hit / miss counters per route and invalidations per collection, and the number of
+        calls per route that ran or were coalesced with an identical one in flight
+        """
+        cache = get_cache()
+        flights = get_single_flight()
+        return {
+            "enabled": cache.enabled,
+            "counters": cache.stats(),
+            "coalescing": flights.stats() if flights is not None else None,
+        }
+
+    # raw query filters and plans, not behind any auth: off unless slowlog.expose
+    if settings.get("slowlog.expose", False):
+
+        @app.get("/api/debug/slow-queries", tags=["Health"])
+        async def slow_queries(
+            collection: Optional[str] = None,
+            min_ms: float = 0,
+            collscan: Optional[bool] = None,
+            limit: int = 100,
+        ):
+            """
+            Mongo commands slower than slowlog.threshold_ms, newest first, with the plan
+            found by explain("executionStats"); filter on collscan=true to find missing indexes
+            """
+            slowlog = get_slow_query_log()
+            if slowlog is None:
+                return {"enabled": False, "threshold_ms": None, "queries": []}
+            queries = slowlog.query(collection, min_ms, collscan)[:limit]
+            return {"enabled": True, "threshold_ms": slowlog.threshold_ms, "queries": [q.to_dict() for q in queries]}
+
+    if metrics is not None:
+
+        @app.get("/metrics", include_in_schema=False)
+        async def prometheus_metrics():
+            body, media_type = metrics.render()
+            return Response(body, media_type=media_type)
+
     return app
 
 
@@ -0,0 +1,226 @@
+"""
+Route level response caching, see pkgdash.cache for the backends, and HTTP
+conditional requests (ETag / Last-Modified / 304)
+"""
+
+import hashlib
+import inspect
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import wraps
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import serialize_response
+from pydantic import BaseModel
+
+from pkgdash import logger, settings
+from pkgdash.cache import CacheEntry, get_cache
+from pkgdash.models.purl import PurlLookup
+from pkgdash.serve.coalescing import coalesce
+from pkgdash.serve.responses import FastJSONResponse
+
+# headers set by routes that must survive a cache hit
+_KEPT_HEADERS = ("x-closure-nodes", "x-closure-depth", "x-closure-truncated")
+
+
+def _canonical(name: str, value: Any) -> Any:
+    if name == "purl" and isinstance(value, str):
+        try:
+            return PurlLookup(value).canonical
+        except ValueError:
+            return value
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, (list, tuple, set)) and all(isinstance(v, str) for v in value):
+        return sorted(value)
+    return value
+
+
+def _dumps(content: Any) -> bytes:
+    # same encoding as starlette's JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def cache_key(route: str, params: Dict[str, Any]) -> str:
+    """Key of a route call: the route and its parameters, with purls canonicalized"""
+    canonical = {
+        k: _canonical(k, v) for k, v in params.items() if not isinstance(v, (Request, Response))
+    }
+    digest = hashlib.sha1(json.dumps(canonical, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{route}:{digest}"
+
+
+# injected into the signature of cached routes that don't take a Request
+_REQUEST_PARAM = "_cached_request"
+
+
+async def _encode(request: Optional[Request], result: Any) -> Any:
+    """The JSON content of a route result, filtered and validated by the route's response_model"""
+    route = request.scope.get("route") if request is not None else None
+    field = getattr(route, "response_field", None)
+    if field is None:
+        return jsonable_encoder(result)
+    return await serialize_response(
+        field=field,
+        response_content=result,
+        include=route.response_model_include,
+        exclude=route.response_model_exclude,
+        by_alias=route.response_model_by_alias,
+        exclude_unset=route.response_model_exclude_unset,
+        exclude_defaults=route.response_model_exclude_defaults,
+        exclude_none=route.response_model_exclude_none,
+    )
+
+
+def cached(*models):
+    """
+    Caches the JSON response of a route; invalidated with pkgdash.cache.invalidate(*models).
+    Results are serialized with the route's response_model, as FastAPI would.
+    Identical concurrent calls that miss the cache are coalesced (see pkgdash.serve.coalescing).
+    """
+    namespaces = tuple(m.__name__ for m in models)
+
+    def decorator(fn):
+        route = f"{fn.__module__}.{fn.__name__}"
+        signature = inspect.signature(fn)
+        takes_request = "request" in signature.parameters
+
+        async def miss(cache, key, request, /, *args, **kwargs):
+            cache.count(route).misses += 1
+            result = await fn(*args, **kwargs)
+            if isinstance(result, FastJSONResponse) and result.status_code == 200:
+                headers = {k: v for k, v in result.headers.items() if k in _KEPT_HEADERS}
+                entry = CacheEntry(body=result.body, headers=headers)
+            elif isinstance(result, Response):
+                return result
+            else:
+                headers = {}
+                for param in kwargs.values():
+                    if isinstance(param, Response):
+                        headers = {k: v for k, v in param.headers.items() if k in _KEPT_HEADERS}
+                entry = CacheEntry(body=_dumps(await _encode(request, result)), headers=headers)
+            try:
+                await cache.set(namespaces, key, entry)
+            except Exception as e:
+                logger.warning("Cache update of {} failed: {}", route, e)
+            return Response(content=entry.body, media_type="application/json", headers=entry.headers)
+
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            request = kwargs.pop(_REQUEST_PARAM, None) or kwargs.get("request")
+            cache = get_cache()
+            key = cache_key(route, kwargs)
+            if not cache.enabled:
+                return await coalesce(route, key, fn, *args, **kwargs)
+
+            try:
+                entry = await cache.get(namespaces, key)
+            except Exception as e:
+                logger.warning("Cache lookup of {} failed: {}", route, e)
+                return await coalesce(route, key, fn, *args, **kwargs)
+            if entry is not None:
+                cache.count(route).hits += 1
+                return Response(content=entry.body, media_type="application/json", headers=entry.headers)
+            return await coalesce(route, key, miss, cache, key, request, *args, **kwargs)
+
+        if not takes_request:
+            extra = inspect.Parameter(_REQUEST_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+            wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), extra])
+
+        return wrapper
+
+    return decorator
+
+
+CACHE_CONTROL: str = settings.get("cache.cache_control", "no-cache")
+
+
+async def _versions(model, field: str, params: Dict[str, Any]) -> Optional[List[Tuple[str, datetime]]]:
+    """
+    (id, record_updated_at) of the documents a route reads, fetched with a projection only.
+    None if the parameters can't be resolved, the route then answers (and fails) as usual.
+    """
+    if field in ("purl", "dep_purl"):
+        try:
+            lookup = PurlLookup(params["purl"])
+        except (KeyError, ValueError):
+            return None
+        query, accepts = lookup.query(field, params.get("match", "exact")), lookup.accepts
+    elif isinstance(params.get(field), str):
+        query, accepts = {field: params[field]}, lambda _: True
+    else:
+        return None
+    projection = {"_id": 1, field: 1, "record_updated_at": 1}
+    return sorted(
+        [
+            (str(doc["_id"]), doc.get("record_updated_at") or datetime.min)
+            async for doc in model.get_motor_collection().find(query, projection)
+            if accepts(doc.get(field))
+        ]
+    )
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # pymongo returns naive datetimes in UTC
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence and uses the weak comparison
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = _as_utc(parsedate_to_datetime(if_modified_since))
+    except (TypeError, ValueError):
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional(model, field: str = "purl"):
+    """
+    Adds a strong ETag and Last-Modified to the responses of a route reading the `model`
+    documents selected by its `purl` (and `match`) or `url` parameter, and answers
+    If-None-Match / If-Modified-Since with 304 without running the route.
+    The route must take `request: Request` and `response: Response` parameters.
+    """
+
+    def decorator(fn):
+        route = f"{fn.__module__}.{fn.__name__}"
+
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            request: Request = kwargs["request"]
+            versions = await _versions(model, field, kwargs)
+            if not versions:
+                return await fn(*args, **kwargs)
+
+            digest = hashlib.sha1(cache_key(route, kwargs).encode())
+            for _id, updated_at in versions:
+                digest.update(f"{_id}@{updated_at.isoformat()}".encode())
+            etag = f'"{digest.hexdigest()}"'
+            last_modified = _as_utc(max(updated_at for _, updated_at in versions))
+            headers = {
+                "ETag": etag,
+                "Last-Modified": format_datetime(last_modified, usegmt=True),
+                "Cache-Control": CACHE_CONTROL,
+            }
+            if _not_modified(request, etag, last_modified):
+                return Response(status_code=304, headers=headers)
+
+            result = await fn(*args, **kwargs)
+            # a Response returned by the route (e.g. a cache hit) ignores the injected one
+            target = result if isinstance(result, Response) else kwargs["response"]
+            target.headers.update(headers)
+            return result
+
+        return wrapper
+
+    return decorator
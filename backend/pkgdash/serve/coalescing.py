@@ -0,0 +1,104 @@
+"""
+Single-flight coalescing of identical concurrent route calls
+
+When a package page is shared, many clients ask for the same purl within the same
+second. Calls with the same cache key (route and canonicalized parameters, see
+pkgdash.serve.caching.cache_key) that arrive while one is in flight wait for it and
+share its result, its error, and the headers it set on its injected response,
+instead of querying Mongo again. This is per process and also applies when the
+response cache is disabled; streamed responses can't be shared and are recomputed.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+from pkgdash import settings
+
+
+@dataclass
+class FlightCounters:
+    """Calls that ran, and calls that shared the result of one in flight"""
+
+    leaders: int = 0
+    coalesced: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"leaders": self.leaders, "coalesced": self.coalesced}
+
+
+class SingleFlight:
+    """The calls in flight of a process, by key"""
+
+    def __init__(self):
+        self.flights: Dict[str, asyncio.Task] = {}
+        self.counters: Dict[str, FlightCounters] = {}
+
+    def count(self, route: str) -> FlightCounters:
+        return self.counters.setdefault(route, FlightCounters())
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {route: c.to_dict() for route, c in self.counters.items()}
+
+    async def do(self, route: str, key: str, fn: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """
+        (result of fn, whether it was shared): runs fn, or waits for the call with the same key.
+        The call runs in its own task, so a disconnecting client doesn't cancel it for the others.
+        """
+        task = self.flights.get(key)
+        if task is not None:
+            self.count(route).coalesced += 1
+            return await asyncio.shield(task), True
+
+        self.count(route).leaders += 1
+        task = asyncio.ensure_future(fn())
+        self.flights[key] = task
+        task.add_done_callback(lambda t: self._landed(key, t))
+        return await asyncio.shield(task), False
+
+    def _landed(self, key: str, task: asyncio.Task) -> None:
+        if self.flights.get(key) is task:
+            del self.flights[key]
+        if not task.cancelled():
+            # marks the error as retrieved if every waiter went away
+            task.exception()
+
+
+@lru_cache(maxsize=1)
+def get_single_flight() -> Optional[SingleFlight]:
+    """The calls in flight of this process, None if coalescing.enabled is off"""
+    if not settings.get("coalescing.enabled", True):
+        return None
+    return SingleFlight()
+
+
+def _injected_headers(kwargs: Dict[str, Any]) -> Dict[str, str]:
+    for param in kwargs.values():
+        if isinstance(param, Response):
+            return {k: v for k, v in param.headers.items() if k != "content-length"}
+    return {}
+
+
+async def coalesce(route: str, key: str, fn: Callable[..., Awaitable], *args, **kwargs) -> Any:
+    """fn(*args, **kwargs), or the result of the identical call (same key) in flight"""
+    flights = get_single_flight()
+    if flights is None:
+        return await fn(*args, **kwargs)
+
+    async def call():
+        result = await fn(*args, **kwargs)
+        return result, _injected_headers(kwargs)
+
+    (result, headers), shared = await flights.do(route, key, call)
+    if not shared:
+        return result
+    if isinstance(result, StreamingResponse):
+        return await fn(*args, **kwargs)
+    for param in kwargs.values():
+        if isinstance(param, Response):
+            param.headers.update(headers)
+    return result
@@ -0,0 +1,294 @@
+"""
+Pagination helpers for queries fastapi_pagination's beanie integration can't express
+
+Besides page numbers (Params / Page), lists can be paginated with opaque cursors
+(CursorParams / CursorPage). Cursor pages are keyed on a unique indexed field
+(e.g. purl), so fetching any page is one index range scan, whatever its depth,
+and no total is counted.
+
+Page-number routes take total=exact|estimated|none, see count_total.
+
+All helpers take an optional Mongo projection; with one, the page is built from
+raw documents and returned as a FastJSONResponse, skipping pydantic entirely.
+"""
+
+import asyncio
+import hashlib
+import json
+from contextlib import contextmanager
+from math import ceil
+from typing import Any, Callable, Dict, Generic, Literal, Optional, Sequence, Tuple, Type, TypeVar
+
+import pymongo
+from beanie import Document
+from fastapi import HTTPException
+from fastapi_pagination import Page, Params, create_page
+from fastapi_pagination.cursor import CursorPage, CursorParams, encode_cursor
+from pymongo.errors import ExecutionTimeout, OperationFailure
+
+from pkgdash import logger, settings
+from pkgdash.cache import CacheEntry, get_cache
+from pkgdash.serve.responses import FastJSONResponse
+
+T = TypeVar("T")
+
+SEARCH_MODE = Literal["text", "regex"]
+
+TOTAL_MODE = Literal["exact", "estimated", "none"]
+
+TOTAL_KIND = Literal["exact", "estimated", "lower_bound"]
+
+REGEX_MAX_TIME_MS: int = settings.get("search.regex_max_time_ms", 2000)
+
+# total=estimated stops counting filtered queries here
+COUNT_LIMIT: int = settings.get("pagination.count_limit", 10000)
+
+
+class CountedPage(Page[T], Generic[T]):
+    """A Page whose total may be estimated, or only a lower bound ("10,000+")"""
+
+    """How total was computed (None if it wasn't)"""
+    total_kind: Optional[TOTAL_KIND] = None
+
+
+@contextmanager
+def _regex_errors():
+    try:
+        yield
+    except ExecutionTimeout:
+        raise HTTPException(status_code=503, detail="Search took too long, try a more specific pattern")
+    except OperationFailure as e:
+        # invalid regex
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _fetch(
+    model: Type[Document],
+    query: Dict[str, Any],
+    projection: Optional[Dict[str, int]],
+    sort: Optional[Tuple[str, int]] = None,
+    skip: int = 0,
+    limit: int = 0,
+    max_time_ms: Optional[int] = None,
+) -> list:
+    """Documents as models, or as raw dicts if a projection is given"""
+    if projection is None:
+        find = model.find_many(query, max_time_ms=max_time_ms)
+        if sort:
+            find = find.sort(sort)
+        return await find.skip(skip).limit(limit or None).to_list()
+    cursor = model.get_motor_collection().find(
+        query, projection or None, skip=skip, limit=limit, sort=[sort] if sort else None, max_time_ms=max_time_ms
+    )
+    return await cursor.to_list(None)
+
+
+def _value(item: Any, field: str) -> Any:
+    return item[field] if isinstance(item, dict) else getattr(item, field)
+
+
+def _page(items: list, params: Params, raw: bool, total: Optional[int], total_kind: Optional[TOTAL_KIND]):
+    if not raw:
+        return create_page(items, total=total, params=params, total_kind=total_kind)
+    return FastJSONResponse(
+        {
+            "items": items,
+            "total": total,
+            "page": params.page,
+            "size": params.size,
+            "pages": ceil(total / params.size) if total is not None else None,
+            "total_kind": total_kind,
+        }
+    )
+
+
+def _cursor_page(items: list, params: CursorParams, raw: bool, **cursors: Optional[str]):
+    if not raw:
+        return CursorPage.create(items, params, **cursors)
+    encoded = {k: encode_cursor(v, quoted=params.quoted_cursor) for k, v in cursors.items()}
+    return FastJSONResponse(
+        {
+            "items": items,
+            "total": None,
+            "current_page": encoded.get("current"),
+            "current_page_backwards": None,
+            "previous_page": encoded.get("previous"),
+            "next_page": encoded.get("next_"),
+        }
+    )
+
+
+async def _exact_count(model: Type[Document], query: Dict[str, Any], max_time_ms: Optional[int]) -> int:
+    """count_documents, cached in the response cache (if enabled) until the model is invalidated"""
+    cache = get_cache()
+    key = "count:" + hashlib.sha1(json.dumps(query, sort_keys=True, default=str).encode()).hexdigest()
+    namespaces = (model.__name__,)
+    if cache.enabled:
+        try:
+            entry = await cache.get(namespaces, key)
+            if entry is not None:
+                return int(entry.body)
+        except Exception as e:
+            logger.warning("Cache lookup of {} count failed: {}", model.__name__, e)
+    kwargs = {"maxTimeMS": max_time_ms} if max_time_ms else {}
+    total = await model.get_motor_collection().count_documents(query, **kwargs)
+    if cache.enabled:
+        try:
+            await cache.set(namespaces, key, CacheEntry(body=str(total).encode()))
+        except Exception as e:
+            logger.warning("Cache update of {} count failed: {}", model.__name__, e)
+    return total
+
+
+async def count_total(
+    model: Type[Document], query: Dict[str, Any], mode: TOTAL_MODE, max_time_ms: Optional[int] = None
+) -> Tuple[Optional[int], Optional[TOTAL_KIND]]:
+    """
+    (total, kind) of a query
+    - exact: count_documents, cached for repeated filters
+    - estimated: collection metadata for unfiltered queries, otherwise a count stopping at COUNT_LIMIT
+    - none: not counted
+    """
+    if mode == "none":
+        return None, None
+    if mode == "exact":
+        return await _exact_count(model, query, max_time_ms), "exact"
+    collection = model.get_motor_collection()
+    if not query:
+        return await collection.estimated_document_count(), "estimated"
+    kwargs = {"maxTimeMS": max_time_ms} if max_time_ms else {}
+    total = await collection.count_documents(query, limit=COUNT_LIMIT + 1, **kwargs)
+    if total > COUNT_LIMIT:
+        return COUNT_LIMIT, "lower_bound"
+    return total, "exact"
+
+
+async def paginate_find(
+    model: Type[Document],
+    query: Dict[str, Any],
+    params: Params,
+    total: TOTAL_MODE = "exact",
+    max_time_ms: Optional[int] = None,
+    projection: Optional[Dict[str, int]] = None,
+):
+    """
+    Paginates a query by page number, counting its total according to `total`
+    """
+    raw = params.to_raw_params()
+    with _regex_errors():
+        n, kind = await count_total(model, query, total, max_time_ms)
+        items = await _fetch(model, query, projection, skip=raw.offset, limit=raw.limit, max_time_ms=max_time_ms)
+    return _page(items, params, projection is not None, n, kind)
+
+
+async def paginate_regex(
+    model: Type[Document],
+    query: Dict[str, Any],
+    params: Params,
+    total: TOTAL_MODE = "exact",
+    projection: Optional[Dict[str, int]] = None,
+    max_time_ms: int = REGEX_MAX_TIME_MS,
+):
+    """
+    Paginates a (potentially slow) $regex query; both the count and the page are capped by maxTimeMS
+    """
+    return await paginate_find(model, query, params, total, max_time_ms, projection)
+
+
+async def paginate_ranked(
+    model: Type[Document],
+    field: str,
+    rank: Callable[[int], Tuple[Sequence[str], int]],
+    params: Params,
+    projection: Optional[Dict[str, int]] = None,
+):
+    """
+    Paginates ranked keys, fetching only the documents of the requested page
+    :param rank: (the best n keys, total number of keys) for n; run in a thread
+    """
+    raw = params.to_raw_params()
+    keys, total = await asyncio.to_thread(rank, raw.offset + raw.limit)
+    page_keys = list(keys[raw.offset : raw.offset + raw.limit])
+    docs = {_value(d, field): d for d in await _fetch(model, {field: {"$in": page_keys}}, projection)}
+    return _page([docs[k] for k in page_keys if k in docs], params, projection is not None, total, "exact")
+
+
+def _cursor(**position) -> str:
+    return json.dumps(position)
+
+
+def _parse_cursor(cursor: Optional[str]) -> Dict[str, Any]:
+    if not cursor:
+        return {}
+    try:
+        position = json.loads(cursor)
+    except ValueError:
+        position = None
+    if not isinstance(position, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor value")
+    return position
+
+
+async def paginate_keyset(
+    model: Type[Document],
+    query: Dict[str, Any],
+    field: str,
+    params: CursorParams,
+    max_time_ms: Optional[int] = None,
+    projection: Optional[Dict[str, int]] = None,
+):
+    """
+    Cursor pagination of a query, sorted on a unique indexed field
+    The next cursor holds the last key of the page ({"after": key}), the previous one
+    the first key ({"before": key}); a page is then a range scan of size + 1 documents.
+    """
+    raw = params.to_raw_params()
+    position = _parse_cursor(raw.cursor)
+    backwards = "before" in position
+    if "after" in position or backwards:
+        bound = {"$lt": position["before"]} if backwards else {"$gt": position["after"]}
+        query = {"$and": [query, {field: bound}]} if query else {field: bound}
+
+    with _regex_errors():
+        sort = (field, pymongo.DESCENDING if backwards else pymongo.ASCENDING)
+        items = await _fetch(model, query, projection, sort=sort, limit=raw.size + 1, max_time_ms=max_time_ms)
+    more = len(items) > raw.size
+    items = items[: raw.size]
+    if backwards:
+        items.reverse()
+
+    next_, previous = None, None
+    if items:
+        # going backwards, the page we came from follows; going forward, the one we came from precedes
+        if more or backwards:
+            next_ = _cursor(after=_value(items[-1], field))
+        if (more and backwards) or "after" in position:
+            previous = _cursor(before=_value(items[0], field))
+    return _cursor_page(items, params, projection is not None, current=raw.cursor, next_=next_, previous=previous)
+
+
+async def paginate_ranked_cursor(
+    model: Type[Document],
+    field: str,
+    rank: Callable[[int], Tuple[Sequence[str], int]],
+    params: CursorParams,
+    projection: Optional[Dict[str, int]] = None,
+):
+    """
+    Cursor pagination of ranked keys ({"offset": n} cursors), see paginate_ranked
+    """
+    raw = params.to_raw_params()
+    offset = _parse_cursor(raw.cursor).get("offset", 0)
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor value")
+    keys, total = await asyncio.to_thread(rank, offset + raw.size)
+    page_keys = list(keys[offset : offset + raw.size])
+    docs = {_value(d, field): d for d in await _fetch(model, {field: {"$in": page_keys}}, projection)}
+    return _cursor_page(
+        [docs[k] for k in page_keys if k in docs],
+        params,
+        projection is not None,
+        current=raw.cursor,
+        next_=_cursor(offset=offset + raw.size) if offset + raw.size < total else None,
+        previous=_cursor(offset=max(0, offset - raw.size)) if offset > 0 else None,
+    )
@@ -0,0 +1,63 @@
+"""
+JSON responses built straight from raw Mongo documents
+
+List routes read documents through Motor with a projection and serialize them
+without constructing Beanie / pydantic models. orjson is used when installed.
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Type
+
+from beanie import Document
+from bson import ObjectId
+from fastapi import HTTPException, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _default(o: Any) -> Any:
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, datetime):
+        return o.isoformat()
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serializes raw documents (ObjectId and datetime included)"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """Like JSONResponse, for content made of raw documents"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def projection(
+    model: Type[Document],
+    fields: Optional[List[str]] = None,
+    exclude: Iterable[str] = (),
+    required: Iterable[str] = (),
+) -> Dict[str, int]:
+    """
+    Mongo projection of the requested fields of a model, or of all fields but `exclude`
+    :param required: fields always returned (e.g. the sort key of a cursor)
+    :raises HTTPException: 400 on unknown fields
+    """
+    if not fields:
+        return {f: 0 for f in exclude}
+    known = {f.alias for f in model.__fields__.values()}
+    unknown = sorted(set(fields) - known)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return {f: 1 for f in [*fields, *required]}
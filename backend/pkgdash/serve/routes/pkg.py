@@ -1,176 +1,553 @@
+import asyncio
+import dataclasses
+import itertools
 import re
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Literal, Optional, Union
 
 from pkgdash import settings, logger
-from collections import deque
-from typing import List, Set
-
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from pydantic import BaseModel
-from fastapi_pagination import Page, paginate, Params
-from fastapi_pagination.ext.beanie import paginate as paginate_beanie
-from pymongo.errors import OperationFailure
-from packageurl import PackageURL
-from queue import Queue
+from fastapi_pagination import Page, Params
+from fastapi_pagination.cursor import CursorPage, CursorParams
 
 from pkgdash.models import (
     Package,
     PackageStats,
-    Repository,
-    RepositoryStats,
     PackageDependency,
     PackageSource,
     PackageVulns,
+    PackageFacetCount,
+    PackageGraphStats,
+)
+from pkgdash.common import DATE_RANGE
+from pkgdash.models.facets import FACETS, facet_counts
+from pkgdash.models.purl import PurlLookup, MATCH_MODE, batch_query
+from pkgdash.models.rollup import date_range, rollup_stats
+from pkgdash.graph import (
+    Closure,
+    Impact,
+    cached_impact,
+    dependency_closure,
+    dependency_paths,
+    iter_closure_edges,
+    vulnerable_purls,
+)
+from pkgdash.graph.closure import DEFAULT_MAX_DEPTH, DEFAULT_MAX_NODES
+from pkgdash.search import SearchIndex
+from pkgdash.serve.admission import admitted, time_budget_ms
+from pkgdash.serve.caching import cached, conditional
+from pkgdash.serve.pagination import (
+    REGEX_MAX_TIME_MS,
+    SEARCH_MODE,
+    TOTAL_MODE,
+    CountedPage,
+    paginate_find,
+    paginate_keyset,
+    paginate_ranked,
+    paginate_ranked_cursor,
+    paginate_regex,
 )
+from pkgdash.serve.responses import projection
+from pkgdash.serve.streaming import RESPONSE_FORMAT, ndjson_response
 
 
 api = APIRouter()
 
+BATCH_MAX_ITEMS: int = settings.get("batch_max_items", 500)
+
+PATHS_MAX_K: int = settings.get("graph.paths_max_k", 100)
+
+PKG_FACET = Literal["info", "stats", "alerts", "sources"]
+
+COUNT_FACET = Literal["distro", "distro_release", "arch", "type", "license"]
+
+# left out of list / search results unless asked for with fields=
+LIST_EXCLUDED_FIELDS = ("description",)
+
+
+class PackagePaths(BaseModel):
+    """Dependency paths between the purls matching `from` and `to`"""
+
+    sources: List[str]
+    targets: List[str]
+    """Paths (purls, source first), shortest first"""
+    paths: List[List[str]]
+    """Purls reached by the search"""
+    n_nodes: int
+    """Whether max_depth / max_nodes stopped the search before k paths were found"""
+    truncated: bool
+
+
+class ImpactedPackage(BaseModel):
+    purl: str
+    """Number of dependency hops to the nearest affected package"""
+    depth: int
+
+
+class PackageImpact(BaseModel):
+    """Direct and indirect dependents of the affected purls (roots)"""
+
+    roots: List[str]
+    n_dependents: int
+    depth: int
+    """Whether graph.impact_max_nodes cut the closure short"""
+    truncated: bool
+    """Dependents per distro qualifier of their purl (e.g. openeuler-2203sp1)"""
+    by_distro: Dict[str, int]
+    """Dependents per purl type (e.g. rpm, npm)"""
+    by_type: Dict[str, int]
+    dependents: Page[ImpactedPackage]
+
+
+class PackageBatchRequest(BaseModel):
+    purls: List[str]
+    facets: List[PKG_FACET] = ["info"]
+
 
-@api.get("/list", response_model=Page[Package])
-async def list_packages(p: Params = Depends()):
-    """List all packages"""
-    return await paginate_beanie(Package.find_all(), params=p)
+class PackageBatchItem(BaseModel):
+    info: Optional[Package]
+    stats: Optional[List[PackageStats]]
+    alerts: Optional[PackageVulns]
+    sources: Optional[List[PackageSource]]
 
 
-@api.get("/search", response_model=Page[Package])
-async def search_packages(q: str, p: Params = Depends(), distros: List[str] = Query(None)):
-    """Search for packages"""
+class PackageBatchResponse(BaseModel):
+    """Facets per requested purl, and the purls that couldn't be parsed"""
+
+    results: Dict[str, PackageBatchItem] = {}
+    errors: Dict[str, str] = {}
+
+
+def _lookup(purl: str) -> PurlLookup:
     try:
-        if not distros:
-            return await paginate_beanie(Package.find_many({"purl": {"$regex": q}}), params=p)
-        else:
-            return await paginate_beanie(
-                Package.find_many({"purl": {"$regex": q}, "distro": {"$in": distros}}),
-                params=p,
-            )
-    except OperationFailure as e:
-        # invalid regex
-        raise HTTPException(status_code=400, detail=str(e))
+        return PurlLookup(purl)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid purl {purl}: {e}")
+
+
+async def _find_first(model, lookup: PurlLookup, match: MATCH_MODE, field: str = "purl"):
+    """First document whose `field` matches the lookup (including its qualifiers)"""
+    if not lookup.qualifiers:
+        return await model.find_one(lookup.query(field, match))
+    async for doc in model.find_many(lookup.query(field, match)):
+        if lookup.accepts(getattr(doc, field)):
+            return doc
+    return None
+
+
+def _set_closure_headers(response: Response, n_nodes: int, depth: int, truncated: bool) -> None:
+    response.headers["X-Closure-Nodes"] = str(n_nodes)
+    response.headers["X-Closure-Depth"] = str(depth)
+    response.headers["X-Closure-Truncated"] = "true" if truncated else "false"
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+async def _find_all(
+    model,
+    lookup: PurlLookup,
+    match: MATCH_MODE,
+    field: str = "purl",
+    sort=None,
+    extra: Optional[dict] = None,
+    max_time_ms: Optional[int] = None,
+) -> list:
+    """All documents whose `field` matches the lookup (including its qualifiers) and the extra filter"""
+    query = model.find_many({**lookup.query(field, match), **(extra or {})}, max_time_ms=max_time_ms)
+    if sort:
+        query = query.sort(sort)
+    return [doc for doc in await query.to_list() if lookup.accepts(getattr(doc, field))]
+
+
+@api.get("/list", response_model=CountedPage[Package])
+@cached(Package)
+async def list_packages(p: Params = Depends(), total: TOTAL_MODE = "exact", fields: List[str] = Query(None)):
+    """List all packages (without description unless it is in fields)"""
+    return await paginate_find(Package, {}, p, total, projection=projection(Package, fields, LIST_EXCLUDED_FIELDS))
+
+
+@api.get("/list/cursor", response_model=CursorPage[Package])
+@cached(Package)
+async def list_packages_cursor(p: CursorParams = Depends(), fields: List[str] = Query(None)):
+    """List all packages by purl, with next_page / previous_page cursors"""
+    proj = projection(Package, fields, LIST_EXCLUDED_FIELDS, required=["purl"])
+    return await paginate_keyset(Package, {}, "purl", p, projection=proj)
+
+
+def _search_query(request: Request, q: str, distros: Optional[List[str]], mode: SEARCH_MODE):
+    """
+    The Mongo filter of a package search, or the ranking function of the search index if it can answer it
+    """
+    query = {"distro": {"$in": distros}} if distros else {}
+    if mode == "regex":
+        return {"purl": {"$regex": q}, **query}
+    search: Optional[SearchIndex] = request.app.state.package_search
+    if search is None or not search.ready:
+        # an anchored, case-sensitive prefix is a range scan of the name index
+        return {"name": {"$regex": f"^{re.escape(q.strip())}"}, **query}
+    index = search.index
+
+    def rank(n: int):
+        ids, total = index.search(q, distros, limit=n)
+        return [index.keys[i] for i in ids], total
+
+    return rank
+
+
+@api.get("/search", response_model=CountedPage[Package])
+@cached(Package)
+@admitted("search")
+async def search_packages(
+    q: str,
+    request: Request,
+    p: Params = Depends(),
+    distros: List[str] = Query(None),
+    mode: SEARCH_MODE = "text",
+    total: TOTAL_MODE = "exact",
+    fields: List[str] = Query(None),
+):
+    """
+    Search for packages by name (mode=text) or by a regex over purls (mode=regex)
+    Without the search index, mode=text only matches name prefixes
+    """
+    query = _search_query(request, q, distros, mode)
+    proj = projection(Package, fields, LIST_EXCLUDED_FIELDS, required=["purl"])
+    if callable(query):
+        return await paginate_ranked(Package, "purl", query, p, projection=proj)
+    return await paginate_regex(Package, query, p, total, proj, time_budget_ms(request, REGEX_MAX_TIME_MS))
+
+
+@api.get("/search/cursor", response_model=CursorPage[Package])
+@cached(Package)
+@admitted("search")
+async def search_packages_cursor(
+    q: str,
+    request: Request,
+    p: CursorParams = Depends(),
+    distros: List[str] = Query(None),
+    mode: SEARCH_MODE = "text",
+    fields: List[str] = Query(None),
+):
+    """Same as /search, with cursors; results are ranked by the search index, or else sorted by purl"""
+    query = _search_query(request, q, distros, mode)
+    proj = projection(Package, fields, LIST_EXCLUDED_FIELDS, required=["purl"])
+    if callable(query):
+        return await paginate_ranked_cursor(Package, "purl", query, p, projection=proj)
+    budget = time_budget_ms(request, REGEX_MAX_TIME_MS)
+    return await paginate_keyset(Package, query, "purl", p, max_time_ms=budget, projection=proj)
 
 
 @api.get("/info", response_model=Package)
-async def get_package_info(purl: str):
+@conditional(Package)
+@cached(Package)
+async def get_package_info(purl: str, request: Request, response: Response, match: MATCH_MODE = "exact"):
     """Get package info"""
-    purl = purl.replace("%40", "@")
-    purl_obj = PackageURL.from_string(purl)
-    purl = purl_obj.to_string()
-    res = await Package.find_one({"purl": {"$regex": f"^{re.escape(purl)}"}})
+    lookup = _lookup(purl)
+    res = await _find_first(Package, lookup, match)
     if not res:
-        raise HTTPException(status_code=404, detail=f"No information for {purl}")
+        raise HTTPException(status_code=404, detail=f"No information for {lookup.canonical}")
     return res
 
 
 @api.get("/stats", response_model=List[PackageStats])
-async def get_package_stats(purl: str):
-    """Get package stats"""
-    purl = purl.replace("%40", "@")
-    purl_obj = PackageURL.from_string(purl)
-    purl = purl_obj.to_string()
-    res = (
-        await PackageStats.find_many({"purl": {"$regex": f"^{re.escape(purl)}"}})
-        .sort("stats_from")
-        .to_list()
-    )
+@conditional(PackageStats)
+@cached(PackageStats)
+async def get_package_stats(
+    purl: str,
+    request: Request,
+    response: Response,
+    match: MATCH_MODE = "exact",
+    from_: Union[datetime, date, None] = Query(None, alias="from"),
+    to: Union[datetime, date, None] = None,
+    interval: Optional[DATE_RANGE] = None,
+):
+    """Get package stats between from and to, rolled up per interval if given"""
+    lookup = _lookup(purl)
+    if interval is None:
+        res = await _find_all(PackageStats, lookup, match, sort="stats_from", extra=date_range(from_, to))
+    else:
+        query = {**lookup.query("purl", match), **date_range(from_, to)}
+        res = [doc for doc in await rollup_stats(PackageStats, "purl", query, interval) if lookup.accepts(doc.purl)]
     if not res:
-        raise HTTPException(status_code=404, detail=f"No statistics for {purl}")
+        raise HTTPException(status_code=404, detail=f"No statistics for {lookup.canonical}")
     return res
 
 
 @api.get("/deps", response_model=List[PackageDependency])
-async def get_package_deps(purl: str):
+@cached(PackageDependency)
+async def get_package_deps(purl: str, match: MATCH_MODE = "exact"):
     """Get package dependencies"""
-    purl = purl.replace("%40", "@")
-    purl_obj = PackageURL.from_string(purl)
-    purl = purl_obj.to_string()
-    res = await PackageDependency.find_many({"purl": {"$regex": f"^{re.escape(purl)}"}}).to_list()
+    lookup = _lookup(purl)
+    res = await _find_all(PackageDependency, lookup, match)
     if not res:
-        raise HTTPException(status_code=404, detail=f"No dependencies for {purl}")
+        raise HTTPException(status_code=404, detail=f"No dependencies for {lookup.canonical}")
     return res
 
 
 @api.get("/tdeps", response_model=List[PackageDependency])
-async def get_package_tdeps(purl: str):
-    """Get package dependencies"""
-    purl = purl.replace("%40", "@")
-    purl_obj = PackageURL.from_string(purl)
-    canonical_purl = purl_obj.to_string()
-    all_dependencies: dict[tuple[str, str], Set[PackageDependency]] = {}
-    processed_purls: Set[str] = set()  # 记录已处理过的 PURL，防止无限循环
-    dep_queue: deque[PackageDependency] = deque()  # 使用 deque
-    try:
-        initial_deps = await get_package_deps(canonical_purl)
-        processed_purls.add(canonical_purl)
-        for dep in initial_deps:
-            dep_queue.append(dep)
-            rel_key = (dep.purl, dep.dep_purl)
-            if rel_key not in all_dependencies:
-                all_dependencies[rel_key] = dep
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Failed to fetch initial dependencies for {canonical_purl}"
+@cached(PackageDependency)
+@admitted("tdeps")
+async def get_package_tdeps(
+    purl: str,
+    request: Request,
+    response: Response,
+    match: MATCH_MODE = "exact",
+    max_depth: int = Query(DEFAULT_MAX_DEPTH, ge=1),
+    max_nodes: int = Query(DEFAULT_MAX_NODES, ge=1),
+    format: RESPONSE_FORMAT = "json",
+):
+    """
+    Get transitive package dependencies
+    With format=ndjson the edges are streamed level by level, without the X-Closure-* headers
+    """
+    lookup = _lookup(purl)
+    roots = [r for r in await PackageDependency.distinct("purl", lookup.query("purl", match)) if lookup.accepts(r)]
+    if not roots:
+        raise HTTPException(status_code=404, detail=f"No dependencies for {lookup.canonical}")
+    closures = request.app.state.closures
+    materialized = await closures.get(roots[0], max_depth, max_nodes) if closures and len(roots) == 1 else None
+    if materialized is not None:
+        if format == "ndjson":
+            return await ndjson_response(_aiter(materialized.edges))
+        doc = materialized.doc
+        _set_closure_headers(response, doc.n_nodes, doc.depth, doc.truncated)
+        return [PackageDependency.parse_obj(edge) for edge in materialized.edges]
+    if format == "ndjson":
+        edges = iter_closure_edges(
+            Closure(roots=roots),
+            max_depth=max_depth,
+            max_nodes=max_nodes,
+            index=request.app.state.graph_index,
+            max_time_ms=time_budget_ms(request),
         )
-    print(dep_queue)
-    while dep_queue:  # 使用 deque 的布尔值判断是否为空
-        current_dep: PackageDependency = dep_queue.popleft()  # 从左侧取出 (FIFO)
-        try:
-            # 获取当前依赖的直接依赖
-            if current_dep.dep_purl in processed_purls:
-                continue
-            deps_of_current = await get_package_deps(current_dep.dep_purl)
-            processed_purls.add(current_dep.dep_purl)
-            for next_dep in deps_of_current:
-                rel_key = (next_dep.purl, next_dep.dep_purl)
-                if rel_key not in all_dependencies:
-                    all_dependencies[rel_key] = next_dep
-                dep_queue.append(next_dep)  # 加入队列等待处理
-        except Exception as e:
-            continue
-    result_list = list(all_dependencies.values())
-    return result_list
+        return await ndjson_response(edges)
+    closure = await dependency_closure(
+        roots,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        index=request.app.state.graph_index,
+        max_time_ms=time_budget_ms(request),
+    )
+    _set_closure_headers(response, len(closure.nodes), closure.depth, closure.truncated)
+    return closure.edges
+
+
+@api.get("/tdeps/stats", response_model=PackageGraphStats)
+@conditional(PackageGraphStats)
+@cached(PackageGraphStats)
+async def get_package_tdeps_stats(purl: str, request: Request, response: Response, match: MATCH_MODE = "exact"):
+    """Get the precomputed number of transitive dependencies, depth and dependency cycle of a package"""
+    lookup = _lookup(purl)
+    res = await _find_first(PackageGraphStats, lookup, match)
+    if not res:
+        raise HTTPException(status_code=404, detail=f"No graph stats for {lookup.canonical}")
+    return res
 
 
 @api.get("/rdeps", response_model=List[PackageDependency])
-async def get_package_rdeps(purl: str):
-    """Get package dependents"""
-    purl = purl.replace("%40", "@")
-    purl_obj = PackageURL.from_string(purl)
-    purl = purl_obj.to_string()
-    res = await PackageDependency.find_many(
-        {"dep_purl": {"$regex": f"^{re.escape(purl)}"}}
-    ).to_list()
+@cached(PackageDependency)
+@admitted("rdeps")
+async def get_package_rdeps(
+    purl: str, request: Request, match: MATCH_MODE = "exact", format: RESPONSE_FORMAT = "json"
+):
+    """Get package dependents; format=ndjson streams them straight from the cursor"""
+    lookup = _lookup(purl)
+    budget = time_budget_ms(request)
+    if format == "ndjson":
+        cursor = PackageDependency.get_motor_collection().find(lookup.query("dep_purl", match), max_time_ms=budget)
+        res = await ndjson_response(doc async for doc in cursor if lookup.accepts(doc["dep_purl"]))
+        if res is None:
+            raise HTTPException(status_code=404, detail=f"No dependents {lookup.canonical}")
+        return res
+    res = await _find_all(PackageDependency, lookup, match, field="dep_purl", max_time_ms=budget)
     if not res:
-        raise HTTPException(status_code=404, detail=f"No dependents {purl}")
+        raise HTTPException(status_code=404, detail=f"No dependents {lookup.canonical}")
     return res
 
 
+@api.get("/paths", response_model=PackagePaths)
+@cached(PackageDependency)
+@admitted("paths")
+async def get_package_paths(
+    request: Request,
+    from_: str = Query(..., alias="from"),
+    to: str = Query(...),
+    k: int = Query(5, ge=1, le=PATHS_MAX_K),
+    match: MATCH_MODE = "exact",
+    max_depth: int = Query(DEFAULT_MAX_DEPTH, ge=1),
+    max_nodes: int = Query(DEFAULT_MAX_NODES, ge=1),
+):
+    """Get the k shortest dependency paths from one package to another ("why does from depend on to")"""
+    source, target = _lookup(from_), _lookup(to)
+    sources, targets = await asyncio.gather(
+        PackageDependency.distinct("purl", source.query("purl", match)),
+        PackageDependency.distinct("dep_purl", target.query("dep_purl", match)),
+    )
+    sources = [p for p in sources if source.accepts(p)]
+    targets = [p for p in targets if target.accepts(p)]
+    if not sources:
+        raise HTTPException(status_code=404, detail=f"No dependencies for {source.canonical}")
+    if not targets:
+        raise HTTPException(status_code=404, detail=f"No dependents {target.canonical}")
+    res = await dependency_paths(
+        sources,
+        targets,
+        k=k,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        index=request.app.state.graph_index,
+        max_time_ms=time_budget_ms(request),
+    )
+    return PackagePaths(**dataclasses.asdict(res))
+
+
+def _impact_response(impact: Impact, p: Params) -> PackageImpact:
+    raw = p.to_raw_params()
+    members = itertools.islice(impact.dependents.items(), raw.offset, raw.offset + raw.limit)
+    page = [ImpactedPackage(purl=purl, depth=depth) for purl, depth in members]
+    n = len(impact.dependents)
+    return PackageImpact(
+        roots=impact.roots,
+        n_dependents=n,
+        depth=impact.depth,
+        truncated=impact.truncated,
+        by_distro=impact.by_distro,
+        by_type=impact.by_type,
+        dependents=Page[ImpactedPackage].create(page, p, total=n),
+    )
+
+
+@api.get("/impact", response_model=PackageImpact)
+@cached(PackageDependency)
+@admitted("impact")
+async def get_package_impact(purl: str, request: Request, p: Params = Depends(), match: MATCH_MODE = "exact"):
+    """
+    Get all direct and indirect dependents of a package, counted per distro and purl type,
+    with a page of them (nearest first)
+    """
+    lookup = _lookup(purl)
+    roots = await PackageDependency.distinct("dep_purl", lookup.query("dep_purl", match))
+    roots = [r for r in roots if lookup.accepts(r)]
+    if not roots:
+        raise HTTPException(status_code=404, detail=f"No dependents {lookup.canonical}")
+    impact = await cached_impact(roots, index=request.app.state.graph_index, max_time_ms=time_budget_ms(request))
+    return _impact_response(impact, p)
+
+
+@api.get("/impact/cve", response_model=PackageImpact)
+@cached(PackageDependency, PackageVulns)
+@admitted("impact")
+async def get_cve_impact(cve: str, request: Request, p: Params = Depends()):
+    """Same as /impact for all packages whose alerts list the CVE (or other vulnerability id), together"""
+    roots = await vulnerable_purls(cve)
+    if not roots:
+        raise HTTPException(status_code=404, detail=f"No packages affected by {cve}")
+    impact = await cached_impact(roots, index=request.app.state.graph_index, max_time_ms=time_budget_ms(request))
+    return _impact_response(impact, p)
+
+
 @api.get("/sources", response_model=List[PackageSource])
-async def get_package_sources(purl: str):
+@cached(PackageSource)
+async def get_package_sources(purl: str, match: MATCH_MODE = "exact"):
     """Get package repository"""
-    purl = purl.replace("%40", "@")
-    purl_obj = PackageURL.from_string(purl)
-    purl = purl_obj.to_string()
-    res = await PackageSource.find_many({"purl": {"$regex": f"^{re.escape(purl)}"}}).to_list()
+    lookup = _lookup(purl)
+    res = await _find_all(PackageSource, lookup, match)
     # distinct on repo_url
     res = list({v.repo_url: v for v in res}.values())
     if not res:
-        raise HTTPException(status_code=404, detail=f"No associated repositories for {purl}")
+        raise HTTPException(status_code=404, detail=f"No associated repositories for {lookup.canonical}")
     return res
 
 
 @api.get("/distros", response_model=List[str])
+@cached(Package, PackageFacetCount)
 async def get_package_distros():
     """Get package distros"""
+    distros = (await facet_counts(["distro"]))["distro"]
+    if distros:
+        return list(distros)
+    # facets not counted yet
     return [d for d in await Package.distinct("distro") if d is not None]
 
 
+@api.get("/facets", response_model=Dict[str, Dict[str, int]])
+@cached(PackageFacetCount)
+async def get_package_facets(facets: List[COUNT_FACET] = Query(None)):
+    """Get the number of packages per distro, distro_release, arch, type and license"""
+    return await facet_counts(list(dict.fromkeys(facets)) if facets else FACETS)
+
+
 @api.get("/alerts", response_model=PackageVulns)
-async def get_package_alert(purl: str):
+@conditional(PackageVulns)
+@cached(PackageVulns)
+async def get_package_alert(purl: str, request: Request, response: Response, match: MATCH_MODE = "exact"):
     """Get package alerts"""
-    purl = purl.replace("%40", "@")
-    purl_obj = PackageURL.from_string(purl)
-    purl = purl_obj.to_string()
-    print(purl)
-    res = await PackageVulns.find_one({"purl": {"$regex": f"^{re.escape(purl)}"}})
+    lookup = _lookup(purl)
+    res = await _find_first(PackageVulns, lookup, match)
     if not res:
-        raise HTTPException(status_code=404, detail=f"No associated alerts for {purl}")
+        raise HTTPException(status_code=404, detail=f"No associated alerts for {lookup.canonical}")
+    return res
+
+
+async def _batch_facet(model, lookups: Dict[str, PurlLookup], sort=None) -> Dict[str, list]:
+    """Fetches one facet of all lookups with a single query, grouped by requested purl"""
+    query = model.find_many(batch_query(lookups.values()))
+    if sort:
+        query = query.sort(sort)
+    by_key, by_base = defaultdict(list), defaultdict(list)
+    for doc in await query.to_list():
+        by_key[doc.purl_key].append(doc)
+        by_base[doc.purl_base].append(doc)
+    return {
+        purl: [
+            d
+            for d in (by_key[lookup.key] if lookup.purl.version else by_base[lookup.base])
+            if lookup.accepts(d.purl)
+        ]
+        for purl, lookup in lookups.items()
+    }
+
+
+@api.post("/batch", response_model=PackageBatchResponse)
+@cached(Package, PackageStats, PackageVulns, PackageSource)
+async def get_packages_batch(req: PackageBatchRequest):
+    """Get several facets of several packages at once"""
+    purls = list(dict.fromkeys(req.purls))
+    if len(purls) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} purls per batch")
+    res = PackageBatchResponse()
+    lookups: Dict[str, PurlLookup] = {}
+    for purl in purls:
+        try:
+            lookups[purl] = PurlLookup(purl)
+        except ValueError as e:
+            res.errors[purl] = str(e)
+    if not lookups:
+        return res
+
+    facets = list(dict.fromkeys(req.facets))
+    fetchers = {
+        "info": lambda: _batch_facet(Package, lookups),
+        "stats": lambda: _batch_facet(PackageStats, lookups, sort="stats_from"),
+        "alerts": lambda: _batch_facet(PackageVulns, lookups),
+        "sources": lambda: _batch_facet(PackageSource, lookups),
+    }
+    fetched = dict(zip(facets, await asyncio.gather(*(fetchers[f]() for f in facets))))
+
+    for purl in lookups:
+        item = res.results[purl] = PackageBatchItem()
+        if "info" in fetched:
+            item.info = next(iter(fetched["info"][purl]), None)
+        if "stats" in fetched:
+            item.stats = fetched["stats"][purl]
+        if "alerts" in fetched:
+            item.alerts = next(iter(fetched["alerts"][purl]), None)
+        if "sources" in fetched:
+            # distinct on repo_url
+            item.sources = list({v.repo_url: v for v in fetched["sources"][purl]}.values())
     return res
@@ -1,28 +1,98 @@
-from typing import List
+import asyncio
+import re
+from datetime import date, datetime
+from typing import Dict, List, Literal, Optional, Union
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from pydantic import BaseModel
 from pkgdash import settings, logger
 
 from fastapi_pagination import Page, paginate, Params
-from fastapi_pagination.ext.beanie import paginate as paginate_beanie
+from fastapi_pagination.cursor import CursorPage, CursorParams
 
+from pkgdash.common import DATE_RANGE
 from pkgdash.models import Package, PackageStats, Repository, RepositoryStats, PackageDependency, PackageSource
+from pkgdash.models.rollup import date_range, rollup_stats
+from pkgdash.search import SearchIndex
+from pkgdash.serve.admission import admitted, time_budget_ms
+from pkgdash.serve.caching import cached, conditional
+from pkgdash.serve.responses import projection
+from pkgdash.serve.pagination import (
+    REGEX_MAX_TIME_MS,
+    SEARCH_MODE,
+    TOTAL_MODE,
+    CountedPage,
+    paginate_find,
+    paginate_keyset,
+    paginate_ranked,
+    paginate_regex,
+)
 
 api = APIRouter()
 
-@api.get("/list", response_model=Page[Repository])
-async def list_repositories(p: Params = Depends()):
+BATCH_MAX_ITEMS: int = settings.get("batch_max_items", 500)
+
+REPO_FACET = Literal["info", "stats", "packages"]
+
+
+class RepositoryBatchRequest(BaseModel):
+    urls: List[str]
+    facets: List[REPO_FACET] = ["info"]
+
+
+class RepositoryBatchItem(BaseModel):
+    info: Optional[Repository]
+    stats: Optional[List[RepositoryStats]]
+    packages: Optional[List[PackageSource]]
+
+@api.get("/list", response_model=CountedPage[Repository])
+@cached(Repository)
+async def list_repositories(p: Params = Depends(), total: TOTAL_MODE = "exact", fields: List[str] = Query(None)):
     """List all prepositories"""
-    return await paginate_beanie(Repository.find_all(), params=p)
+    return await paginate_find(Repository, {}, p, total, projection=projection(Repository, fields))
+
+@api.get("/list/cursor", response_model=CursorPage[Repository])
+@cached(Repository)
+async def list_repositories_cursor(p: CursorParams = Depends(), fields: List[str] = Query(None)):
+    """List all repositories by url, with next_page / previous_page cursors"""
+    return await paginate_keyset(Repository, {}, "url", p, projection=projection(Repository, fields, required=["url"]))
 
-@api.get("/search", response_model=Page[Repository])
-async def search_repositories(q: str, p: Params = Depends()):
-    """Search for repositories"""
-    return await paginate_beanie(Repository.find_many({"name": {"$regex": q}}), params=p)
+@api.get("/search", response_model=CountedPage[Repository])
+@cached(Repository)
+@admitted("search")
+async def search_repositories(
+    q: str,
+    request: Request,
+    p: Params = Depends(),
+    mode: SEARCH_MODE = "text",
+    total: TOTAL_MODE = "exact",
+    fields: List[str] = Query(None),
+):
+    """
+    Search for repositories by name (mode=text) or by a regex over names (mode=regex)
+    Without the search index, mode=text only matches name prefixes
+    """
+    proj = projection(Repository, fields, required=["url"])
+    budget = time_budget_ms(request, REGEX_MAX_TIME_MS)
+    if mode == "regex":
+        return await paginate_regex(Repository, {"name": {"$regex": q}}, p, total, proj, budget)
+    search: Optional[SearchIndex] = request.app.state.repository_search
+    if search is None or not search.ready:
+        # an anchored, case-sensitive prefix is a range scan of the name index
+        query = {"name": {"$regex": f"^{re.escape(q.strip())}"}}
+        return await paginate_regex(Repository, query, p, total, proj, budget)
+    index = search.index
+
+    def rank(n: int):
+        ids, n_matches = index.search(q, limit=n)
+        return [index.keys[i] for i in ids], n_matches
+
+    return await paginate_ranked(Repository, "url", rank, p, proj)
 
 @api.get("/info", response_model=Repository)
-async def get_repository_info(url: str):
+@conditional(Repository, field="url")
+@cached(Repository)
+async def get_repository_info(url: str, request: Request, response: Response):
     """Get repository info"""
     res = await Repository.find_one({"url": url})
     if not res:
@@ -30,14 +100,28 @@ async def get_repository_info(url: str):
     return res
 
 @api.get("/stats", response_model=List[RepositoryStats])
-async def get_repository_stats(url: str):
-    """Get repository stats"""
-    res = await RepositoryStats.find_many({"url": url}).sort("stats_from").to_list()
+@conditional(RepositoryStats, field="url")
+@cached(RepositoryStats)
+async def get_repository_stats(
+    url: str,
+    request: Request,
+    response: Response,
+    from_: Union[datetime, date, None] = Query(None, alias="from"),
+    to: Union[datetime, date, None] = None,
+    interval: Optional[DATE_RANGE] = None,
+):
+    """Get repository stats between from and to, rolled up per interval if given"""
+    query = {"url": url, **date_range(from_, to)}
+    if interval is None:
+        res = await RepositoryStats.find_many(query).sort("stats_from").to_list()
+    else:
+        res = await rollup_stats(RepositoryStats, "url", query, interval)
     if not res:
         raise HTTPException(status_code=404, detail=f"No statistics for {url}")
     return res
 
 @api.get("/packages", response_model=List[PackageSource])
+@cached(PackageSource)
 async def get_repository_packages(url: str):
     """Get repository packages"""
     res = await PackageSource.find_many({"repo_url": url}).to_list()
@@ -48,11 +132,53 @@ async def get_repository_packages(url: str):
     return res
 
 @api.get("/rec", response_model=List[Package])
+@cached(Repository, Package)
 async def get_similar_packages(url: str):
+    """Get packages of similar repositories"""
     repo = await Repository.find_one({"url": url})
-    res:List[Package] = []
-    for repo_url in repo.similar_repos:
-        pkg = await Package.find_one({"repo_url": repo_url})
-        if pkg:
-            res += [pkg]
-    return res
\ No newline at end of file
+    if not repo:
+        raise HTTPException(status_code=404, detail=f"No information for {url}")
+    if repo.recommended_purls is not None:
+        pkgs = {p.purl: p for p in await Package.find_many({"purl": {"$in": repo.recommended_purls}}).to_list()}
+        return [pkgs[purl] for purl in repo.recommended_purls if purl in pkgs]
+    # not materialized yet, see pkgdash.analyze.github.similar.update_recommended_purls
+    pkgs: Dict[str, Package] = {}
+    if repo.similar_repos:
+        async for pkg in Package.find_many({"repo_url": {"$in": repo.similar_repos}}).sort("_id"):
+            pkgs.setdefault(pkg.repo_url, pkg)
+    return [pkgs[u] for u in repo.similar_repos if u in pkgs]
+
+@api.post("/batch", response_model=Dict[str, RepositoryBatchItem])
+@cached(Repository, RepositoryStats, PackageSource)
+async def get_repositories_batch(req: RepositoryBatchRequest):
+    """Get several facets of several repositories at once"""
+    urls = list(dict.fromkeys(u.strip() for u in req.urls))
+    if len(urls) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} urls per batch")
+    if not urls:
+        return {}
+
+    facets = list(dict.fromkeys(req.facets))
+    fetchers = {
+        "info": lambda: Repository.find_many({"url": {"$in": urls}}).to_list(),
+        "stats": lambda: RepositoryStats.find_many({"url": {"$in": urls}}).sort("stats_from").to_list(),
+        "packages": lambda: PackageSource.find_many({"repo_url": {"$in": urls}}).to_list(),
+    }
+    fetched = dict(zip(facets, await asyncio.gather(*(fetchers[f]() for f in facets))))
+
+    res = {url: RepositoryBatchItem() for url in urls}
+    for repo in fetched.get("info", []):
+        res[repo.url].info = repo
+    if "stats" in fetched:
+        for url in urls:
+            res[url].stats = []
+        for stats in fetched["stats"]:
+            res[stats.url].stats.append(stats)
+    if "packages" in fetched:
+        packages: Dict[str, Dict[str, PackageSource]] = {url: {} for url in urls}
+        for source in fetched["packages"]:
+            # distinct on purl
+            packages[source.repo_url][source.purl] = source
+        for url, sources in packages.items():
+            res[url].packages = list(sources.values())
+    return res
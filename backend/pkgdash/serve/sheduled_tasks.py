@@ -0,0 +1,22 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from pkgdash import logger
+
+
+def run_periodically(name: str, fn: Callable[[], Awaitable], interval: float) -> asyncio.Task:
+    """
+    Runs fn now and then every `interval` seconds in the background; errors are logged, not raised
+    """
+
+    async def _loop():
+        while True:
+            try:
+                await fn()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Scheduled task {} failed: {}", name, e)
+            await asyncio.sleep(interval)
+
+    return asyncio.create_task(_loop(), name=name)
@@ -0,0 +1,47 @@
+"""
+Streaming responses for result lists too large to build in memory
+"""
+
+from typing import Any, AsyncIterator, Dict, Literal, Optional
+
+from fastapi.responses import StreamingResponse
+
+from pkgdash.serve.responses import dumps
+
+RESPONSE_FORMAT = Literal["json", "ndjson"]
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# flush the response body every ~64KB
+NDJSON_CHUNK_SIZE = 1 << 16
+
+
+def _line(doc: Dict[str, Any]) -> bytes:
+    return dumps(doc) + b"\n"
+
+
+async def ndjson_response(
+    docs: AsyncIterator[Dict[str, Any]], headers: Optional[Dict[str, str]] = None
+) -> Optional[StreamingResponse]:
+    """
+    Streams raw documents as newline delimited JSON, one document per line
+    :returns: the response, or None if there are no documents (e.g. to answer 404 instead)
+    """
+    first = await anext(docs, None)
+    if first is None:
+        return None
+
+    async def body():
+        chunk = [_line(first)]
+        size = len(chunk[0])
+        async for doc in docs:
+            line = _line(doc)
+            chunk.append(line)
+            size += len(line)
+            if size >= NDJSON_CHUNK_SIZE:
+                yield b"".join(chunk)
+                chunk, size = [], 0
+        if chunk:
+            yield b"".join(chunk)
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
@@ -0,0 +1,219 @@
+"""
+Slow query log
+
+Enabled by slowlog.enabled in settings.toml. A PyMongo CommandListener registered by
+create_engine records every command slower than slowlog.threshold_ms with the shape of
+its filter (values replaced by "?"), and re-runs slow reads once with
+explain("executionStats") to record the winning plan and the keys / documents examined.
+Collection scans are logged as warnings.
+
+Entries are kept in a bounded in-memory buffer per process (see /api/debug/slow-queries, served with slowlog.expose).
+"""
+
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from pkgdash import logger, settings
+
+# commands that read only and can be explained
+EXPLAINABLE = {"find", "aggregate", "count", "distinct"}
+# parts of the command describing the query; the rest (limits, cursor options...) isn't part of the shape
+_SHAPE_KEYS = ("filter", "query", "pipeline", "sort", "projection", "key")
+# session / transport fields the server rejects inside an explain
+_TRANSPORT_KEYS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+
+def query_shape(value: Any) -> Any:
+    """The value with all literals replaced by "?", keeping field names and operators"""
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $in / $nin lists collapse to a single placeholder, pipelines keep their stages
+        if value and all(isinstance(v, dict) for v in value):
+            return [query_shape(v) for v in value]
+        return "?"
+    return "?"
+
+
+@dataclass
+class QueryPlan:
+    """Summary of explain("executionStats")"""
+
+    """Stages of the winning plan, outermost first, e.g. ["FETCH", "IXSCAN purl_1"]"""
+    stages: List[str]
+    collscan: bool
+    n_returned: Optional[int] = None
+    keys_examined: Optional[int] = None
+    docs_examined: Optional[int] = None
+    execution_time_ms: Optional[int] = None
+
+
+@dataclass
+class SlowQuery:
+    collection: str
+    command: str
+    database: str
+    duration_ms: float
+    shape: Dict[str, Any]
+    at: datetime = field(default_factory=datetime.utcnow)
+    """None until explained (and for commands that aren't explained)"""
+    plan: Optional[QueryPlan] = None
+
+    @property
+    def shape_key(self) -> str:
+        raw = json.dumps([self.database, self.collection, self.command, self.shape], sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "shape_key": self.shape_key}
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = []
+    while plan:
+        name = plan.get("stage", "?")
+        stages.append(f"{name} {plan['indexName']}" if "indexName" in plan else name)
+        inputs = plan.get("inputStages") or [plan.get("inputStage")]
+        # OR / SORT_MERGE plans have several inputs, follow the first one
+        plan = inputs[0] or {}
+    return stages
+
+
+def summarize_explain(explain: Dict[str, Any]) -> QueryPlan:
+    """QueryPlan of the output of an explain command (find, count, distinct or aggregate)"""
+    if "stages" in explain:
+        # aggregate whose pipeline wasn't pushed down entirely: the query is in the first $cursor stage
+        explain = explain["stages"][0].get("$cursor", {})
+    planner = explain.get("queryPlanner", {})
+    winning = planner.get("winningPlan", {})
+    # slot based engine wraps the plan in queryPlan
+    stages = _plan_stages(winning.get("queryPlan", winning))
+    stats = explain.get("executionStats", {})
+    return QueryPlan(
+        stages=stages,
+        collscan=any(s.startswith("COLLSCAN") for s in stages),
+        n_returned=stats.get("nReturned"),
+        keys_examined=stats.get("totalKeysExamined"),
+        docs_examined=stats.get("totalDocsExamined"),
+        execution_time_ms=stats.get("executionTimeMillis"),
+    )
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """
+    Records slow commands; explains are run on the event loop of create_engine
+    (PyMongo calls listeners from Motor's worker threads)
+    """
+
+    def __init__(self, threshold_ms: float = 100, max_entries: int = 500, explain: bool = True):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.entries: Deque[SlowQuery] = deque(maxlen=max_entries)
+        # one explain per query shape
+        self.plans: "OrderedDict[str, Optional[QueryPlan]]" = OrderedDict()
+        self.max_plans = max_entries
+        self.commands: Dict[Tuple, Tuple[str, Dict[str, Any]]] = {}
+        self.client = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, client, loop: asyncio.AbstractEventLoop) -> None:
+        """Client and event loop used to run explains"""
+        self.client = client
+        self.loop = loop
+
+    @staticmethod
+    def _key(event) -> Tuple:
+        return event.connection_id, event.request_id, event.operation_id
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name == "explain":
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.command.get("collection", "")
+        self.commands[self._key(event)] = (collection, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finished(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finished(event)
+
+    def _finished(self, event) -> None:
+        found = self.commands.pop(self._key(event), None)
+        duration_ms = event.duration_micros / 1000
+        if found is None or duration_ms < self.threshold_ms:
+            return
+        collection, command = found
+        entry = SlowQuery(
+            collection=collection,
+            command=event.command_name,
+            database=event.database_name,
+            duration_ms=duration_ms,
+            shape={k: query_shape(command[k]) for k in _SHAPE_KEYS if k in command},
+        )
+        self.entries.append(entry)
+        logger.warning("Slow {} on {} ({:.0f} ms): {}", entry.command, collection, duration_ms, entry.shape)
+
+        key = entry.shape_key
+        if key in self.plans:
+            entry.plan = self.plans[key]
+            self.plans.move_to_end(key)
+        elif self.explain and entry.command in EXPLAINABLE and self.client is not None:
+            self.plans[key] = None
+            while len(self.plans) > self.max_plans:
+                self.plans.popitem(last=False)
+            self.loop.call_soon_threadsafe(
+                lambda: asyncio.ensure_future(self._explain(entry, command), loop=self.loop)
+            )
+
+    async def _explain(self, entry: SlowQuery, command: Dict[str, Any]) -> None:
+        command = {k: v for k, v in command.items() if not k.startswith("$") and k not in _TRANSPORT_KEYS}
+        try:
+            res = await self.client[entry.database].command({"explain": command, "verbosity": "executionStats"})
+        except Exception as e:
+            logger.warning("Failed to explain slow {} on {}: {}", entry.command, entry.collection, e)
+            return
+        entry.plan = self.plans[entry.shape_key] = summarize_explain(res)
+        if entry.plan.collscan:
+            logger.warning(
+                "Collection scan on {} examined {} documents: {}",
+                entry.collection,
+                entry.plan.docs_examined,
+                entry.shape,
+            )
+
+    def query(
+        self, collection: Optional[str] = None, min_ms: float = 0, collscan: Optional[bool] = None
+    ) -> List[SlowQuery]:
+        """Recorded slow commands, newest first"""
+        for e in self.entries:
+            if e.plan is None:
+                e.plan = self.plans.get(e.shape_key)
+        return [
+            e
+            for e in reversed(self.entries)
+            if (collection is None or e.collection == collection)
+            and e.duration_ms >= min_ms
+            and (collscan is None or (e.plan is not None and e.plan.collscan == collscan))
+        ]
+
+
+@lru_cache(maxsize=1)
+def get_slow_query_log() -> Optional[SlowQueryLog]:
+    """The slow query log of this process, or None if slowlog.enabled is off"""
+    if not settings.get("slowlog.enabled", False):
+        return None
+    return SlowQueryLog(
+        threshold_ms=settings.get("slowlog.threshold_ms", 100),
+        max_entries=settings.get("slowlog.max_entries", 500),
+        explain=settings.get("slowlog.explain", True),
+    )
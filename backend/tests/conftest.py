@@ -0,0 +1,18 @@
+import asyncio
+
+import pytest
+from beanie import init_beanie
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from pkgdash.models.connector.mongo import _ORM_MODELS  # noqa: E402
+
+
+@pytest.fixture
+def run():
+    """Runs coroutines on a fresh event loop, with the models bound to an empty in-memory database"""
+    loop = asyncio.new_event_loop()
+    client = mongomock_motor.AsyncMongoMockClient()
+    loop.run_until_complete(init_beanie(client["pkgdash_test"], document_models=_ORM_MODELS))
+    yield loop.run_until_complete
+    loop.close()
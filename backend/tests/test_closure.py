@@ -0,0 +1,119 @@
+import random
+
+import pytest
+
+from pkgdash.graph import DependencyGraphIndex, cached_impact, closure_nodes, dependency_closure
+from pkgdash.graph import impact as impact_module
+from pkgdash.models import PackageDependency
+
+
+def purl(i: int) -> str:
+    return f"pkg:npm/p{i}@1.0.0"
+
+
+def random_edges(n: int, m: int, seed: int):
+    rng = random.Random(seed)
+    return sorted({(rng.randrange(n), rng.randrange(n)) for _ in range(m)})
+
+
+def bfs(edges, roots, max_depth):
+    """Reference closure: {purl: depth}, edges out of the expanded levels"""
+    adj = {}
+    for s, t in edges:
+        adj.setdefault(purl(s), []).append(purl(t))
+    nodes = {r: 0 for r in roots}
+    frontier, level = list(roots), 0
+    while frontier and (max_depth is None or level < max_depth):
+        level += 1
+        nxt = []
+        for u in frontier:
+            for v in adj.get(u, []):
+                if v not in nodes:
+                    nodes[v] = level
+                    nxt.append(v)
+        frontier = nxt
+    expanded = {u for u, d in nodes.items() if max_depth is None or d < max_depth}
+    return nodes, {(purl(s), purl(t)) for s, t in edges if purl(s) in expanded}
+
+
+async def load(edges):
+    for s, t in edges:
+        await PackageDependency(purl=purl(s), dep_purl=purl(t), type="npm").insert()
+    index = DependencyGraphIndex()
+    await index.refresh()
+    return index
+
+
+def edge_set(closure, reverse=False):
+    pairs = {(e.purl, e.dep_purl) for e in closure.edges}
+    return {(t, s) for s, t in pairs} if reverse else pairs
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("max_depth", [1, 2, 3, None])
+def test_index_and_mongo_closures_agree(run, seed, max_depth):
+    edges = random_edges(40, 80, seed)
+    index = run(load(edges))
+    roots = [purl(0), purl(1)]
+    for reverse in (False, True):
+        mongo = run(dependency_closure(roots, reverse=reverse, max_depth=max_depth, max_nodes=None))
+        memory = run(dependency_closure(roots, reverse=reverse, max_depth=max_depth, max_nodes=None, index=index))
+        assert memory.nodes == mongo.nodes
+        assert (memory.depth, memory.truncated) == (mongo.depth, mongo.truncated)
+        assert edge_set(memory) == edge_set(mongo)
+        assert len(memory.edges) == len(mongo.edges)
+
+    expected_nodes, expected_edges = bfs(edges, roots, max_depth)
+    mongo = run(dependency_closure(roots, max_depth=max_depth, max_nodes=None))
+    assert mongo.nodes == expected_nodes
+    assert edge_set(mongo) == expected_edges
+
+
+def test_closure_stops_at_max_depth(run):
+    # 0 -> 1 -> 2 -> 0: at max_depth=2 the edge out of 2 isn't part of the closure
+    index = run(load([(0, 1), (1, 2), (2, 0)]))
+    for idx in (None, index):
+        closure = run(dependency_closure([purl(0)], max_depth=2, index=idx))
+        assert edge_set(closure) == {(purl(0), purl(1)), (purl(1), purl(2))}
+        assert closure.depth == 2 and closure.truncated
+
+
+def test_closure_ending_at_max_depth_is_complete(run):
+    # 0 -> 1 -> 2: nothing leaves the last level, so stopping there cuts nothing off
+    index = run(load([(0, 1), (1, 2)]))
+    for idx in (None, index):
+        for reverse, root in ((False, purl(0)), (True, purl(2))):
+            closure = run(dependency_closure([root], reverse=reverse, max_depth=2, index=idx))
+            assert closure.depth == 2 and not closure.truncated
+            nodes = run(closure_nodes([root], reverse=reverse, max_depth=2, index=idx))
+            assert not nodes.truncated
+
+
+def test_closure_nodes_matches_dependency_closure(run):
+    edges = random_edges(30, 60, 7)
+    index = run(load(edges))
+    full = run(dependency_closure([purl(3)], max_depth=None, max_nodes=None))
+    for idx in (None, index):
+        nodes = run(closure_nodes([purl(3)], max_depth=None, max_nodes=None, index=idx))
+        assert nodes.nodes == full.nodes
+        assert not nodes.edges
+
+
+def test_index_drops_deleted_edges(run):
+    index = run(load([(0, 1), (1, 2)]))
+    run(PackageDependency.find_one({"purl": purl(1)}).delete())
+    run(index.refresh())
+    assert index.edges([purl(1)]) == []
+    assert run(dependency_closure([purl(0)], index=index)).nodes == {purl(0): 0, purl(1): 1}
+
+
+def test_cached_impact_is_shared_until_the_index_changes(run):
+    impact_module._recent.clear()
+    index = run(load([(1, 0), (2, 1), (3, 0)]))
+    first = run(cached_impact([purl(0)], index=index))
+    assert list(first.dependents.items()) == [(purl(1), 1), (purl(3), 1), (purl(2), 2)]
+    assert run(cached_impact([purl(0)], index=index)) is first
+
+    run(PackageDependency(purl=purl(4), dep_purl=purl(2), type="npm").insert())
+    run(index.refresh())
+    assert run(cached_impact([purl(0)], index=index)).dependents[purl(4)] == 3
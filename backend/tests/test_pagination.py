@@ -0,0 +1,89 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+from fastapi_pagination.cursor import CursorParams, encode_cursor
+
+from pkgdash.models import Package
+from pkgdash.serve.pagination import paginate_keyset, paginate_ranked_cursor
+
+PURLS = [f"pkg:npm/p{i:02d}@1.0.0" for i in range(7)]
+
+
+async def load():
+    for purl in reversed(PURLS):
+        await Package(purl=purl, name=purl.split("/")[1]).insert()
+
+
+def as_dict(page):
+    """A CursorPage, or the raw page of a projection, as the JSON body"""
+    return json.loads(page.body) if hasattr(page, "body") else json.loads(page.json())
+
+
+def purls(page):
+    return [item["purl"] for item in page["items"]]
+
+
+@pytest.mark.parametrize("projection", [None, {"_id": 0, "purl": 1}])
+def test_keyset_pages_forward_and_back(run, projection):
+    run(load())
+    pages, cursor = [], None
+    while True:
+        params = CursorParams(size=3, cursor=cursor)
+        page = as_dict(run(paginate_keyset(Package, {}, "purl", params, projection=projection)))
+        pages.append(purls(page))
+        cursor = page["next_page"]
+        if cursor is None:
+            break
+    assert pages == [PURLS[0:3], PURLS[3:6], PURLS[6:]]
+
+    # back from the last page through the previous cursors
+    back = []
+    while page["previous_page"] is not None:
+        page = as_dict(run(paginate_keyset(Package, {}, "purl", CursorParams(size=3, cursor=page["previous_page"]))))
+        back.append(purls(page))
+    assert back == [PURLS[3:6], PURLS[0:3]]
+    # and forward again from the first page reached backwards
+    page = as_dict(run(paginate_keyset(Package, {}, "purl", CursorParams(size=3, cursor=page["next_page"]))))
+    assert purls(page) == PURLS[3:6]
+
+
+def test_keyset_keeps_the_query(run):
+    run(load())
+    query = {"purl": {"$in": PURLS[1::2]}}
+    page = as_dict(run(paginate_keyset(Package, query, "purl", CursorParams(size=2))))
+    assert purls(page) == [PURLS[1], PURLS[3]]
+    page = as_dict(run(paginate_keyset(Package, query, "purl", CursorParams(size=2, cursor=page["next_page"]))))
+    assert purls(page) == [PURLS[5]] and page["next_page"] is None
+
+
+def test_ranked_cursor_pages(run):
+    run(load())
+    ranked = PURLS[::-1]
+    asked = []
+
+    def rank(n):
+        asked.append(n)
+        return ranked[:n], len(ranked)
+
+    pages, cursor = [], None
+    while True:
+        page = as_dict(run(paginate_ranked_cursor(Package, "purl", rank, CursorParams(size=3, cursor=cursor))))
+        pages.append(purls(page))
+        cursor = page["next_page"]
+        if cursor is None:
+            break
+    assert pages == [ranked[0:3], ranked[3:6], ranked[6:]]
+    # only the keys up to the end of each page are ranked
+    assert asked == [3, 6, 9]
+
+    params = CursorParams(size=3, cursor=page["previous_page"])
+    previous = as_dict(run(paginate_ranked_cursor(Package, "purl", rank, params)))
+    assert purls(previous) == ranked[3:6]
+
+
+def test_ranked_cursor_rejects_bad_offsets(run):
+    for cursor in ('{"offset": -1}', '{"offset": "x"}', "[1]", "not json"):
+        params = CursorParams(size=3, cursor=encode_cursor(cursor))
+        with pytest.raises(HTTPException):
+            run(paginate_ranked_cursor(Package, "purl", lambda n: ([], 0), params))
@@ -0,0 +1,55 @@
+import time
+
+from pkgdash.graph import DependencyGraphIndex, dependency_paths
+from pkgdash.models import PackageDependency
+
+
+def purl(name) -> str:
+    return f"pkg:npm/{name}@1.0.0"
+
+
+async def load(edges):
+    for s, t in edges:
+        await PackageDependency(purl=purl(s), dep_purl=purl(t), type="npm").insert()
+    index = DependencyGraphIndex()
+    await index.refresh()
+    return index
+
+
+def diamonds(n: int):
+    """s -> (a0 | b0) -> m0 -> (a1 | b1) -> m1 ... : 2 ** n shortest paths from s to m{n-1}"""
+    edges, prev = [], "s"
+    for i in range(n):
+        edges += [(prev, f"a{i}"), (prev, f"b{i}"), (f"a{i}", f"m{i}"), (f"b{i}", f"m{i}")]
+        prev = f"m{i}"
+    return edges
+
+
+def test_paths_through_diamonds_stop_at_k(run):
+    index = run(load(diamonds(40)))
+    for idx in (None, index):
+        started = time.monotonic()
+        res = run(dependency_paths([purl("s")], [purl("m39")], k=5, max_depth=None, index=idx))
+        assert time.monotonic() - started < 5
+        assert len(res.paths) == 5 and len({tuple(p) for p in res.paths}) == 5
+        assert all(len(p) == 81 and p[0] == purl("s") and p[-1] == purl("m39") for p in res.paths)
+        assert not res.truncated
+
+
+def test_walks_that_revisit_the_source_are_not_enumerated(run):
+    # s -> t, and diamonds from s to m39 -> s: every walk through a diamond comes back to s,
+    # so there is only one simple path however many walks there are
+    index = run(load([("s", "t"), *diamonds(40), ("m39", "s")]))
+    for idx in (None, index):
+        started = time.monotonic()
+        res = run(dependency_paths([purl("s")], [purl("t")], k=2, max_depth=None, index=idx))
+        assert time.monotonic() - started < 5
+        assert res.paths == [[purl("s"), purl("t")]]
+
+
+def test_shortest_paths_first(run):
+    # s -> t, and s -> x -> t
+    index = run(load([("s", "t"), ("s", "x"), ("x", "t")]))
+    for idx in (None, index):
+        res = run(dependency_paths([purl("s")], [purl("t")], k=2, index=idx))
+        assert res.paths == [[purl("s"), purl("t")], [purl("s"), purl("x"), purl("t")]]
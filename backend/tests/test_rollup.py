@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+from pkgdash.models.rollup import COUNTERS, GAUGES, merge_period
+
+
+def stats(source: str, start: datetime, n_commits: int, n_stars: int, updated: datetime) -> dict:
+    return {
+        "stats_from": start,
+        "stats_interval": source,
+        "n_commits": n_commits,
+        "n_stars": n_stars,
+        "record_created_at": updated,
+        "record_updated_at": updated,
+    }
+
+
+def days(first: datetime, n: int):
+    """Daily documents with one commit each, written an hour after the end of their day"""
+    return [
+        stats("Day", first + timedelta(days=i), 1, 100 + i, first + timedelta(days=i + 1, hours=1)) for i in range(n)
+    ]
+
+
+def merge(docs):
+    return merge_period(docs, list(COUNTERS[:1]), list(GAUGES[:1]))
+
+
+def test_days_only_are_summed():
+    merged = merge(days(datetime(2024, 3, 1), 31))
+    assert merged["n_commits"] == 31
+    assert merged["n_stars"] == 130
+
+
+def test_complete_month_wins_over_its_days():
+    month = stats("Month", datetime(2024, 3, 1), 50, 7, datetime(2024, 4, 1, 2))
+    merged = merge([month, *days(datetime(2024, 3, 1), 31)])
+    assert merged["n_commits"] == 50
+    # the month covers the latest time, its days don't add anything
+    assert merged["n_stars"] == 7
+
+
+def test_days_after_a_partial_month_are_added():
+    # monthly snapshot taken on March 15 at noon, daily documents for the whole month
+    month = stats("Month", datetime(2024, 3, 1), 40, 7, datetime(2024, 3, 15, 12))
+    merged = merge([month, *days(datetime(2024, 3, 1), 31)])
+    # March 16..31 aren't covered by the snapshot; March 15 partly is, so it isn't added
+    assert merged["n_commits"] == 40 + 16
+    assert merged["n_stars"] == 130
+    assert merged["record_updated_at"] == datetime(2024, 4, 1, 1)
+    assert merged["record_created_at"] == datetime(2024, 3, 15, 12)
+
+
+def test_year_from_months_and_days():
+    year = stats("Year", datetime(2024, 1, 1), 100, 1, datetime(2024, 2, 10))
+    months = [stats("Month", datetime(2024, m, 1), 10, m, datetime(2024, m + 1, 1, 1)) for m in range(1, 12)]
+    merged = merge([year, *months, *days(datetime(2024, 2, 1), 29)])
+    # the yearly snapshot covers January 1 to February 10, so January's and February's
+    # documents overlap it: then March..November monthly, and the days of February 10..29
+    assert merged["n_commits"] == 100 + 9 * 10 + 20
+    assert merged["n_stars"] == 11
@@ -0,0 +1,105 @@
+import random
+
+import numpy as np
+import pytest
+
+from pkgdash.graph import DependencyGraphIndex, graph_stats
+from pkgdash.graph.index import CSRAdjacency
+from pkgdash.graph.scc import closure_sizes, condense, cycles_by_distro, longest_depths
+from pkgdash.models import PackageDependency
+
+
+def random_graph(n: int, m: int, seed: int, pairs: bool = False) -> CSRAdjacency:
+    """m random edges, plus the 2-cycles 2i <-> 2i + 1 if pairs"""
+    rng = random.Random(seed)
+    edges = {(rng.randrange(n), rng.randrange(n)) for _ in range(m)}
+    if pairs:
+        edges |= {(i, i ^ 1) for i in range(n)}
+    edges = sorted(edges)
+    src, dst = zip(*edges)
+    return CSRAdjacency.from_edges(np.array(src, dtype=np.int32), np.array(dst, dtype=np.int32), n)
+
+
+def reachable(adj: CSRAdjacency, node: int) -> set:
+    """Nodes reachable from node, itself included"""
+    seen, stack = {node}, [node]
+    while stack:
+        for t in adj.neighbors(np.array([stack.pop()])).tolist():
+            if t not in seen:
+                seen.add(t)
+                stack.append(t)
+    return seen
+
+
+def longest_path(dag: CSRAdjacency, c: int, memo: dict) -> int:
+    if c not in memo:
+        children = dag.neighbors(np.array([c])).tolist()
+        memo[c] = 1 + max(longest_path(dag, t, memo) for t in children) if children else 0
+    return memo[c]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_condensation_matches_reachability(seed):
+    adj = random_graph(60, 90, seed)
+    reach = [reachable(adj, v) for v in range(adj.n)]
+    condensation = condense(adj)
+    component = condensation.component.tolist()
+    for u in range(adj.n):
+        for v in range(adj.n):
+            assert (component[u] == component[v]) == (v in reach[u] and u in reach[v])
+    # dependencies first: every edge of the condensed DAG goes to a smaller number
+    src = np.repeat(np.arange(condensation.n), np.diff(condensation.dag.offsets))
+    assert (condensation.dag.targets < src).all()
+    assert condensation.sizes.sum() == adj.n
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("memory_mb", [0, 64])
+@pytest.mark.parametrize("pairs", [False, True])
+def test_closure_sizes_and_depths_match_brute_force(seed, memory_mb, pairs):
+    # memory_mb=0 leaves one 64 bit word per row: 200 nodes take several slices
+    adj = random_graph(200, 120 if pairs else 260, seed, pairs)
+    condensation = condense(adj)
+    depths = longest_depths(condensation.dag)
+    sizes = closure_sizes(condensation, depths, memory_mb)
+    memo = {}
+    for v in range(adj.n):
+        c = int(condensation.component[v])
+        assert sizes[c] == len(reachable(adj, v))
+        assert depths[c] == longest_path(condensation.dag, c, memo)
+
+
+def purl(i: int, distro: str = "openeuler-2203sp1") -> str:
+    return f"pkg:rpm/openeuler/p{i}@1.0-1?arch=x86_64&distro={distro}"
+
+
+def test_graph_stats(run):
+    # 0 -> 1 <-> 2 -> 3, 4 -> 3
+    edges = [(0, 1), (1, 2), (2, 1), (2, 3), (4, 3)]
+    for s, t in edges:
+        run(PackageDependency(purl=purl(s), dep_purl=purl(t), type="rpm").insert())
+    index = DependencyGraphIndex()
+    run(index.refresh())
+    stats = graph_stats(index, memory_mb=0)
+    by_purl = {p: i for i, p in enumerate(stats.purls)}
+
+    def stat(i):
+        node = by_purl[purl(i)]
+        return int(stats.n_deps[node]), int(stats.n_tdeps[node]), int(stats.max_depth[node])
+
+    assert [stat(i) for i in range(5)] == [(1, 3, 2), (1, 2, 1), (2, 2, 1), (0, 0, 0), (1, 1, 1)]
+    assert list(stats.cycles.values()) == [sorted([purl(1), purl(2)])]
+
+
+def test_cycles_by_distro():
+    cycles = {
+        0: [purl(1), purl(2)],
+        1: [purl(3), purl(4), purl(5)],
+        2: [purl(6, "openeuler-2403"), purl(7, "openeuler-2403")],
+        3: ["pkg:npm/a@1.0.0", "pkg:npm/b@1.0.0"],
+    }
+    grouped = cycles_by_distro(cycles)
+    assert list(grouped) == ["openeuler-2203sp1", "openeuler-2403", "npm"]
+    # largest cycle first
+    assert grouped["openeuler-2203sp1"] == [cycles[1], cycles[0]]
+    assert grouped["npm"] == [cycles[3]]
@@ -11,12 +11,36 @@ export async function getPackageList(page?: number, size?: number) {
   })
 }
 
-export async function searchPackageList(regex: string, page?: number, size?: number, distros?: Array<string>) {
+export async function getPackageListCursor(cursor?: string, size?: number) {
+  return await asyncRequest<CursorPage<Package>>({
+    url: '/api/pkg/list/cursor',
+    method: 'get',
+    data: {
+      cursor,
+      size,
+    },
+  })
+}
+
+export async function searchPackageListCursor(q: string, cursor?: string, size?: number, distros?: Array<string>) {
+  return await asyncRequest<CursorPage<Package>>({
+    url: '/api/pkg/search/cursor',
+    method: 'get',
+    data: {
+      q,
+      distros,
+      cursor,
+      size,
+    },
+  })
+}
+
+export async function searchPackageList(q: string, page?: number, size?: number, distros?: Array<string>) {
   return await asyncRequest<Page<Package>>({
     url: '/api/pkg/search',
     method: 'get',
     data: {
-      q: regex,
+      q,
       distros,
       page,
       size,
@@ -101,6 +125,16 @@ export async function getPackageDistros() {
   })
 }
 
+export async function getPackageFacetCounts(facets?: Array<PackageCountFacet>) {
+  return await asyncRequest<PackageFacetCounts>({
+    url: '/api/pkg/facets',
+    method: 'get',
+    data: {
+      facets,
+    },
+  })
+}
+
 
 export async function getPackageRec(url: string) {
   return await asyncRequest<Array<Package>>({
@@ -110,4 +144,14 @@ export async function getPackageRec(url: string) {
       url,
     },
   })
-}
\ No newline at end of file
+}
+export async function getPackageBatch(purls: Array<string>, facets: Array<PackageFacet> = ['info']) {
+  return await asyncRequest<PackageBatch>({
+    url: '/api/pkg/batch',
+    method: 'post',
+    data: {
+      purls,
+      facets,
+    },
+  })
+}
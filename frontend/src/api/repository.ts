@@ -11,12 +11,23 @@ export async function getRepositoryList(page?: number, size?: number) {
   })
 }
 
-export async function searchRepositoryList(regex: string, page?: number, size?: number) {
+export async function getRepositoryListCursor(cursor?: string, size?: number) {
+  return await asyncRequest<CursorPage<Repository>>({
+    url: '/api/repo/list/cursor',
+    method: 'get',
+    data: {
+      cursor,
+      size,
+    },
+  })
+}
+
+export async function searchRepositoryList(q: string, page?: number, size?: number) {
   return await asyncRequest<Page<Repository>>({
     url: '/api/repo/search',
     method: 'get',
     data: {
-      q: regex,
+      q,
       page,
       size,
     },
@@ -52,3 +63,14 @@ export async function getRepositoryPackages(url: string) {
     },
   })
 }
+
+export async function getRepositoryBatch(urls: Array<string>, facets: Array<RepositoryFacet> = ['info']) {
+  return await asyncRequest<Record<string, RepositoryBatchItem>>({
+    url: '/api/repo/batch',
+    method: 'post',
+    data: {
+      urls,
+      facets,
+    },
+  })
+}
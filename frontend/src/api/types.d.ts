@@ -279,4 +279,45 @@ interface Page<T> {
     size?: number;
     /** Pages */
     pages?: number;
-  };
\ No newline at end of file
+    /** How total was computed; "lower_bound" means at least total ("10,000+") */
+    total_kind?: 'exact' | 'estimated' | 'lower_bound';
+  };
+/** Cursor page, see /api/pkg/list/cursor */
+interface CursorPage<T> {
+    /** Items */
+    items: T[];
+    /** Cursor to refetch the current page */
+    current_page?: string;
+    /** Cursor for the previous page */
+    previous_page?: string;
+    /** Cursor for the next page */
+    next_page?: string;
+};
+
+type PackageFacet = 'info' | 'stats' | 'alerts' | 'sources'
+
+interface PackageBatchItem {
+    info?: Package;
+    stats?: PackageStats[];
+    alerts?: PackageAlert;
+    sources?: PackageSource[];
+};
+
+/** Facets per requested purl, and the purls that couldn't be parsed */
+interface PackageBatch {
+    results: Record<string, PackageBatchItem>;
+    errors: Record<string, string>;
+};
+
+type PackageCountFacet = 'distro' | 'distro_release' | 'arch' | 'type' | 'license'
+
+/** Number of packages per value of each facet */
+type PackageFacetCounts = Partial<Record<PackageCountFacet, Record<string, number>>>
+
+type RepositoryFacet = 'info' | 'stats' | 'packages'
+
+interface RepositoryBatchItem {
+    info?: Repository;
+    stats?: RepositoryStats[];
+    packages?: PackageSource[];
+};